@@ -0,0 +1,178 @@
+import sqlite3
+import datetime
+import json
+import os
+import shutil
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# --- COLUMNAR SNAPSHOT ---
+# Reports read a Parquet copy of customers/payment_history instead of the live DB.
+# Payments are partitioned by month and customers by area, so a 12-month trend
+# only opens 12 partitions and only the columns it aggregates.
+DB_FILE = "cable_manager.db"
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_MAX_AGE_HOURS = 20
+LATEST_POINTER = "LATEST"
+
+
+def month_key(date_col):
+    return pd.to_datetime(date_col, errors="coerce").dt.strftime("%Y-%m")
+
+
+def to_amount(col):
+    return pd.to_numeric(col, errors="coerce").fillna(0.0)
+
+
+def build_snapshot(db_file=DB_FILE, out_dir=SNAPSHOT_DIR):
+    """ Exports customers and payment_history to a new partitioned snapshot and publishes it """
+    started = time.time()
+    conn = sqlite3.connect(db_file)
+    customers = pd.read_sql_query(
+        "SELECT id AS customer_id, area, status, stb_type, monthly_rental, outstanding_amount, install_date FROM customers", conn)
+    payments = pd.read_sql_query(
+        "SELECT p.customer_id, p.amount_paid, p.date_paid, c.area FROM payment_history p LEFT JOIN customers c ON c.id = p.customer_id", conn)
+    conn.close()
+
+    customers["area"] = customers["area"].fillna("").replace("", "Unassigned")
+    customers["status"] = customers["status"].fillna("Active")
+    customers["stb_type"] = customers["stb_type"].fillna("SD").replace("", "SD")
+    customers["monthly_rental"] = to_amount(customers["monthly_rental"])
+    customers["outstanding_amount"] = to_amount(customers["outstanding_amount"])
+
+    payments["amount"] = to_amount(payments.pop("amount_paid"))
+    payments["month"] = month_key(payments["date_paid"])
+    payments["area"] = payments["area"].fillna("").replace("", "Unassigned")
+    payments = payments.dropna(subset=["month"])
+
+    build = f"build_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+    build_dir = os.path.join(out_dir, build)
+    os.makedirs(build_dir, exist_ok=True)
+    pq.write_to_dataset(pa.Table.from_pandas(customers, preserve_index=False),
+                        os.path.join(build_dir, "customers"), partition_cols=["area"])
+    pq.write_to_dataset(pa.Table.from_pandas(payments, preserve_index=False),
+                        os.path.join(build_dir, "payments"), partition_cols=["month"])
+
+    meta = {"created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "customers": len(customers), "payments": len(payments),
+            "seconds": round(time.time() - started, 2)}
+    with open(os.path.join(build_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    # Publish atomically, then drop older builds that nobody points at
+    tmp_pointer = os.path.join(out_dir, LATEST_POINTER + ".tmp")
+    with open(tmp_pointer, "w") as f:
+        f.write(build)
+    os.replace(tmp_pointer, os.path.join(out_dir, LATEST_POINTER))
+    for name in os.listdir(out_dir):
+        if name.startswith("build_") and name != build:
+            shutil.rmtree(os.path.join(out_dir, name), ignore_errors=True)
+    return meta
+
+
+def latest_snapshot(out_dir=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(out_dir, LATEST_POINTER)) as f:
+            path = os.path.join(out_dir, f.read().strip())
+    except OSError:
+        return None
+    return path if os.path.isdir(path) else None
+
+
+def snapshot_info(out_dir=SNAPSHOT_DIR):
+    path = latest_snapshot(out_dir)
+    if not path: return None
+    with open(os.path.join(path, "meta.json")) as f:
+        return json.load(f)
+
+
+def snapshot_is_stale(out_dir=SNAPSHOT_DIR, max_age_hours=SNAPSHOT_MAX_AGE_HOURS):
+    info = snapshot_info(out_dir)
+    if not info: return True
+    age = datetime.datetime.now() - datetime.datetime.fromisoformat(info["created_at"])
+    return age > datetime.timedelta(hours=max_age_hours)
+
+
+def require_snapshot(out_dir):
+    path = latest_snapshot(out_dir)
+    if not path:
+        raise FileNotFoundError("No analytics snapshot yet. Build one first.")
+    return path
+
+
+# --- REPORTS ---
+def monthly_revenue_trend(out_dir=SNAPSHOT_DIR, months=12, today=None):
+    """ Collected amount and paying customers per month for the last `months` months """
+    today = today or datetime.date.today()
+    first = (pd.Timestamp(today).to_period("M") - (months - 1)).strftime("%Y-%m")
+    path = os.path.join(require_snapshot(out_dir), "payments")
+    df = pd.read_parquet(path, columns=["month", "amount", "customer_id"], filters=[("month", ">=", first)])
+    if df.empty:
+        return pd.DataFrame(columns=["month", "revenue", "payers"])
+    df["month"] = df["month"].astype(str)
+    trend = df.groupby("month", sort=True).agg(revenue=("amount", "sum"), payers=("customer_id", "nunique")).reset_index()
+    return trend
+
+
+def churn_by_area(out_dir=SNAPSHOT_DIR):
+    """ Share of customers marked Inactive, per area """
+    path = os.path.join(require_snapshot(out_dir), "customers")
+    df = pd.read_parquet(path, columns=["area", "status"])
+    df["area"] = df["area"].astype(str)
+    df["inactive"] = df["status"].eq("Inactive")
+    out = df.groupby("area").agg(customers=("status", "size"), inactive=("inactive", "sum")).reset_index()
+    out["churn_pct"] = (100.0 * out["inactive"] / out["customers"]).round(1)
+    return out.sort_values("churn_pct", ascending=False)
+
+
+def hd_sd_mix(out_dir=SNAPSHOT_DIR):
+    """ Active connections and rental by STB type """
+    path = os.path.join(require_snapshot(out_dir), "customers")
+    df = pd.read_parquet(path, columns=["stb_type", "monthly_rental"], filters=[("status", "==", "Active")])
+    out = df.groupby("stb_type").agg(connections=("monthly_rental", "size"), monthly_rental=("monthly_rental", "sum")).reset_index()
+    out["share_pct"] = (100.0 * out["connections"] / max(len(df), 1)).round(1)
+    return out
+
+
+def benchmark(rows=1_000_000, customers=50_000, out_dir=None):
+    """ Builds a synthetic snapshot of `rows` payments and times the 12-month trend report """
+    import numpy as np
+    import tempfile
+    out_dir = out_dir or tempfile.mkdtemp(prefix="snapshot_bench_")
+    db_file = os.path.join(out_dir, "bench.db")
+    rng = np.random.default_rng(7)
+
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, area TEXT, status TEXT, stb_type TEXT, monthly_rental TEXT, outstanding_amount TEXT, install_date TEXT)")
+    conn.execute("CREATE TABLE payment_history (id INTEGER PRIMARY KEY, customer_id INTEGER, amount_paid TEXT, date_paid TEXT)")
+    areas = [f"AREA {i}" for i in range(20)]
+    conn.executemany("INSERT INTO customers VALUES (?, ?, ?, ?, ?, '0', '2020-01-01')",
+                     ((i, areas[i % 20], "Inactive" if i % 11 == 0 else "Active", "HD" if i % 3 == 0 else "SD", "500") for i in range(1, customers + 1)))
+    start = datetime.date.today() - datetime.timedelta(days=730)
+    days = rng.integers(0, 730, rows)
+    conn.executemany("INSERT INTO payment_history (customer_id, amount_paid, date_paid) VALUES (?, ?, ?)",
+                     ((int(c), "500", str(start + datetime.timedelta(days=int(d)))) for c, d in zip(rng.integers(1, customers + 1, rows), days)))
+    conn.commit()
+    conn.close()
+
+    snap_dir = os.path.join(out_dir, SNAPSHOT_DIR)
+    meta = build_snapshot(db_file, snap_dir)
+    t = time.perf_counter()
+    trend = monthly_revenue_trend(snap_dir)
+    elapsed = time.perf_counter() - t
+    print(f"Snapshot of {meta['payments']:,} payments built in {meta['seconds']}s")
+    print(f"12-month revenue trend: {elapsed * 1000:.0f} ms ({len(trend)} months)")
+    return elapsed
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+    else:
+        db_file = sys.argv[1] if len(sys.argv) > 1 else DB_FILE
+        out_dir = sys.argv[2] if len(sys.argv) > 2 else SNAPSHOT_DIR
+        info = build_snapshot(db_file, out_dir)
+        print(f"Snapshot built: {info['customers']} customers, {info['payments']} payments in {info['seconds']}s")
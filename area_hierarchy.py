@@ -0,0 +1,280 @@
+import sqlite3
+
+# --- AREA HIERARCHY ---
+# Areas form a tree (zone -> area -> sub-area) through areas.parent_id, and
+# customers point at one node through customers.area_id (a foreign key; the
+# free-text customers.area is kept for display and mapped by a trigger, so
+# imports and older code paths keep working).
+#
+# area_closure holds every (ancestor, descendant) pair and area_rollups the
+# subscriber, revenue and outstanding totals of each node's whole subtree.
+# Triggers on customers add and subtract each change along the closure, so a
+# drill-down reads a handful of precomputed rows instead of scanning customers.
+LEVELS = ["zone", "area", "sub_area"]
+LEVEL_LABELS = {"zone": "Zone", "area": "Area", "sub_area": "Sub-area"}
+MAX_DEPTH = len(LEVELS)
+
+# Area text that means "no area"
+BLANK_AREAS = ("", "unassigned", "nan", "none")
+
+
+def area_key_sql(expr):
+    return f"upper(trim({expr}))"
+
+
+def same_area_sql(expr):
+    """ Matches an area name the way users type it: ignoring case and surrounding spaces """
+    return f"area_name = trim({expr}) COLLATE NOCASE"
+
+
+def valid_area_sql(expr):
+    return f"lower(trim(COALESCE({expr}, ''))) NOT IN {BLANK_AREAS}"
+
+
+def contribution_sql(ref, sign):
+    """ SET clause adding (sign '+') or removing (sign '-') one customer row's share """
+    active = f"({ref}.status = 'Active')"
+    return (f"subscribers = subscribers {sign} {active}, customers = customers {sign} 1, "
+            f"revenue = revenue {sign} CASE WHEN {active} THEN COALESCE(CAST({ref}.monthly_rental AS REAL), 0) ELSE 0 END, "
+            f"outstanding = outstanding {sign} COALESCE(CAST({ref}.outstanding_amount AS REAL), 0)")
+
+
+def init_hierarchy(conn):
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='area_closure'")
+    new_hierarchy = c.fetchone() is None
+
+    for table, col, ddl in (("areas", "parent_id", "INTEGER REFERENCES areas(id)"),
+                            ("areas", "level", "TEXT NOT NULL DEFAULT 'area'"),
+                            ("customers", "area_id", "INTEGER REFERENCES areas(id)")):
+        try: c.execute(f"SELECT {col} FROM {table} LIMIT 1")
+        except sqlite3.OperationalError:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {col} {ddl}")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_areas_parent ON areas(parent_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_customers_area_id ON customers(area_id)")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS area_closure (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id)
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_area_closure_descendant ON area_closure(descendant_id, ancestor_id)")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS area_rollups (
+            area_id INTEGER PRIMARY KEY,
+            subscribers INTEGER NOT NULL DEFAULT 0,
+            customers INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            outstanding REAL NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # Tree maintenance: a new node inherits its parent's ancestors
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_areas_insert
+        AFTER INSERT ON areas
+        BEGIN
+            INSERT INTO area_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, NEW.id, depth + 1 FROM area_closure WHERE descendant_id = NEW.parent_id
+            UNION ALL SELECT NEW.id, NEW.id, 0;
+            INSERT OR IGNORE INTO area_rollups (area_id) VALUES (NEW.id);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_areas_delete
+        AFTER DELETE ON areas
+        BEGIN
+            DELETE FROM area_closure WHERE descendant_id = OLD.id OR ancestor_id = OLD.id;
+            DELETE FROM area_rollups WHERE area_id = OLD.id;
+        END
+    ''')
+
+    # Free-text area -> area_id; unknown names become new top-level areas
+    # (an insert that already names its area_id keeps it)
+    lookup = f"(SELECT id FROM areas WHERE {same_area_sql('NEW.area')} ORDER BY id LIMIT 1)"
+    for event, when in (("INSERT", "WHEN NEW.area_id IS NULL"), ("UPDATE OF area", "")):
+        name = "trg_customers_area_id_" + event.split()[0].lower()
+        # Recreated so databases from before the case-insensitive match pick it up
+        c.execute(f"DROP TRIGGER IF EXISTS {name}")
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name}
+            AFTER {event} ON customers {when}
+            BEGIN
+                INSERT INTO areas (area_name) SELECT {area_key_sql('NEW.area')}
+                WHERE {valid_area_sql('NEW.area')} AND NOT EXISTS (SELECT 1 FROM areas WHERE {same_area_sql('NEW.area')});
+                UPDATE customers SET area_id = CASE WHEN {valid_area_sql('NEW.area')} THEN {lookup} END
+                WHERE id = NEW.id AND area_id IS NOT (CASE WHEN {valid_area_sql('NEW.area')} THEN {lookup} END);
+            END
+        ''')
+
+    # Rollups along every ancestor of the customer's node
+    ancestors = "SELECT ancestor_id FROM area_closure WHERE descendant_id = {}"
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_area_rollups_insert
+        AFTER INSERT ON customers WHEN NEW.area_id IS NOT NULL
+        BEGIN
+            UPDATE area_rollups SET {contribution_sql('NEW', '+')} WHERE area_id IN ({ancestors.format('NEW.area_id')});
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_area_rollups_update
+        AFTER UPDATE OF area_id, status, monthly_rental, outstanding_amount ON customers
+        BEGIN
+            UPDATE area_rollups SET {contribution_sql('OLD', '-')} WHERE area_id IN ({ancestors.format('OLD.area_id')});
+            UPDATE area_rollups SET {contribution_sql('NEW', '+')} WHERE area_id IN ({ancestors.format('NEW.area_id')});
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_area_rollups_delete
+        AFTER DELETE ON customers WHEN OLD.area_id IS NOT NULL
+        BEGIN
+            UPDATE area_rollups SET {contribution_sql('OLD', '-')} WHERE area_id IN ({ancestors.format('OLD.area_id')});
+        END
+    ''')
+
+    # Migrate the free-text areas once and build the derived tables in one
+    # grouped pass. A promoted standby lands here too, since area_closure is
+    # not replicated; any other repair is an explicit rebuild().
+    if new_hierarchy:
+        c.execute(f'''
+            INSERT INTO areas (area_name)
+            SELECT DISTINCT {area_key_sql('area')} FROM customers
+            WHERE {valid_area_sql('area')} AND NOT EXISTS (SELECT 1 FROM areas WHERE {same_area_sql('customers.area')})
+        ''')
+        c.execute(f'''
+            UPDATE customers SET area_id = (SELECT id FROM areas WHERE {same_area_sql('customers.area')} ORDER BY id LIMIT 1)
+            WHERE area_id IS NULL AND {valid_area_sql('area')}
+        ''')
+        rebuild(conn)
+
+
+def rebuild(conn):
+    """ Recomputes area_closure and area_rollups from areas and customers. The caller owns the transaction. """
+    c = conn.cursor()
+    c.execute("DELETE FROM area_closure")
+    c.execute(f'''
+        WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM areas
+            UNION ALL
+            SELECT t.ancestor_id, a.id, t.depth + 1 FROM tree t JOIN areas a ON a.parent_id = t.descendant_id
+            WHERE t.depth < {MAX_DEPTH}
+        )
+        INSERT OR IGNORE INTO area_closure (ancestor_id, descendant_id, depth) SELECT ancestor_id, descendant_id, depth FROM tree
+    ''')
+    c.execute("DELETE FROM area_rollups")
+    c.execute('''
+        INSERT INTO area_rollups (area_id, subscribers, customers, revenue, outstanding)
+        SELECT a.id,
+               COALESCE(SUM(t.subscribers), 0), COALESCE(SUM(t.customers), 0),
+               COALESCE(SUM(t.revenue), 0), COALESCE(SUM(t.outstanding), 0)
+        FROM areas a
+        LEFT JOIN area_closure cl ON cl.ancestor_id = a.id
+        LEFT JOIN (
+            SELECT area_id,
+                   SUM(status = 'Active') AS subscribers, COUNT(*) AS customers,
+                   SUM(CASE WHEN status = 'Active' THEN COALESCE(CAST(monthly_rental AS REAL), 0) ELSE 0 END) AS revenue,
+                   SUM(COALESCE(CAST(outstanding_amount AS REAL), 0)) AS outstanding
+            FROM customers WHERE area_id IS NOT NULL GROUP BY area_id
+        ) t ON t.area_id = cl.descendant_id
+        GROUP BY a.id
+    ''')
+
+
+def check_parent(conn, level, parent_id):
+    """ Levels only go down the tree, which also rules out cycles """
+    if parent_id is None: return
+    row = conn.execute("SELECT level FROM areas WHERE id = ?", (parent_id,)).fetchone()
+    if not row:
+        raise ValueError("The parent area doesn't exist.")
+    if LEVELS.index(level) <= LEVELS.index(row[0]):
+        parent = LEVEL_LABELS[row[0]].lower()
+        raise ValueError(f"{LEVEL_LABELS[level]} cannot be placed under {'an' if parent[0] in 'aeiou' else 'a'} {parent}.")
+
+
+def create_area(conn, name, parent_id=None, level="area"):
+    """ Adds a node below `parent_id` (None for top level). The caller owns the transaction. """
+    name = name.strip().upper()
+    if not name:
+        raise ValueError("Area name is required")
+    if conn.execute(f"SELECT 1 FROM areas WHERE {same_area_sql('?')}", (name,)).fetchone():
+        raise ValueError("Area already exists")
+    if level not in LEVELS:
+        raise ValueError(f"Unknown level: {level}")
+    check_parent(conn, level, parent_id)
+    return conn.execute("INSERT INTO areas (area_name, parent_id, level) VALUES (?, ?, ?)", (name, parent_id, level)).lastrowid
+
+
+def move_area(conn, area_id, parent_id):
+    """ Re-parents a node (None for top level) and rebuilds the derived tables. The caller owns the transaction. """
+    row = conn.execute("SELECT level FROM areas WHERE id = ?", (area_id,)).fetchone()
+    if not row:
+        raise ValueError("The area doesn't exist.")
+    check_parent(conn, row[0], parent_id)
+    conn.execute("UPDATE areas SET parent_id = ? WHERE id = ?", (parent_id, area_id))
+    rebuild(conn)
+
+
+def delete_area(conn, area_id):
+    """ Deletes an empty leaf node. The caller owns the transaction. """
+    if conn.execute("SELECT 1 FROM areas WHERE parent_id = ? LIMIT 1", (area_id,)).fetchone():
+        raise ValueError("This area has sub-areas. Delete or move them first.")
+    assigned = conn.execute("SELECT COUNT(*) FROM customers WHERE area_id = ?", (area_id,)).fetchone()[0]
+    if assigned:
+        raise ValueError(f"{assigned} customer(s) are still assigned to this area. Reassign them first.")
+    conn.execute("DELETE FROM areas WHERE id = ?", (area_id,))
+
+
+def children(conn, parent_id=None):
+    """ [(id, name, level, subscribers, customers, revenue, outstanding, has_children)] under a node, from the rollups """
+    c = conn.cursor()
+    c.execute('''
+        SELECT a.id, a.area_name, a.level, r.subscribers, r.customers, r.revenue, r.outstanding,
+               EXISTS (SELECT 1 FROM areas ch WHERE ch.parent_id = a.id)
+        FROM areas a JOIN area_rollups r ON r.area_id = a.id
+        WHERE a.parent_id IS ?
+        ORDER BY r.subscribers DESC, a.area_name
+    ''', (parent_id,))
+    return c.fetchall()
+
+
+def breadcrumb(conn, area_id):
+    """ [(id, name)] from the top-level node down to `area_id` """
+    c = conn.cursor()
+    c.execute('''
+        SELECT a.id, a.area_name FROM area_closure cl JOIN areas a ON a.id = cl.ancestor_id
+        WHERE cl.descendant_id = ? ORDER BY cl.depth DESC
+    ''', (area_id,))
+    return c.fetchall()
+
+
+def coverage(conn):
+    """ (areas with active subscribers, all non-zone areas, customers without an area) """
+    c = conn.cursor()
+    c.execute('''
+        SELECT COALESCE(SUM(r.subscribers > 0), 0), COUNT(*)
+        FROM areas a JOIN area_rollups r ON r.area_id = a.id WHERE a.level != 'zone'
+    ''')
+    covered, total = c.fetchone()
+    unassigned = c.execute("SELECT COUNT(*) FROM customers WHERE area_id IS NULL").fetchone()[0]
+    return covered, total, unassigned
+
+
+if __name__ == "__main__":
+    import sys
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    conn = sqlite3.connect(args[0] if args else "cable_manager.db")
+    with conn:
+        init_hierarchy(conn)
+        # Repairs the closure and rollups after the database was written without the triggers
+        if "--rebuild" in sys.argv:
+            rebuild(conn)
+
+    def show(parent_id, indent=0):
+        for area_id, name, level, subs, custs, revenue, outstanding, _ in children(conn, parent_id):
+            print(f"{'  ' * indent}{name} ({LEVEL_LABELS.get(level, level)}): {subs} active / {custs}, "
+                  f"revenue {revenue:,.0f}, outstanding {outstanding:,.0f}")
+            show(area_id, indent + 1)
+    show(None)
+    conn.close()
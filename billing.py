@@ -0,0 +1,310 @@
+import sqlite3
+import datetime
+
+# --- PLANS & BILLING ---
+# A catalog of TV packs and internet plans, each with effective-dated prices:
+# a base charge, an HD surcharge and a charge per connection beyond the first.
+# Customers point at a TV plan (plan_id) and an internet plan
+# (internet_plan_id, billed only when they have a net_acc_no).
+#
+# Monthly dues are one SQL pass over customers joined to the prices in effect
+# on a date, so a bill run or a "what if" price preview costs the same for
+# ten customers or a hundred thousand. monthly_rental is the TV rental:
+# customers on no TV pack keep being billed what was typed in, and for
+# customers on one it is kept equal to the pack price (sync_rentals), so
+# everything that reads it (recovery calendar, risk scores, area rollups)
+# follows tariff changes. The internet charge is billed on top of it and never
+# written into monthly_rental.
+KINDS = ["tv", "internet"]
+KIND_LABELS = {"tv": "TV Pack", "internet": "Internet"}
+
+# Prices in effect on :as_of, one row per plan. The new_* columns equal the
+# current ones except for :plan_id, which gets the :new_* parameters (used by
+# preview_price_change; bills pass the current prices back in).
+PRICES_CTE = '''
+    price AS (
+        SELECT pp.plan_id, pp.base, pp.hd_surcharge, pp.extra_connection,
+               CASE WHEN pp.plan_id = :plan_id THEN :new_base ELSE pp.base END AS new_base,
+               CASE WHEN pp.plan_id = :plan_id THEN :new_hd ELSE pp.hd_surcharge END AS new_hd,
+               CASE WHEN pp.plan_id = :plan_id THEN :new_extra ELSE pp.extra_connection END AS new_extra
+        FROM plan_prices pp
+        WHERE pp.effective_from = (SELECT MAX(effective_from) FROM plan_prices
+                                   WHERE plan_id = pp.plan_id AND effective_from <= :as_of)
+    )
+'''
+NO_CHANGE = {"plan_id": None, "new_base": None, "new_hd": None, "new_extra": None}
+
+
+def dues_sql(prefix=""):
+    """ (tv, internet) amount expressions over customers cu, tv and net prices; prefix "new_" for proposed prices """
+    base, hd, extra = (f"{prefix}base", f"{prefix}hd" if prefix else "hd_surcharge", f"{prefix}extra" if prefix else "extra_connection")
+    rental = "COALESCE(CAST(cu.monthly_rental AS REAL), 0)"
+    extras = "MAX(COALESCE(CAST(cu.total_connections AS INTEGER), 1) - 1, 0)"
+    tv = f"CASE WHEN tv.plan_id IS NOT NULL THEN tv.{base} + (cu.stb_type = 'HD') * tv.{hd} + {extras} * tv.{extra} ELSE {rental} END"
+    internet = (f"CASE WHEN net.plan_id IS NOT NULL AND lower(trim(COALESCE(cu.net_acc_no, ''))) NOT IN ('', 'nan', 'none') "
+                f"THEN net.{base} ELSE 0 END")
+    return tv, internet
+
+
+DUES_FROM = '''
+    FROM customers cu
+    LEFT JOIN price tv ON tv.plan_id = cu.plan_id
+    LEFT JOIN price net ON net.plan_id = cu.internet_plan_id
+'''
+
+
+def init_billing(conn):
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS plans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE NOT NULL,
+            name TEXT,
+            kind TEXT NOT NULL DEFAULT 'tv'
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS plan_prices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            plan_id INTEGER NOT NULL REFERENCES plans(id),
+            effective_from TEXT NOT NULL,
+            base REAL NOT NULL DEFAULT 0,
+            hd_surcharge REAL NOT NULL DEFAULT 0,
+            extra_connection REAL NOT NULL DEFAULT 0,
+            UNIQUE (plan_id, effective_from)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS bills (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER NOT NULL,
+            bill_month TEXT NOT NULL,
+            tv_amount REAL NOT NULL,
+            internet_amount REAL NOT NULL,
+            amount REAL NOT NULL,
+            generated_at TIMESTAMP,
+            UNIQUE (customer_id, bill_month)
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bills_month ON bills(bill_month)")
+    for col in ("plan_id", "internet_plan_id"):
+        try: c.execute(f"SELECT {col} FROM customers LIMIT 1")
+        except sqlite3.OperationalError:
+            c.execute(f"ALTER TABLE customers ADD COLUMN {col} INTEGER REFERENCES plans(id)")
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_customers_{col} ON customers({col})")
+
+
+def first_of_month(month):
+    """ 'YYYY-MM' (or a date) -> the date its bills are priced at """
+    if isinstance(month, datetime.date):
+        return month.replace(day=1)
+    try: return datetime.date.fromisoformat(str(month).strip()[:7] + "-01")
+    except ValueError: raise ValueError(f"Bill month must be YYYY-MM, got {month!r}")
+
+
+def parse_amount(value, label):
+    try: amount = float(str(value).strip() or 0)
+    except ValueError: raise ValueError(f"{label} must be a number.")
+    if amount < 0:
+        raise ValueError(f"{label} cannot be negative.")
+    return amount
+
+
+def changed_rows(conn):
+    # cursor.rowcount is -1 for statements that start with WITH; changes() leaves out trigger writes too
+    return conn.execute("SELECT changes()").fetchone()[0]
+
+
+def save_price(conn, code, name, kind, base, hd_surcharge, extra_connection, effective_from):
+    """
+    Creates the plan if `code` is new and records its price from
+    `effective_from` on (replacing a price set for that same day). Returns the
+    plan id. The caller owns the transaction.
+    """
+    code = str(code).strip().upper()
+    if not code:
+        raise ValueError("Plan code is required.")
+    if kind not in KINDS:
+        raise ValueError(f"Unknown plan type: {kind}")
+    try: effective = datetime.date.fromisoformat(str(effective_from).strip())
+    except ValueError: raise ValueError("Effective date must be YYYY-MM-DD.")
+    prices = (parse_amount(base, "Base price"), parse_amount(hd_surcharge, "HD surcharge"),
+              parse_amount(extra_connection, "Extra connection charge"))
+    c = conn.cursor()
+    row = c.execute("SELECT id, kind FROM plans WHERE code = ?", (code,)).fetchone()
+    if row:
+        plan_id = row[0]
+        if row[1] != kind:
+            raise ValueError(f"{code} is already a {KIND_LABELS[row[1]]} plan.")
+        if name: c.execute("UPDATE plans SET name = ? WHERE id = ?", (name.strip(), plan_id))
+    else:
+        plan_id = c.execute("INSERT INTO plans (code, name, kind) VALUES (?, ?, ?)", (code, (name or code).strip(), kind)).lastrowid
+    c.execute('''
+        INSERT INTO plan_prices (plan_id, effective_from, base, hd_surcharge, extra_connection) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(plan_id, effective_from) DO UPDATE SET base = excluded.base,
+            hd_surcharge = excluded.hd_surcharge, extra_connection = excluded.extra_connection
+    ''', (plan_id, effective.isoformat(), *prices))
+    return plan_id
+
+
+def plan_list(conn, as_of=None):
+    """ [(id, code, name, kind, base, hd_surcharge, extra_connection, effective_from, subscribers, next_change)] """
+    as_of = (as_of or datetime.date.today()).isoformat()
+    c = conn.cursor()
+    c.execute(f'''
+        WITH {PRICES_CTE}
+        SELECT p.id, p.code, p.name, p.kind, pr.base, pr.hd_surcharge, pr.extra_connection,
+               (SELECT MAX(effective_from) FROM plan_prices WHERE plan_id = p.id AND effective_from <= :as_of),
+               (SELECT COUNT(*) FROM customers WHERE status = 'Active' AND (plan_id = p.id OR internet_plan_id = p.id)),
+               (SELECT MIN(effective_from) FROM plan_prices WHERE plan_id = p.id AND effective_from > :as_of)
+        FROM plans p LEFT JOIN price pr ON pr.plan_id = p.id
+        ORDER BY p.kind DESC, p.code
+    ''', {**NO_CHANGE, "as_of": as_of})
+    return c.fetchall()
+
+
+def current_price(conn, plan_id, as_of=None):
+    """ (base, hd_surcharge, extra_connection) in effect on `as_of`, or None """
+    return conn.execute('''
+        SELECT base, hd_surcharge, extra_connection FROM plan_prices
+        WHERE plan_id = ? AND effective_from <= ? ORDER BY effective_from DESC LIMIT 1
+    ''', (plan_id, (as_of or datetime.date.today()).isoformat())).fetchone()
+
+
+def sync_rentals(conn, as_of=None, customer_ids=None):
+    """
+    Sets monthly_rental to the TV pack price for customers on a TV pack, where
+    it differs. Customers on no TV pack keep their typed rental. Returns the
+    number of customers changed. The caller owns the transaction.
+    """
+    tv, _ = dues_sql()
+    params = {**NO_CHANGE, "as_of": (as_of or datetime.date.today()).isoformat()}
+    only = ""
+    if customer_ids is not None:
+        only = f"AND cu.id IN ({','.join(str(int(i)) for i in customer_ids) or 'NULL'})"
+    # Whole rupees are stored without a trailing ".0", like the rentals typed in by hand
+    conn.execute(f'''
+        WITH {PRICES_CTE},
+        due AS (
+            SELECT cu.id, {tv} AS amount {DUES_FROM}
+            WHERE tv.plan_id IS NOT NULL {only}
+        ),
+        rental AS (
+            SELECT id, CASE WHEN amount = CAST(amount AS INTEGER) THEN CAST(CAST(amount AS INTEGER) AS TEXT)
+                            ELSE CAST(amount AS TEXT) END AS value
+            FROM due
+        )
+        UPDATE customers SET monthly_rental = rental.value FROM rental
+        WHERE rental.id = customers.id AND customers.monthly_rental IS NOT rental.value
+    ''', params)
+    return changed_rows(conn)
+
+
+def assign_plans(conn, customer_id, plan_id, internet_plan_id):
+    """ Puts one customer on the given plans (None for none) and reprices them. The caller owns the transaction. """
+    conn.execute("UPDATE customers SET plan_id = ?, internet_plan_id = ? WHERE id = ?", (plan_id, internet_plan_id, customer_id))
+    sync_rentals(conn, customer_ids=[customer_id])
+
+
+def adopt_plan(conn, plan_id, as_of=None):
+    """
+    Moves active customers on no TV pack onto one wherever their current
+    monthly_rental is exactly what the plan would charge them, so an existing
+    base can be migrated without retyping anything. Returns the number moved.
+    The caller owns the transaction.
+    """
+    as_of = (as_of or datetime.date.today()).isoformat()
+    if conn.execute("SELECT kind FROM plans WHERE id = ?", (plan_id,)).fetchone() != ("tv",):
+        raise ValueError("Only TV packs can be matched against monthly rentals.")
+    conn.execute(f'''
+        WITH {PRICES_CTE}
+        UPDATE customers SET plan_id = :plan
+        WHERE id IN (
+            SELECT cu.id FROM customers cu JOIN price tv ON tv.plan_id = :plan
+            WHERE cu.status = 'Active' AND cu.plan_id IS NULL
+              AND abs(COALESCE(CAST(cu.monthly_rental AS REAL), 0)
+                      - (tv.base + (cu.stb_type = 'HD') * tv.hd_surcharge
+                         + MAX(COALESCE(CAST(cu.total_connections AS INTEGER), 1) - 1, 0) * tv.extra_connection)) < 0.005
+        )
+    ''', {**NO_CHANGE, "as_of": as_of, "plan": plan_id})
+    return changed_rows(conn)
+
+
+def run_bills(conn, bill_month):
+    """
+    Writes one bill per active customer for `bill_month` ('YYYY-MM') at the
+    prices in effect on its first day, replacing that month's earlier run.
+    Returns (bills, total). The caller owns the transaction.
+    """
+    as_of = first_of_month(bill_month)
+    month = as_of.strftime("%Y-%m")
+    tv, internet = dues_sql()
+    c = conn.cursor()
+    # "WHERE true" keeps the parser from reading ON CONFLICT as a join constraint
+    c.execute(f'''
+        WITH {PRICES_CTE}
+        INSERT INTO bills (customer_id, bill_month, tv_amount, internet_amount, amount, generated_at)
+        SELECT cu.id, :month, {tv}, {internet}, ({tv}) + ({internet}), datetime('now', 'localtime')
+        {DUES_FROM}
+        WHERE cu.status = 'Active' AND true
+        ON CONFLICT(customer_id, bill_month) DO UPDATE SET tv_amount = excluded.tv_amount,
+            internet_amount = excluded.internet_amount, amount = excluded.amount, generated_at = excluded.generated_at
+    ''', {**NO_CHANGE, "as_of": as_of.isoformat(), "month": month})
+    # Customers who went inactive since an earlier run of the same month
+    c.execute("DELETE FROM bills WHERE bill_month = ? AND customer_id NOT IN (SELECT id FROM customers WHERE status = 'Active')", (month,))
+    return c.execute("SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM bills WHERE bill_month = ?", (month,)).fetchone()
+
+
+def bill_months(conn, limit=6):
+    """ [(bill_month, bills, total)] for the latest runs """
+    c = conn.cursor()
+    c.execute('''
+        SELECT bill_month, COUNT(*), SUM(amount) FROM bills
+        GROUP BY bill_month ORDER BY bill_month DESC LIMIT ?
+    ''', (limit,))
+    return c.fetchall()
+
+
+def preview_price_change(conn, plan_id, base, hd_surcharge, extra_connection, as_of=None):
+    """
+    Revenue impact of repricing one plan, across every active customer, in a
+    single pass: {"customers", "current", "proposed"} for the plan's
+    subscribers and {"base_current", "base_proposed"} for the whole base.
+    """
+    tv, internet = dues_sql()
+    new_tv, new_internet = dues_sql("new_")
+    params = {"as_of": (as_of or datetime.date.today()).isoformat(), "plan_id": plan_id,
+              "new_base": parse_amount(base, "Base price"), "new_hd": parse_amount(hd_surcharge, "HD surcharge"),
+              "new_extra": parse_amount(extra_connection, "Extra connection charge")}
+    # A plan with no price in effect has no row in `price`, so there is nothing to compare against
+    if current_price(conn, plan_id, datetime.date.fromisoformat(params["as_of"])) is None:
+        raise ValueError("This plan has no price in effect yet; save one first.")
+    c = conn.cursor()
+    c.execute(f'''
+        WITH {PRICES_CTE},
+        due AS (
+            SELECT ({tv}) + ({internet}) AS current, ({new_tv}) + ({new_internet}) AS proposed,
+                   (cu.plan_id = :plan_id OR cu.internet_plan_id = :plan_id) AS on_plan
+            {DUES_FROM}
+            WHERE cu.status = 'Active'
+        )
+        SELECT COALESCE(SUM(on_plan), 0),
+               COALESCE(SUM(CASE WHEN on_plan THEN current END), 0), COALESCE(SUM(CASE WHEN on_plan THEN proposed END), 0),
+               COALESCE(SUM(current), 0), COALESCE(SUM(proposed), 0)
+        FROM due
+    ''', params)
+    customers, current, proposed, base_current, base_proposed = c.fetchone()
+    return {"customers": customers, "current": current, "proposed": proposed,
+            "base_current": base_current, "base_proposed": base_proposed}
+
+
+if __name__ == "__main__":
+    import sys
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else "cable_manager.db")
+    with conn:
+        init_billing(conn)
+        count, total = run_bills(conn, sys.argv[2] if len(sys.argv) > 2 else datetime.date.today())
+    print(f"{count} bill(s), total ₹{total:,.2f}")
+    for plan in plan_list(conn):
+        print(f"{plan[1]} ({KIND_LABELS[plan[3]]}): base {plan[4]}, HD +{plan[5]}, extra +{plan[6]}, {plan[8]} active")
+    conn.close()
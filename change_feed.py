@@ -0,0 +1,265 @@
+import sqlite3
+import datetime
+import json
+import os
+import time
+from timestamps import timestamp_now
+
+# --- CHANGE FEED ---
+# Triggers record every insert, update and delete on the replicated tables in
+# change_log, numbered by seq. Inserts carry the whole row, updates only the
+# columns that changed, deletes only the key, so a payment is a few hundred
+# bytes of log rather than a copy of the file.
+#
+# A standby database is seeded once with the online backup API, then kept
+# current by replaying the log in seq order, in batches. Each batch commits
+# together with the standby's checkpoint (replica_state.last_seq), so a
+# crash mid-batch neither loses nor repeats a change. Standbys report back
+# to replication_status on the primary; the log is pruned up to the slowest.
+#
+# The standby holds no triggers while it follows the primary (the replayed
+# rows already include their effects). Pointing the app at it recreates them,
+# so taking over is: copy nothing, open the standby file.
+REPLICATED_TABLES = {
+    "customers": "id",
+    "payment_history": "id",
+    "complaints": "id",
+    "inventory": "id",
+    # Kept so the standby is complete when it takes over: derived by triggers
+    # on the tables above, or referenced by them
+    "inventory_movements": "id",
+    "inventory_serials": "serial_no",
+    "devices": "id",
+    "areas": "id",
+    "plans": "id",
+    "plan_prices": "id",
+    "bills": "id",
+}
+BATCH_SIZE = 500
+MAX_BATCHES = 100  # per replicate() call (about 2s of work), so one call never runs for long
+REPLICATE_INTERVAL_MS = 5000
+KEEP_DAYS = 7  # log kept this long when no standby is following
+MAX_KEEP_DAYS = 30  # a standby further behind than this is reseeded
+BUSY_TIMEOUT_MS = 5000
+
+
+def init_change_feed(conn):
+    """ Run after every migration: the triggers list each column of each table """
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            row_key NOT NULL,
+            data TEXT,
+            changed_at TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime'))
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS replication_status (
+            standby TEXT PRIMARY KEY,
+            last_seq INTEGER NOT NULL,
+            applied_at TIMESTAMP,
+            lag_rows INTEGER,
+            lag_seconds REAL,
+            last_error TEXT
+        )
+    ''')
+    c.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_change_%'")
+    existing = dict(c.fetchall())
+    for table, key in REPLICATED_TABLES.items():
+        columns = [row[1] for row in c.execute(f"PRAGMA table_info({table})")]
+        if not columns: continue
+        for name, sql in change_triggers(table, key, columns).items():
+            if existing.get(name) == sql: continue
+            # New table, or its columns changed since the trigger was made
+            c.execute(f"DROP TRIGGER IF EXISTS {name}")
+            c.execute(sql)
+
+
+def change_triggers(table, key, columns):
+    def row_json(ref):
+        return "json_object(" + ", ".join(f"'{col}', {ref}.\"{col}\"" for col in columns) + ")"
+    # Unchanged columns are removed from the update image; '$.-' matches nothing
+    unchanged = ", ".join(f"CASE WHEN NEW.\"{col}\" IS OLD.\"{col}\" THEN '$.\"{col}\"' ELSE '$.-' END"
+                          for col in columns if col != key)
+    entry = "INSERT INTO change_log (table_name, op, row_key, data) VALUES"
+    return {
+        f"trg_change_{table}_insert": f"CREATE TRIGGER trg_change_{table}_insert AFTER INSERT ON {table} BEGIN "
+                                      f"{entry} ('{table}', 'I', NEW.\"{key}\", {row_json('NEW')}); END",
+        f"trg_change_{table}_update": f"CREATE TRIGGER trg_change_{table}_update AFTER UPDATE ON {table} BEGIN "
+                                      f"{entry} ('{table}', CASE WHEN NEW.\"{key}\" IS OLD.\"{key}\" THEN 'U' ELSE 'I' END, NEW.\"{key}\", "
+                                      f"CASE WHEN NEW.\"{key}\" IS OLD.\"{key}\" THEN json_remove({row_json('NEW')}, {unchanged}) ELSE {row_json('NEW')} END); "
+                                      f"INSERT INTO change_log (table_name, op, row_key) SELECT '{table}', 'D', OLD.\"{key}\" WHERE NEW.\"{key}\" IS NOT OLD.\"{key}\"; END",
+        f"trg_change_{table}_delete": f"CREATE TRIGGER trg_change_{table}_delete AFTER DELETE ON {table} BEGIN "
+                                      f"INSERT INTO change_log (table_name, op, row_key) VALUES ('{table}', 'D', OLD.\"{key}\"); END",
+    }
+
+
+def prune_log(conn, keep_days=KEEP_DAYS):
+    """ Drops changes every standby has applied (or old ones when none follows). The caller owns the transaction. """
+    followers, slowest = conn.execute("SELECT COUNT(*), MIN(last_seq) FROM replication_status").fetchone()
+    days = MAX_KEEP_DAYS if followers else keep_days
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    conn.execute("DELETE FROM change_log WHERE seq <= ? OR changed_at < ?", (slowest or 0, cutoff))
+
+
+def record_status(conn, status):
+    """ Stores a replicate() result on the primary. The caller owns the transaction. """
+    conn.execute('''
+        INSERT INTO replication_status (standby, last_seq, applied_at, lag_rows, lag_seconds, last_error)
+        VALUES (:standby, :last_seq, :applied_at, :lag_rows, :lag_seconds, :error)
+        ON CONFLICT(standby) DO UPDATE SET last_seq = excluded.last_seq, applied_at = excluded.applied_at,
+            lag_rows = excluded.lag_rows, lag_seconds = excluded.lag_seconds, last_error = excluded.last_error
+    ''', status)
+
+
+def standby_statuses(conn):
+    c = conn.cursor()
+    c.execute("SELECT standby, last_seq, applied_at, lag_rows, lag_seconds, last_error FROM replication_status ORDER BY standby")
+    return c.fetchall()
+
+
+# --- STANDBY ---
+def standby_checkpoint(standby):
+    """ The standby's last applied seq, or None when it has to be (re)seeded """
+    try:
+        row = standby.execute("SELECT last_seq FROM replica_state WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def seed_standby(primary, standby, source):
+    """ Full copy through the backup API; the copy's own change_log says where replay starts """
+    primary.backup(standby)
+    standby.execute("BEGIN IMMEDIATE")
+    for (name,) in standby.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+        standby.execute(f"DROP TRIGGER {name}")
+    last_seq = standby.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    standby.execute("DELETE FROM change_log")
+    standby.execute("DELETE FROM replication_status")
+    standby.execute('''
+        CREATE TABLE IF NOT EXISTS replica_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            source TEXT,
+            last_seq INTEGER NOT NULL,
+            seeded_at TIMESTAMP,
+            applied_at TIMESTAMP
+        )
+    ''')
+    standby.execute("INSERT OR REPLACE INTO replica_state VALUES (1, ?, ?, ?, ?)", (source, last_seq, timestamp_now(), timestamp_now()))
+    standby.execute("COMMIT")
+    return last_seq
+
+
+def apply_change(standby, columns, table, key, op, row_key, data):
+    if op == "D":
+        standby.execute(f"DELETE FROM {table} WHERE \"{key}\" = ?", (row_key,))
+        return
+    values = json.loads(data) if data else {}
+    values.pop(key, None)
+    known = columns.setdefault(table, {row[1] for row in standby.execute(f"PRAGMA table_info({table})")})
+    if not known:
+        # Table added on the primary by a newer app version
+        standby.execute(f"CREATE TABLE {table} (\"{key}\" {'INTEGER ' if key == 'id' else ''}PRIMARY KEY)")
+        known.add(key)
+    for col in values.keys() - known:
+        # Column added on the primary by a newer app version
+        standby.execute(f"ALTER TABLE {table} ADD COLUMN \"{col}\"")
+        known.add(col)
+    if values:
+        assignments = ", ".join(f"\"{col}\" = ?" for col in values)
+        updated = standby.execute(f"UPDATE {table} SET {assignments} WHERE \"{key}\" = ?", list(values.values()) + [row_key]).rowcount
+    else:
+        updated = standby.execute(f"SELECT COUNT(*) FROM {table} WHERE \"{key}\" = ?", (row_key,)).fetchone()[0]
+    if not updated:
+        names = ", ".join(f"\"{col}\"" for col in [key, *values])
+        standby.execute(f"INSERT INTO {table} ({names}) VALUES ({', '.join('?' * (len(values) + 1))})", [row_key, *values.values()])
+
+
+def replicate(primary_file, standby_file, batch_size=BATCH_SIZE, max_batches=MAX_BATCHES):
+    """
+    Brings the standby up to date (seeding it first if needed) and returns its
+    status: {"standby", "last_seq", "applied", "seeded", "lag_rows",
+    "lag_seconds", "applied_at", "error"}. Nothing is written to the primary.
+    """
+    primary = sqlite3.connect(primary_file, isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000)
+    standby = sqlite3.connect(standby_file, isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000)
+    status = {"standby": os.path.abspath(standby_file), "applied": 0, "seeded": False, "error": None}
+    try:
+        if os.path.abspath(primary_file) == os.path.abspath(standby_file):
+            raise ValueError("The standby must be a different file from the primary")
+        standby.execute("PRAGMA journal_mode = WAL")
+        last_seq = standby_checkpoint(standby)
+        if last_seq is None and standby.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]:
+            raise ValueError(f"{standby_file} holds data but is not a standby; it will not be overwritten")
+        oldest = primary.execute("SELECT MIN(seq) FROM change_log").fetchone()[0]
+        if last_seq is None or (oldest is not None and oldest > last_seq + 1):
+            # New standby, or one so far behind that the changes it needs were pruned
+            last_seq = seed_standby(primary, standby, os.path.abspath(primary_file))
+            status["seeded"] = True
+
+        columns = {}
+        for _ in range(max_batches):
+            batch = primary.execute("SELECT seq, table_name, op, row_key, data FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?",
+                                    (last_seq, batch_size)).fetchall()
+            if not batch: break
+            standby.execute("BEGIN IMMEDIATE")
+            try:
+                for seq, table, op, row_key, data in batch:
+                    apply_change(standby, columns, table, REPLICATED_TABLES.get(table, "id"), op, row_key, data)
+                last_seq = batch[-1][0]
+                standby.execute("UPDATE replica_state SET last_seq = ?, applied_at = ? WHERE id = 1", (last_seq, timestamp_now()))
+                standby.execute("COMMIT")
+            except Exception:
+                standby.execute("ROLLBACK")
+                raise
+            status["applied"] += len(batch)
+            if len(batch) < batch_size: break
+    except (sqlite3.Error, OSError, ValueError) as e:
+        status["error"] = str(e)
+        last_seq = standby_checkpoint(standby) or 0
+    finally:
+        standby.close()
+
+    try:
+        behind, first_pending = primary.execute(
+            "SELECT COUNT(*), MIN(changed_at) FROM change_log WHERE seq > ?", (last_seq,)).fetchone()
+    finally:
+        primary.close()
+    lag = (datetime.datetime.now() - datetime.datetime.fromisoformat(first_pending)).total_seconds() if first_pending else 0.0
+    status.update(last_seq=last_seq, lag_rows=behind, lag_seconds=round(max(lag, 0.0), 1), applied_at=timestamp_now())
+    return status
+
+
+def promote(standby_file):
+    """ Turns a standby into a stand-alone database; the app recreates its triggers on start """
+    conn = sqlite3.connect(standby_file)
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS replica_state")
+    conn.close()
+
+
+if __name__ == "__main__":
+    import sys
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if "--promote" in sys.argv and args:
+        promote(args[0])
+        print(f"{args[0]} promoted. Point the app's db_file at it to take over.")
+    elif len(args) == 2:
+        primary_file, standby_file = args
+        while True:
+            status = replicate(primary_file, standby_file)
+            conn = sqlite3.connect(primary_file, timeout=BUSY_TIMEOUT_MS / 1000)
+            with conn:
+                record_status(conn, status)
+                prune_log(conn)
+            conn.close()
+            print(f"{status['applied_at']}  applied {status['applied']}  seq {status['last_seq']}  "
+                  f"lag {status['lag_rows']} change(s) / {status['lag_seconds']}s" + (f"  ERROR {status['error']}" if status["error"] else ""))
+            if "--follow" not in sys.argv: break
+            time.sleep(REPLICATE_INTERVAL_MS / 1000)
+    else:
+        print("usage: change_feed.py PRIMARY.db STANDBY.db [--follow] | change_feed.py STANDBY.db --promote")
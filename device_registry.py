@@ -0,0 +1,143 @@
+import sqlite3
+import pandas as pd
+
+# --- DEVICE REGISTRY ---
+# One row per serial-numbered device held by a customer. The unique index on
+# (device_type, serial_no) rejects a serial being assigned twice and gives an
+# index lookup from device to customer. Triggers on customers keep it current.
+DEVICE_COLUMNS = {"STB": "stb_no", "SMART_CARD": "smart_card_no", "ROUTER": "wifi_router_id"}
+
+# Placeholder values that older imports wrote instead of leaving the cell empty
+BLANK_SERIALS = ("", "nan", "none")
+
+
+def valid_serial_sql(expr):
+    return f"lower(trim(COALESCE({expr}, ''))) NOT IN {BLANK_SERIALS}"
+
+
+def init_registry(conn):
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='devices'")
+    new_registry = c.fetchone() is None
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS devices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_type TEXT NOT NULL,
+            serial_no TEXT NOT NULL COLLATE NOCASE,
+            customer_id INTEGER NOT NULL
+        )
+    ''')
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_devices_serial ON devices(device_type, serial_no)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_devices_customer ON devices(customer_id)")
+
+    # Existing duplicates cannot all go in; the first holder wins and the rest
+    # show up in find_duplicate_serials() for cleanup.
+    if new_registry:
+        for device_type, column in DEVICE_COLUMNS.items():
+            c.execute(f'''
+                INSERT OR IGNORE INTO devices (device_type, serial_no, customer_id)
+                SELECT ?, trim({column}), id FROM customers WHERE {valid_serial_sql(column)} ORDER BY id
+            ''', (device_type,))
+
+    def insert_sql(device_type, column):
+        return (f"INSERT INTO devices (device_type, serial_no, customer_id) SELECT '{device_type}', trim(NEW.{column}), NEW.id "
+                f"WHERE {valid_serial_sql('NEW.' + column)};")
+
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_devices_customer_insert
+        AFTER INSERT ON customers
+        BEGIN
+            {" ".join(insert_sql(t, col) for t, col in DEVICE_COLUMNS.items())}
+        END
+    ''')
+    # One trigger per column, touching only that device's row: a customer whose
+    # other serial was skipped as a legacy duplicate can still be edited.
+    c.execute("DROP TRIGGER IF EXISTS trg_devices_customer_update")
+    for device_type, column in DEVICE_COLUMNS.items():
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_devices_{column}_update
+            AFTER UPDATE OF {column} ON customers
+            WHEN NEW.{column} IS NOT OLD.{column}
+            BEGIN
+                DELETE FROM devices WHERE customer_id = NEW.id AND device_type = '{device_type}';
+                {insert_sql(device_type, column)}
+            END
+        ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_devices_customer_delete
+        AFTER DELETE ON customers
+        BEGIN
+            DELETE FROM devices WHERE customer_id = OLD.id;
+        END
+    ''')
+
+
+def lookup_device(conn, serial_no, device_type=None):
+    """ [(device_type, customer_id)] for an exact serial, served by ux_devices_serial """
+    c = conn.cursor()
+    types = [device_type] if device_type else list(DEVICE_COLUMNS)
+    c.execute(f"SELECT device_type, customer_id FROM devices WHERE device_type IN ({','.join('?' * len(types))}) AND serial_no = ?",
+              types + [serial_no.strip()])
+    return c.fetchall()
+
+
+def find_duplicate_serials(conn):
+    """ All serials held by more than one customer, from a single grouped query over customers """
+    union = " UNION ALL ".join(
+        f"SELECT '{t}' AS device_type, trim({col}) AS serial_no, id, name, can FROM customers WHERE {valid_serial_sql(col)}"
+        for t, col in DEVICE_COLUMNS.items())
+    c = conn.cursor()
+    c.execute(f'''
+        SELECT device_type, serial_no, COUNT(*), group_concat(name || ' (CAN: ' || COALESCE(can, '') || ')', '; ')
+        FROM ({union})
+        GROUP BY device_type, serial_no COLLATE NOCASE
+        HAVING COUNT(*) > 1
+        ORDER BY COUNT(*) DESC, device_type, serial_no
+    ''')
+    return c.fetchall()
+
+
+def validate_import_serials(conn, df, column_map):
+    """
+    Splits an import DataFrame into (accepted, rejected) before any insert.
+    `column_map` maps a sheet column to a device type, e.g. {'STB No': 'STB'}.
+    A row is rejected if a serial repeats within the file or is already
+    registered to another customer. Vectorized over the whole sheet.
+    """
+    rejected = pd.Series(False, index=df.index)
+    reasons = pd.Series("", index=df.index)
+    c = conn.cursor()
+
+    for sheet_col, device_type in column_map.items():
+        if sheet_col not in df.columns: continue
+        serials = df[sheet_col].astype(str).str.strip()
+        valid = ~serials.str.lower().isin(BLANK_SERIALS) & df[sheet_col].notna()
+        key = serials.str.upper()
+
+        c.execute("SELECT upper(serial_no) FROM devices WHERE device_type = ?", (device_type,))
+        registered = {row[0] for row in c.fetchall()}
+
+        in_file = valid & key.duplicated(keep="first")
+        in_db = valid & key.isin(registered)
+        reasons[in_file & ~rejected] = f"{sheet_col} repeated in file"
+        rejected |= in_file
+        reasons[in_db & ~rejected] = f"{sheet_col} already registered"
+        rejected |= in_db
+
+    out = df[rejected].copy()
+    out["reason"] = reasons[rejected]
+    return df[~rejected], out
+
+
+if __name__ == "__main__":
+    import sys
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else "cable_manager.db")
+    init_registry(conn)
+    conn.commit()
+    dups = find_duplicate_serials(conn)
+    conn.close()
+    if not dups:
+        print("No duplicate serial numbers found.")
+    for device_type, serial, count, holders in dups:
+        print(f"{device_type} {serial} x{count}: {holders}")
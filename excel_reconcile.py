@@ -0,0 +1,271 @@
+import sqlite3
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+import inventory_ledger
+
+# --- TWO-WAY EXCEL RECONCILIATION ---
+# Rows are keyed by CAN and compared by a hash of the columns both sides own.
+# The hash agreed on at the last reconciliation is kept in excel_sync_state, so
+# a difference can be attributed to the side that changed:
+#   sheet changed only -> update_db      app changed only -> update_sheet
+#   both changed       -> conflict       (the user picks a side)
+# Paid / Payment Date are left out: the payment sync owns those cells.
+EXCEL_FILE = "Sample_Customer_List.xlsx"
+DB_FILE = "cable_manager.db"
+SYNC_COLUMNS = {"CAN": "can", "Customer Name": "name", "Address": "address", "Contact": "contact_no", "STB No": "stb_no"}
+VALUE_COLUMNS = [col for col in SYNC_COLUMNS.values() if col != "can"]
+ACTIONS = ["insert_db", "update_db", "delete_db", "insert_sheet", "update_sheet", "delete_sheet", "conflict"]
+
+
+def init_sync_state(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS excel_sync_state (can TEXT PRIMARY KEY, row_hash TEXT) WITHOUT ROWID")
+    conn.execute("CREATE TABLE IF NOT EXISTS excel_sync_meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+
+
+def clean_key(val):
+    if pd.isna(val): return ""
+    val = str(val).strip()
+    if val.lower() == "nan": return ""
+    try: return str(int(float(val)))
+    except ValueError: return val
+
+
+def normalize(frame):
+    """ String-normalizes the synced columns so both sides hash identically """
+    out = pd.DataFrame({"can": frame["can"].map(clean_key), "contact_no": frame["contact_no"].map(clean_key)})
+    for col in ("name", "address", "stb_no"):
+        out[col] = frame[col].fillna("").astype(str).str.strip().replace("nan", "")
+    out = out[out["can"] != ""]
+    return out.drop_duplicates("can", keep="first").set_index("can")
+
+
+def row_hashes(frame):
+    return pd.util.hash_pandas_object(frame[VALUE_COLUMNS], index=False).map("{:016x}".format)
+
+
+def file_fingerprint(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return str(os.path.getmtime(path)), h.hexdigest()
+
+
+def get_meta(conn):
+    return dict(conn.execute("SELECT key, value FROM excel_sync_meta").fetchall())
+
+
+def set_meta(conn, **values):
+    conn.executemany("INSERT OR REPLACE INTO excel_sync_meta (key, value) VALUES (?, ?)", list(values.items()))
+
+
+def plan_reconciliation(conn, excel_file=EXCEL_FILE, force=False):
+    """
+    Compares the workbook with the customers table in one vectorized pass.
+    Returns None when the workbook is unchanged since the last reconciliation
+    (checked by mtime, then by content hash), otherwise a plan dict holding a
+    DataFrame per action plus the loaded sheet for apply_reconciliation().
+    """
+    init_sync_state(conn)
+    mtime, digest = None, None
+    if not force:
+        meta = get_meta(conn)
+        mtime = str(os.path.getmtime(excel_file))
+        if meta.get("mtime") == mtime:
+            return None
+        mtime, digest = file_fingerprint(excel_file)
+        if meta.get("sha256") == digest:
+            with conn: set_meta(conn, mtime=mtime)
+            return None
+
+    raw = pd.read_excel(excel_file)
+    for col in SYNC_COLUMNS:
+        if col not in raw.columns: raw[col] = ""
+    sheet = normalize(raw[list(SYNC_COLUMNS)].rename(columns=SYNC_COLUMNS))
+    db = normalize(pd.read_sql_query("SELECT can, name, address, contact_no, stb_no FROM customers", conn))
+    base = pd.read_sql_query("SELECT can, row_hash AS h_base FROM excel_sync_state", conn).set_index("can")
+
+    sheet["h_sheet"] = row_hashes(sheet).values
+    db["h_db"] = row_hashes(db).values
+    m = sheet.join(db, how="outer", lsuffix="_sheet", rsuffix="_db").join(base, how="left")
+
+    in_sheet, in_db, has_base = m["h_sheet"].notna(), m["h_db"].notna(), m["h_base"].notna()
+    sheet_same = m["h_sheet"] == m["h_base"]
+    db_same = m["h_db"] == m["h_base"]
+    both = in_sheet & in_db
+
+    m["action"] = np.select(
+        [both & (m["h_sheet"] == m["h_db"]),
+         both & db_same,
+         both & sheet_same,
+         both,
+         in_sheet & ~has_base,
+         in_sheet & sheet_same,
+         in_db & ~has_base,
+         in_db & db_same],
+        ["same", "update_db", "update_sheet", "conflict",
+         "insert_db", "delete_sheet", "insert_sheet", "delete_db"],
+        default="conflict")
+
+    plan = {action: m[m["action"] == action] for action in ACTIONS}
+    plan["same"] = m[m["action"] == "same"]
+    plan["sheet"] = raw
+    plan["fingerprint"] = (mtime, digest)
+    return plan
+
+
+def sheet_values(rows):
+    return rows[[f"{col}_sheet" if f"{col}_sheet" in rows.columns else col for col in VALUE_COLUMNS]].fillna("").values.tolist()
+
+
+def db_values(rows):
+    return rows[[f"{col}_db" if f"{col}_db" in rows.columns else col for col in VALUE_COLUMNS]].fillna("").values.tolist()
+
+
+def stored_ids(conn):
+    """ Maps each normalized CAN to the id of the row normalize() kept for it """
+    ids = {}
+    for row_id, can in conn.execute("SELECT id, can FROM customers ORDER BY id"):
+        ids.setdefault(clean_key(can), row_id)
+    return ids
+
+
+def apply_reconciliation(run, plan, excel_file=EXCEL_FILE, resolutions=None):
+    """
+    Applies a plan in batch: one DB transaction and one workbook write.
+    `run` is WriteService.run; the database side goes through it as a single
+    job. `resolutions` maps a conflicting CAN to 'sheet' or 'db'; unresolved
+    conflicts are left alone and will show up again next time.
+    """
+    resolutions = resolutions or {}
+    conflicts = plan["conflict"]
+    take_sheet = conflicts[conflicts.index.isin([can for can, side in resolutions.items() if side == "sheet"])]
+    take_db = conflicts[conflicts.index.isin([can for can, side in resolutions.items() if side == "db"])]
+
+    to_db = pd.concat([plan["update_db"], plan["insert_db"], take_sheet[take_sheet["h_sheet"].notna()]])
+    db_deletes = list(plan["delete_db"].index) + list(take_sheet[take_sheet["h_sheet"].isna()].index)
+    to_sheet = pd.concat([plan["update_sheet"], plan["insert_sheet"], take_db[take_db["h_db"].notna()]])
+    sheet_deletes = set(plan["delete_sheet"].index) | set(take_db[take_db["h_db"].isna()].index)
+
+    writes_sheet = len(to_sheet) > 0 or len(sheet_deletes) > 0
+    if writes_sheet:
+        try:
+            with open(excel_file, "r+"): pass
+        except IOError:
+            raise PermissionError("Please close the Excel file before applying changes.")
+
+    # 1. Database side. Rows are matched by id, since the stored CAN may not be
+    #    in normalized form ("1001.0"), and a hash is only agreed for a CAN whose
+    #    write actually landed. Devices move through the stock ledger as they do
+    #    from the customer form; a row whose serial cannot be issued (or is held
+    #    by another customer) is skipped and comes up again next time.
+    def write_row(conn, can, write):
+        conn.execute("SAVEPOINT reconcile_row")
+        try:
+            changed = write()
+        except (ValueError, sqlite3.IntegrityError) as e:
+            conn.execute("ROLLBACK TO reconcile_row")
+            conn.execute("RELEASE reconcile_row")
+            skipped.append((can, str(e)))
+            return False
+        conn.execute("RELEASE reconcile_row")
+        return changed
+
+    def update_row(conn, cust_id, values):
+        old = conn.execute("SELECT stb_no, wifi_router_id FROM customers WHERE id=?", (cust_id,)).fetchone()
+        if old is None: return False
+        inventory_ledger.sync_customer_devices(conn, cust_id, {"stb_no": old[0], "wifi_router_id": old[1]},
+                                               {"stb_no": values[3], "wifi_router_id": old[1]})
+        return conn.execute("UPDATE customers SET name=?, address=?, contact_no=?, stb_no=? WHERE id=?", (*values, cust_id)).rowcount == 1
+
+    def insert_row(conn, can, values):
+        cust_id = conn.execute("INSERT INTO customers (can, name, address, contact_no, stb_no, status, stb_type, outstanding_amount) "
+                               "VALUES (?, ?, ?, ?, ?, 'Active', 'SD', '0')", (can, *values)).lastrowid
+        inventory_ledger.sync_customer_devices(conn, cust_id, {}, {"stb_no": values[3]})
+        return True
+
+    def delete_row(conn, cust_id):
+        old = conn.execute("SELECT stb_no, wifi_router_id FROM customers WHERE id=?", (cust_id,)).fetchone()
+        if old is None: return False
+        inventory_ledger.sync_customer_devices(conn, cust_id, {"stb_no": old[0], "wifi_router_id": old[1]}, {})
+        return conn.execute("DELETE FROM customers WHERE id=?", (cust_id,)).rowcount == 1
+
+    skipped = []
+
+    def write_db(conn):
+        ids = stored_ids(conn)
+        applied, deleted = [], []
+        for can, values in zip(to_db.index, sheet_values(to_db)):
+            if can in ids:
+                landed = write_row(conn, can, lambda: update_row(conn, ids[can], values))
+            else:
+                landed = write_row(conn, can, lambda: insert_row(conn, can, values))
+            if landed: applied.append(can)
+        for can in db_deletes:
+            if can in ids and write_row(conn, can, lambda: delete_row(conn, ids[can])):
+                deleted.append(can)
+        agreed = pd.concat([plan["same"]["h_sheet"], to_db.loc[applied, "h_sheet"]])
+        conn.executemany("INSERT OR REPLACE INTO excel_sync_state (can, row_hash) VALUES (?, ?)", list(agreed.items()))
+        conn.executemany("DELETE FROM excel_sync_state WHERE can=?", [(can,) for can in deleted])
+        updated = sum(1 for can in applied if can in ids)
+        return updated, len(applied) - updated, len(deleted)
+
+    db_updates, db_inserts, db_deleted = run(write_db)
+
+    # 2. Workbook side, written once. Its agreed hashes are only recorded after the
+    #    write succeeds, otherwise the next run would read the stale cells as edits.
+    if writes_sheet:
+        df = plan["sheet"].copy()
+        df["CAN"] = df["CAN"].map(clean_key)
+        for col in ("Customer Name", "Address", "Contact", "STB No"):
+            df[col] = df[col].astype(object)
+        if sheet_deletes:
+            df = df[~df["CAN"].isin(sheet_deletes)]
+        positions = {can: idx for idx, can in zip(df.index, df["CAN"])}
+        new_rows = []
+        for can, values in zip(to_sheet.index, db_values(to_sheet)):
+            record = dict(zip(["Customer Name", "Address", "Contact", "STB No"], values))
+            if can in positions:
+                for col, val in record.items():
+                    df.at[positions[can], col] = val
+            else:
+                new_rows.append({"CAN": can, **record, "Paid": "0"})
+        if new_rows:
+            df = pd.concat([df, pd.DataFrame(new_rows)], ignore_index=True)
+        df.to_excel(excel_file, index=False)
+
+    mtime, digest = file_fingerprint(excel_file)
+
+    def write_sheet_state(conn):
+        conn.executemany("INSERT OR REPLACE INTO excel_sync_state (can, row_hash) VALUES (?, ?)", list(to_sheet["h_db"].items()))
+        conn.executemany("DELETE FROM excel_sync_state WHERE can=?", [(can,) for can in sheet_deletes])
+        set_meta(conn, mtime=mtime, sha256=digest)
+
+    run(write_sheet_state)
+
+    return {"db_updates": db_updates, "db_inserts": db_inserts, "db_deletes": db_deleted,
+            "sheet_updates": len(to_sheet), "sheet_deletes": len(sheet_deletes), "db_skipped": skipped,
+            "unresolved": len(conflicts) - len(take_sheet) - len(take_db)}
+
+
+def summarize(plan):
+    return {action: len(plan[action]) for action in ACTIONS + ["same"]}
+
+
+if __name__ == "__main__":
+    import sys
+    conn = sqlite3.connect(DB_FILE)
+    plan = plan_reconciliation(conn, force="--force" in sys.argv)
+    if plan is None:
+        print("Workbook unchanged since last reconciliation.")
+    else:
+        print(summarize(plan))
+        if "--apply" in sys.argv:
+            from write_queue import WriteService
+            writes = WriteService(DB_FILE)
+            writes.start()
+            try: print(apply_reconciliation(writes.run, plan))
+            finally: writes.stop()
+    conn.close()
@@ -0,0 +1,76 @@
+import os
+import pandas as pd
+
+# --- EXCEL SYNC ---
+# Applies write intents (see write_queue) to the customer workbook. Every
+# intent is idempotent, so replaying one that already reached the workbook
+# before a crash is harmless. Pending intents are applied together with one
+# read and one write of the file.
+EXCEL_FILE = "Sample_Customer_List.xlsx"
+SHEET_COLUMNS = ["CAN", "Customer Name", "Address", "Contact", "STB No", "Payment Date", "Paid"]
+
+
+def ensure_unlocked(excel_file):
+    try:
+        with open(excel_file, "r+"): pass
+    except IOError:
+        raise PermissionError("Please close the Excel file to sync changes.")
+
+
+def read_sheet(excel_file):
+    df = pd.read_excel(excel_file)
+    df['CAN'] = df['CAN'].astype(str)
+    # Cells are written back as the app's strings, whatever dtype pandas inferred
+    for col in SHEET_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(object)
+    return df
+
+
+def apply_payments(df, payload, missing):
+    """ payload: {"payments": [[can, amount, date], ...]} """
+    positions = {can: idx for idx, can in zip(df.index, df['CAN'])}
+    for can, amount, date in payload["payments"]:
+        idx = positions.get(str(can))
+        if idx is None:
+            missing.append(str(can))
+            continue
+        df.at[idx, 'Paid'] = amount
+        df.at[idx, 'Payment Date'] = date
+    return df
+
+
+def apply_customer(df, payload, missing):
+    """ payload: {"can", "name", "address", "contact", "stb", "date"}; appends unknown CANs """
+    can = str(payload["can"])
+    record = {'Customer Name': payload["name"], 'Address': payload["address"], 'Contact': payload["contact"],
+              'STB No': payload["stb"], 'Payment Date': payload["date"]}
+    matches = df.index[df['CAN'] == can]
+    if len(matches):
+        for col, val in record.items():
+            df.at[matches[0], col] = val
+        return df
+    return pd.concat([df, pd.DataFrame([{'CAN': can, **record, 'Paid': '0'}])], ignore_index=True)
+
+
+def apply_delete(df, payload, missing):
+    """ payload: {"can"} """
+    return df[df['CAN'] != str(payload["can"])]
+
+
+APPLIERS = {"payments": apply_payments, "customer": apply_customer, "delete_customer": apply_delete}
+
+
+def apply_intents(excel_file, intents):
+    """
+    Applies [(id, kind, payload)] in order. Returns the CANs that payments could
+    not find in the sheet. Raises PermissionError while the workbook is open.
+    """
+    if not intents or not os.path.exists(excel_file): return []
+    ensure_unlocked(excel_file)
+    df = read_sheet(excel_file)
+    missing = []
+    for _, kind, payload in intents:
+        df = APPLIERS[kind](df, payload, missing)
+    df.to_excel(excel_file, index=False)
+    return missing
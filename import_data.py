@@ -1,6 +1,7 @@
 import sqlite3
 import pandas as pd
 import os
+import device_registry
 
 # --- CONFIGURATION ---
 EXCEL_FILE = "Sample_Customer_List.xlsx" 
@@ -65,10 +66,16 @@ def import_data():
     df = pd.read_excel(EXCEL_FILE)
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
+    device_registry.init_registry(conn)
     
-    count = 0
     print("Starting import...")
+
+    # Reject conflicting STB serials up front, for the whole sheet at once
+    df, rejected = device_registry.validate_import_serials(conn, df, {'STB No': 'STB'})
+    for index, row in rejected.iterrows():
+        print(f"  -> Skipped row {index + 2} ({clean_text(row.get('Customer Name'))}): {row['reason']}")
     
+    rows = []
     for index, row in df.iterrows():
         can = clean_can(row.get('CAN'))
         name = clean_text(row.get('Customer Name'))
@@ -77,15 +84,15 @@ def import_data():
         stb = clean_text(row.get('STB No'))
         rec_date = clean_text(row.get('Payment Date')) 
         rental = clean_text(row.get('Paid'))
+        rows.append((can, name, address, contact, stb, rec_date, rental, "", "Active", "SD", "0"))
         
-        # Now safe to run, even if DB was old
-        cursor.execute('''
-            INSERT INTO customers (
-                can, name, address, contact_no, stb_no, recovery_date, monthly_rental, area, status, stb_type, outstanding_amount
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (can, name, address, contact, stb, rec_date, rental, "", "Active", "SD", "0"))
-        
-        count += 1
+    # Now safe to run, even if DB was old
+    cursor.executemany('''
+        INSERT INTO customers (
+            can, name, address, contact_no, stb_no, recovery_date, monthly_rental, area, status, stb_type, outstanding_amount
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    count = len(rows)
 
     conn.commit()
     conn.close()
@@ -0,0 +1,216 @@
+import sqlite3
+import os
+import pandas as pd
+from device_registry import BLANK_SERIALS
+from timestamps import timestamp_now
+
+# --- STOCK MOVEMENT LEDGER ---
+# Every stock change is a row in inventory_movements. The inventory table keeps
+# the current quantity per item and inventory_serials the current holder of
+# each serial-numbered unit; both are maintained by the trigger below, so the
+# application only ever appends movements.
+MOVEMENTS = ("IN", "OUT", "ISSUED", "RETURNED")
+
+# Customer columns that hold serial-numbered stock, mapped to the inventory item
+CUSTOMER_DEVICE_ITEMS = {"stb_no": "Set Top Box", "wifi_router_id": "WiFi Router"}
+
+
+def init_ledger(conn):
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='inventory_movements'")
+    new_ledger = c.fetchone() is None
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_name TEXT NOT NULL,
+            movement TEXT NOT NULL CHECK (movement IN ('IN', 'OUT', 'ISSUED', 'RETURNED')),
+            quantity INTEGER NOT NULL DEFAULT 1 CHECK (quantity > 0),
+            serial_no TEXT,
+            customer_id INTEGER,
+            remarks TEXT,
+            created_at TIMESTAMP
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_serials (
+            serial_no TEXT PRIMARY KEY,
+            item_name TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'IN_STOCK',
+            customer_id INTEGER,
+            updated_at TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_movements_item ON inventory_movements(item_name, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_movements_customer ON inventory_movements(customer_id) WHERE customer_id IS NOT NULL")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_inventory_serials_customer ON inventory_serials(customer_id) WHERE customer_id IS NOT NULL")
+
+    # Carry the existing stock counts over as opening balances before the trigger exists,
+    # otherwise the quantities would be added twice.
+    if new_ledger:
+        now = timestamp_now()
+        c.execute('''
+            INSERT INTO inventory_movements (item_name, movement, quantity, remarks, created_at)
+            SELECT item_name, CASE WHEN quantity > 0 THEN 'IN' ELSE 'OUT' END, ABS(quantity), 'Opening balance', ?
+            FROM inventory WHERE quantity != 0
+        ''', (now,))
+
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_receive_check
+        BEFORE INSERT ON inventory_movements
+        WHEN NEW.movement = 'IN' AND COALESCE(NEW.serial_no, '') != ''
+             AND EXISTS (SELECT 1 FROM inventory_serials WHERE serial_no = NEW.serial_no AND status IN ('IN_STOCK', 'ISSUED'))
+        BEGIN
+            SELECT RAISE(ABORT, 'Serial number already in stock or issued');
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_movement
+        AFTER INSERT ON inventory_movements
+        BEGIN
+            INSERT OR IGNORE INTO inventory (item_name, quantity) VALUES (NEW.item_name, 0);
+            UPDATE inventory
+               SET quantity = quantity + CASE WHEN NEW.movement IN ('IN', 'RETURNED') THEN NEW.quantity ELSE -NEW.quantity END
+             WHERE item_name = NEW.item_name;
+            INSERT INTO inventory_serials (serial_no, item_name, status, customer_id, updated_at)
+            SELECT NEW.serial_no, NEW.item_name,
+                   CASE NEW.movement WHEN 'ISSUED' THEN 'ISSUED' WHEN 'OUT' THEN 'OUT' ELSE 'IN_STOCK' END,
+                   CASE WHEN NEW.movement = 'ISSUED' THEN NEW.customer_id END,
+                   NEW.created_at
+            WHERE COALESCE(NEW.serial_no, '') != ''
+            ON CONFLICT(serial_no) DO UPDATE SET
+                item_name = excluded.item_name, status = excluded.status,
+                customer_id = excluded.customer_id, updated_at = excluded.updated_at;
+        END
+    ''')
+
+
+def record_movement(conn, item_name, movement, quantity=1, serial_no=None, customer_id=None, remarks=None):
+    """ Appends one movement. The caller owns the transaction. """
+    if movement not in MOVEMENTS:
+        raise ValueError(f"Unknown movement type: {movement}")
+    conn.execute(
+        "INSERT INTO inventory_movements (item_name, movement, quantity, serial_no, customer_id, remarks, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (item_name, movement, quantity, serial_no or None, customer_id, remarks, timestamp_now()))
+
+
+def device_serial(value):
+    """ The serial in a customer device column, or '' for the placeholders older imports wrote """
+    serial = str(value or "").strip()
+    return "" if serial.lower() in BLANK_SERIALS else serial
+
+
+def sync_customer_devices(conn, customer_id, old_values, new_values):
+    """
+    Issues/returns serial-numbered units when an install adds or swaps an STB or
+    router. `old_values`/`new_values` map customer column -> serial ('' if none).
+    A serial the ledger knows must be in stock (or already issued to this
+    customer), otherwise ValueError is raised. One it has never seen is issued
+    from the untracked stock carried over as opening balances, and is tracked
+    from then on. An old serial is only returned if the ledger shows it issued
+    to this customer, so serials that predate the ledger are left alone.
+    """
+    c = conn.cursor()
+    for column, item_name in CUSTOMER_DEVICE_ITEMS.items():
+        old = device_serial(old_values.get(column))
+        new = device_serial(new_values.get(column))
+        if old == new: continue
+        if new:
+            c.execute("SELECT item_name, status, customer_id FROM inventory_serials WHERE serial_no = ?", (new,))
+            held = c.fetchone()
+            if held is None:
+                pass  # predates serial tracking: issued from the opening balance below
+            elif held[0] != item_name:
+                raise ValueError(f"Serial {new} is a {held[0]}, not a {item_name}.")
+            elif held[1] == "ISSUED" and held[2] != customer_id:
+                raise ValueError(f"{item_name} {new} is already issued to another customer.")
+            elif held[1] == "OUT":
+                raise ValueError(f"{item_name} {new} has been taken out of stock.")
+        if old:
+            c.execute("SELECT 1 FROM inventory_serials WHERE serial_no = ? AND status = 'ISSUED' AND customer_id = ?", (old, customer_id))
+            if c.fetchone():
+                record_movement(conn, item_name, "RETURNED", serial_no=old, customer_id=customer_id, remarks="Device replaced" if new else "Device returned")
+        if new and (held is None or held[1] != "ISSUED"):
+            remarks = "Customer install" if held else "Customer install (untracked stock)"
+            record_movement(conn, item_name, "ISSUED", serial_no=new, customer_id=customer_id, remarks=remarks)
+
+
+def read_serials_file(path):
+    """ Serial numbers from a CSV/xlsx delivery note: a 'Serial' column, or the first column """
+    ext = os.path.splitext(path)[1].lower()
+    df = pd.read_csv(path, dtype=str) if ext == ".csv" else pd.read_excel(path, dtype=str)
+    if df.empty: return []
+    headers = {str(col).strip().lower(): col for col in df.columns}
+    column = headers.get("serial", headers.get("serial no", df.columns[0]))
+    return [s for s in df[column].dropna().astype(str).str.strip() if s]
+
+
+def receive_serials(conn, item_name, serials, remarks="Batch receive"):
+    """
+    Receives a delivery of serial-numbered units. The caller owns the transaction.
+    Returns (received, rejected) where rejected is a list of (serial, reason).
+    """
+    received, rejected, batch = [], [], set()
+
+    c = conn.cursor()
+    c.execute("CREATE TEMP TABLE IF NOT EXISTS incoming_serials (serial_no TEXT PRIMARY KEY) WITHOUT ROWID")
+    c.execute("DELETE FROM incoming_serials")
+    c.executemany("INSERT OR IGNORE INTO incoming_serials VALUES (?)", [(s,) for s in serials])
+    c.execute('''
+        SELECT s.serial_no, s.status FROM inventory_serials s
+        JOIN incoming_serials i ON i.serial_no = s.serial_no
+        WHERE s.status IN ('IN_STOCK', 'ISSUED')
+    ''')
+    existing = dict(c.fetchall())
+    c.execute("DELETE FROM incoming_serials")
+
+    for serial in serials:
+        if serial in batch:
+            rejected.append((serial, "Repeated in file"))
+        elif serial in existing:
+            rejected.append((serial, "Already issued" if existing[serial] == "ISSUED" else "Already in stock"))
+        else:
+            batch.add(serial)
+            received.append(serial)
+
+    conn.executemany(
+        "INSERT INTO inventory_movements (item_name, movement, quantity, serial_no, remarks, created_at) VALUES (?, 'IN', 1, ?, ?, ?)",
+        [(item_name, s, remarks, timestamp_now()) for s in received])
+    return received, rejected
+
+
+def find_serial_holder(conn, serial_no):
+    """ (serial, item, status, customer_id, name, can) for a serial, or None. Primary-key lookup. """
+    c = conn.cursor()
+    c.execute('''
+        SELECT s.serial_no, s.item_name, s.status, s.customer_id, cu.name, cu.can
+        FROM inventory_serials s LEFT JOIN customers cu ON cu.id = s.customer_id
+        WHERE s.serial_no = ?
+    ''', (serial_no.strip(),))
+    return c.fetchone()
+
+
+def recent_movements(conn, limit=20):
+    c = conn.cursor()
+    c.execute('''
+        SELECT m.created_at, m.item_name, m.movement, m.quantity, m.serial_no, cu.name
+        FROM inventory_movements m LEFT JOIN customers cu ON cu.id = m.customer_id
+        ORDER BY m.id DESC LIMIT ?
+    ''', (limit,))
+    return c.fetchall()
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 3:
+        print("Usage: python inventory_ledger.py <item name> <serials.csv|xlsx> [cable_manager.db]")
+        sys.exit(1)
+    conn = sqlite3.connect(sys.argv[3] if len(sys.argv) > 3 else "cable_manager.db")
+    init_ledger(conn)
+    conn.commit()
+    with conn:
+        ok, bad = receive_serials(conn, sys.argv[1], read_serials_file(sys.argv[2]))
+    conn.close()
+    print(f"Received {len(ok)} unit(s) of {sys.argv[1]}.")
+    for serial, reason in bad:
+        print(f"  Rejected {serial}: {reason}")
@@ -0,0 +1,263 @@
+import sqlite3
+import collections
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+import device_registry
+
+# --- LIVE SEARCH ---
+# Suggestions for the global search box, computed on a worker thread with its
+# own connection so typing never waits on the database.
+#   * Keystrokes are debounced in the UI; each dispatched query gets a new
+#     generation number, and a progress handler aborts whatever the worker is
+#     running as soon as a newer generation exists.
+#   * Matching is by prefix (name, CAN, device serial), so every query is an
+#     index range scan: idx_customers_name_nocase, idx_customers_can and
+#     ux_devices_serial.
+#   * A result that came back complete (under FETCH_LIMIT per kind) already
+#     holds every match for any longer query, so narrowing it is filtered in
+#     memory instead of going back to the database.
+DEBOUNCE_MS = 40
+POLL_MS = 10
+DISPLAY_LIMIT = 8
+FETCH_LIMIT = 200  # per kind; fewer rows than this means the result is complete
+PROGRESS_STEPS = 500  # VM instructions between cancellation checks
+CACHE_SIZE = 64
+
+# Rows are (customer_id, name, can, matched kind, matched text)
+SUGGEST_QUERIES = [
+    ("Name", '''
+        SELECT id, name, can, 'Name', name FROM customers
+        WHERE name >= :lo COLLATE NOCASE AND name < :hi COLLATE NOCASE
+        ORDER BY name COLLATE NOCASE LIMIT :limit
+    '''),
+    ("CAN", '''
+        SELECT id, name, can, 'CAN', can FROM customers
+        WHERE can >= :lo AND can < :hi
+        ORDER BY can LIMIT :limit
+    '''),
+    ("Device", f'''
+        SELECT cu.id, cu.name, cu.can, d.device_type, d.serial_no
+        FROM devices d JOIN customers cu ON cu.id = d.customer_id
+        WHERE d.device_type IN ({", ".join(f"'{t}'" for t in device_registry.DEVICE_COLUMNS)})
+          AND d.serial_no >= :lo AND d.serial_no < :hi
+        LIMIT :limit
+    '''),
+]
+
+
+def init_search_indexes(conn):
+    # Prefix ranges on name compare case-insensitively, so they need a NOCASE index
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_name_nocase ON customers(name COLLATE NOCASE)")
+
+
+def prefix_range(prefix):
+    """ [lo, hi) bounds covering every string that starts with `prefix` """
+    return prefix, prefix + "\U0010ffff"
+
+
+def suggest(conn, query, limit=FETCH_LIMIT):
+    """ Returns (rows, complete): prefix matches of every kind, and whether none was cut off by `limit` """
+    lo, hi = prefix_range(query)
+    rows, complete = [], True
+    c = conn.cursor()
+    for _, sql in SUGGEST_QUERIES:
+        c.execute(sql, {"lo": lo, "hi": hi, "limit": limit})
+        found = c.fetchall()
+        complete = complete and len(found) < limit
+        rows.extend(found)
+    return rows, complete
+
+
+def filter_rows(rows, query):
+    """ Narrows a complete result for `query`'s prefix down to `query` itself """
+    q = query.casefold()
+    return [row for row in rows if str(row[4] or "").casefold().startswith(q)]
+
+
+def top_suggestions(rows, limit=DISPLAY_LIMIT):
+    """ One entry per customer, in match order (names first), for the dropdown """
+    seen, out = set(), []
+    for row in rows:
+        if row[0] in seen: continue
+        seen.add(row[0])
+        out.append(row)
+        if len(out) == limit: break
+    return out
+
+
+def full_search(conn, query):
+    """ The Enter-key search: exact device serial first, then substring match on name, CAN and STB """
+    c = conn.cursor()
+    ids = [cust_id for _, cust_id in device_registry.lookup_device(conn, query)]
+    if ids:
+        c.execute(f"SELECT * FROM customers WHERE id IN ({','.join('?' * len(ids))})", ids)
+    else:
+        param = f"%{query}%"
+        c.execute("SELECT * FROM customers WHERE name LIKE ? OR can LIKE ? OR stb_no LIKE ?", (param, param, param))
+    return c.fetchall()
+
+
+class SearchWorker:
+    """
+    Runs searches for one database on a background thread. submit() returns a
+    generation number; results arrive on `results` as (generation, kind, query,
+    rows) and only the newest generation is ever delivered.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.latest = 0
+        self.delivered = 0
+        self.cache = collections.OrderedDict()  # query -> rows, complete results only
+        self.cache_version = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.loop, name=f"search:{db_file}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.requests.put(None)
+
+    @property
+    def pending(self):
+        return self.delivered < self.latest
+
+    def submit(self, kind, query, data_version=None):
+        """
+        kind: "suggest" or "full". Supersedes (and cancels) anything still
+        running. `data_version` is the one passed to cached() for this query.
+        """
+        self.latest += 1
+        self.requests.put((self.latest, kind, query, data_version))
+        return self.latest
+
+    def cancel(self):
+        """ Drops whatever is queued or running without starting anything new """
+        self.latest += 1
+        self.delivered = self.latest
+
+    def cached(self, query, data_version):
+        """
+        Rows for `query` from the longest cached prefix, or None. `data_version`
+        is PRAGMA data_version on the caller's connection (always the same
+        one); any commit since the cache was filled empties it.
+        """
+        with self.lock:
+            if data_version != self.cache_version:
+                self.cache.clear()
+                self.cache_version = data_version
+                return None
+            for end in range(len(query), 0, -1):
+                rows = self.cache.get(query[:end])
+                if rows is not None:
+                    self.cache.move_to_end(query[:end])
+                    return rows if end == len(query) else filter_rows(rows, query)
+        return None
+
+    def remember(self, query, rows, data_version):
+        with self.lock:
+            if data_version != self.cache_version:
+                self.cache.clear()
+                self.cache_version = data_version
+            self.cache[query] = rows
+            while len(self.cache) > CACHE_SIZE:
+                self.cache.popitem(last=False)
+
+    def loop(self):
+        conn = sqlite3.connect(self.db_file)
+        running = [0]
+        # Non-zero return aborts the statement with OperationalError("interrupted")
+        conn.set_progress_handler(lambda: running[0] != self.latest, PROGRESS_STEPS)
+        try:
+            while True:
+                request = self.requests.get()
+                if request is None: break
+                # Only the newest queued request is worth running
+                while not self.requests.empty():
+                    newer = self.requests.get()
+                    if newer is None: return
+                    request = newer
+                generation, kind, query, version = request
+                if generation != self.latest: continue
+                running[0] = generation
+                try:
+                    if kind == "full":
+                        rows = full_search(conn, query)
+                    else:
+                        rows, complete = suggest(conn, query)
+                        if complete and version is not None: self.remember(query, rows, version)
+                except sqlite3.OperationalError as e:
+                    if "interrupted" in str(e): continue
+                    rows = []
+                    print(f"Search failed: {e}")
+                finally:
+                    running[0] = 0
+                if generation == self.latest:
+                    self.delivered = generation
+                    self.results.put((generation, kind, query, rows))
+        finally:
+            conn.close()
+
+
+def benchmark(customers=100_000, samples=300):
+    """ Builds a throwaway database with `customers` rows and times suggest() for typed prefixes """
+    path = os.path.join(tempfile.mkdtemp(prefix="search_bench_"), "bench.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY AUTOINCREMENT, can TEXT, name TEXT, stb_no TEXT)")
+    conn.execute("CREATE INDEX idx_customers_can ON customers(can)")
+    conn.execute("CREATE TABLE devices (id INTEGER PRIMARY KEY AUTOINCREMENT, device_type TEXT NOT NULL, serial_no TEXT NOT NULL COLLATE NOCASE, customer_id INTEGER NOT NULL)")
+    conn.execute("CREATE UNIQUE INDEX ux_devices_serial ON devices(device_type, serial_no)")
+    init_search_indexes(conn)
+    rng = random.Random(7)
+    first = ["Amit", "Anil", "Asha", "Deepak", "Kiran", "Manoj", "Meena", "Pooja", "Rahul", "Ravi", "Sanjay", "Sunita", "Vijay"]
+    last = ["Sharma", "Patil", "Deshmukh", "Joshi", "Kale", "Verma", "Gupta", "Shinde", "Rao"]
+    rows = [(str(100000 + i), f"{rng.choice(first)} {rng.choice(last)} {i}", f"STB{rng.randrange(10**8):08d}") for i in range(customers)]
+    conn.executemany("INSERT INTO customers (can, name, stb_no) VALUES (?, ?, ?)", rows)
+    conn.execute("INSERT OR IGNORE INTO devices (device_type, serial_no, customer_id) SELECT 'STB', stb_no, id FROM customers")
+    conn.commit()
+    conn.close()
+
+    typed = []
+    for _ in range(samples):
+        word = rng.choice([rng.choice(first) + " " + rng.choice(last), rows[rng.randrange(customers)][0], rows[rng.randrange(customers)][2]])
+        typed.extend(word[:n] for n in range(1, min(len(word), 8) + 1))
+
+    worker = SearchWorker(path)
+    version_conn = sqlite3.connect(path)
+    timings, hits = [], 0
+    for query in typed:
+        t = time.perf_counter()
+        version = version_conn.execute("PRAGMA data_version").fetchone()[0]
+        rows = worker.cached(query, version)
+        if rows is None:
+            generation = worker.submit("suggest", query, version)
+            while True:
+                got = worker.results.get()
+                if got[0] == generation: break
+        else:
+            hits += 1
+        timings.append((time.perf_counter() - t) * 1000)
+    worker.stop()
+    version_conn.close()
+    timings.sort()
+    p50, p95, worst = timings[len(timings) // 2], timings[int(len(timings) * 0.95)], timings[-1]
+    print(f"{len(timings):,} keystrokes over {customers:,} customers: p50 {p50:.2f} ms, p95 {p95:.2f} ms, max {worst:.2f} ms "
+          f"({hits:,} served from the prefix cache)")
+    return p50, p95
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+    elif len(sys.argv) > 1:
+        conn = sqlite3.connect(sys.argv[2] if len(sys.argv) > 2 else "cable_manager.db")
+        rows, _ = suggest(conn, sys.argv[1])
+        for cid, name, can, kind, text in top_suggestions(rows):
+            print(f"{name} | CAN: {can} | {kind}: {text}")
+        conn.close()
@@ -1,12 +1,33 @@
 import customtkinter as ctk
-from tkinter import messagebox, StringVar, filedialog, simpledialog
+from tkinter import messagebox, StringVar, BooleanVar, filedialog, simpledialog
 import sqlite3
 import datetime
-import shutil
+import math
 import os
 import webbrowser
 import urllib.parse
+import threading
+import time
 import pandas as pd 
+import payment_batch
+import payment_analytics
+import inventory_ledger
+import device_registry
+import analytics_snapshot
+import excel_reconcile
+import tenants
+import write_queue
+import excel_sync
+import receipts
+import risk_scoring
+import maintenance
+import live_search
+import recovery_calendar
+import change_feed
+import area_hierarchy
+import billing
+import web_view
+from timestamps import timestamp_now
 
 # --- CONFIGURATION ---
 ctk.set_appearance_mode("Dark")
@@ -20,7 +41,15 @@ APP_ICON = "app_icon.ico"
 BUSINESS_NAME = "VAV CABLE NETWORKS"
 BUSINESS_ADDRESS = "Nagpur, Maharashtra"
 SUPPORT_CONTACT = "9876543210" 
+
+# Used as the only tenant until more networks are added in tenants.json
+DEFAULT_TENANT = {
+    "id": "default", "business_name": BUSINESS_NAME, "business_address": BUSINESS_ADDRESS,
+    "support_contact": SUPPORT_CONTACT, "db_file": DB_FILE, "excel_file": EXCEL_FILE,
+    "snapshot_dir": analytics_snapshot.SNAPSHOT_DIR,
+}
 ADMIN_PASSWORD = "admin" 
+COMPLAINT_SLA_HOURS = 48
 
 class CableManagerApp(ctk.CTk):
     def __init__(self):
@@ -38,9 +67,15 @@ class CableManagerApp(ctk.CTk):
         self.grid_rowconfigure(0, weight=1)
 
         # --- SYSTEM INITIALIZATION ---
+        self.router = tenants.TenantRouter(tenants.load_registry(DEFAULT_TENANT))
         self.init_database()
         self.check_db_schema() 
         self.auto_import_data()
+        # Due dates for imported customers and those saved before the calendar existed
+        self.writes.run(recovery_calendar.refresh_due_dates)
+        self.writes.run(billing.sync_rentals)  # prices that took effect since the last start
+        # Excel writes interrupted by a crash or a locked workbook last time
+        self.sync_excel(notify=False)
 
         # --- Variables ---
         self.current_customer_id = None
@@ -63,26 +98,108 @@ class CableManagerApp(ctk.CTk):
         self.var_outstanding = StringVar(value="0") 
         
         self.var_pay_search = StringVar()
+        self.var_high_risk_only = BooleanVar(value=False)
         self.var_pay_amount = StringVar()
         self.var_pay_date = StringVar(value=datetime.date.today().strftime("%Y-%m-%d"))
-        self.var_pay_history_date = StringVar(value="Select Date")
+        self.history_page = 0
         
         self.var_start_date = StringVar()
         self.var_end_date = StringVar()
         self.var_invoice_footer = StringVar(value="*Terms & Conditions Apply. Final Decision of the Proprietor.")
         self.var_inv_item = StringVar()
         self.var_inv_qty = StringVar()
+        self.var_serial_lookup = StringVar()
         self.var_complaint_issue = StringVar()
         self.var_new_area = StringVar()
+        self.var_area_level = StringVar(value=area_hierarchy.LEVEL_LABELS["area"])
+        self.var_area_parent = StringVar(value="None")
+        self.var_plan = StringVar(value="None")
+        self.var_internet_plan = StringVar(value="None")
+        self.var_plan_code = StringVar()
+        self.var_plan_name = StringVar()
+        self.var_plan_kind = StringVar(value=billing.KIND_LABELS["tv"])
+        self.var_plan_base = StringVar()
+        self.var_plan_hd = StringVar(value="0")
+        self.var_plan_extra = StringVar(value="0")
+        self.var_plan_effective = StringVar()
+        self.var_bill_month = StringVar()
+        self.var_tenant_id = StringVar()
+        self.var_tenant_name = StringVar()
+        self.var_tenant_address = StringVar()
+        self.var_tenant_contact = StringVar()
+        self.var_standby_db = StringVar()
+        self.bulk_rows = []
 
         self.setup_sidebar()
+        self.snapshot_label = None
+        self.complaint_list = None
+        self.complaint_empty_label = None
+        self.maintenance_frame = None
+        self.replication_frame = None
+        self.search_worker = None
+        self.search_after = None
+        self.search_polling = False
+        self.suggest_frame = None
+        self.suggest_buttons = []
+        self.area_drill = None
+        self.web_server = None
+        self.web_frame = None
         self.setup_main_area()
         self.show_dashboard() 
 
+        # Nightly analytics snapshot, rebuilt in the background when stale
+        self.snapshot_thread = None
+        self.after(5000, self.refresh_snapshot_if_stale)
+        # Default-risk scores for customers with new payments
+        self.risk_thread = None
+        self.after(3000, self.refresh_risk_scores)
+
+        # Database maintenance, started once the user has been idle for a while
+        self.maintenance_thread = None
+        self.index_health = {}
+        self.last_input = time.monotonic()
+        for sequence in ("<KeyPress>", "<ButtonPress>", "<Motion>"):
+            self.bind_all(sequence, self.note_input, add="+")
+        self.after(60000, self.check_idle_maintenance)
+
+        # Change feed replayed into the tenant's standby database, if one is set
+        self.replica_thread = None
+        self.replica_status = {}
+        self.after(change_feed.REPLICATE_INTERVAL_MS, self.replicate_standby)
+
+    def destroy(self):
+        if self.search_worker is not None: self.search_worker.stop()
+        if self.web_server is not None: self.web_server.stop()
+        self.router.stop_writers()
+        self.router.close_all()
+        super().destroy()
+
+    # --- TENANT ROUTING ---
+    @property
+    def tenant(self):
+        return self.router.tenant()
+
+    @property
+    def db_file(self):
+        return self.tenant["db_file"]
+
+    @property
+    def excel_file(self):
+        return self.tenant["excel_file"]
+
     def get_db_connection(self):
-        return sqlite3.connect(DB_FILE)
+        # Cached per tenant; close() on it only ends the transaction
+        return self.router.connect()
+
+    @property
+    def writes(self):
+        # All mutations go through the tenant's write queue
+        return self.router.writer()
 
     def init_database(self):
+        # One-time switch to incremental auto-vacuum; its full VACUUM must not
+        # run while the tenant's writer is taking writes
+        maintenance.enable_incremental_vacuum(self.db_file)
         conn = self.get_db_connection()
         c = conn.cursor()
         
@@ -140,6 +257,19 @@ class CableManagerApp(ctk.CTk):
                 remarks TEXT
             )
         ''')
+
+        c.execute("CREATE INDEX IF NOT EXISTS idx_customers_can ON customers(can)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_payment_history_customer_date ON payment_history(customer_id, date_paid)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_payment_history_can ON payment_history(can)")
+
+        inventory_ledger.init_ledger(conn)
+        device_registry.init_registry(conn)
+        write_queue.init_intents(conn)
+        write_queue.prune_intents(conn)
+        risk_scoring.init_risk(conn)
+        maintenance.init_maintenance(conn)
+        live_search.init_search_indexes(conn)
+        recovery_calendar.init_calendar(conn)
         
         conn.commit()
         conn.close()
@@ -159,17 +289,38 @@ class CableManagerApp(ctk.CTk):
         except sqlite3.OperationalError:
             try: c.execute("ALTER TABLE complaints ADD COLUMN date_resolved TEXT")
             except: pass
+
+        # Complaint timestamps are stored as 'YYYY-MM-DD HH:MM:SS' so SQLite date functions and indexes work on them
+        for col, dtype in (("logged_at", "TIMESTAMP"), ("resolved_at", "TIMESTAMP"), ("updated_at", "TIMESTAMP"), ("technician", "TEXT")):
+            try: c.execute(f"SELECT {col} FROM complaints LIMIT 1")
+            except sqlite3.OperationalError:
+                c.execute(f"ALTER TABLE complaints ADD COLUMN {col} {dtype}")
+        c.execute("UPDATE complaints SET logged_at = datetime(date_logged) WHERE logged_at IS NULL AND datetime(date_logged) IS NOT NULL")
+        c.execute("UPDATE complaints SET resolved_at = datetime(date_resolved) WHERE resolved_at IS NULL AND datetime(date_resolved) IS NOT NULL")
+        c.execute("UPDATE complaints SET updated_at = COALESCE(resolved_at, logged_at) WHERE updated_at IS NULL")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_complaints_open ON complaints(logged_at) WHERE status='Open'")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_complaints_updated ON complaints(updated_at)")
+
+        area_hierarchy.init_hierarchy(conn)
+        billing.init_billing(conn)
+
+        # Last, so the change-feed triggers see every migrated column
+        change_feed.init_change_feed(conn)
+        change_feed.prune_log(conn)
         conn.commit()
         conn.close()
 
     def auto_import_data(self):
-        if not os.path.exists(EXCEL_FILE): return 
+        if not os.path.exists(self.excel_file): return 
         conn = self.get_db_connection()
         c = conn.cursor()
         c.execute("SELECT count(*) FROM customers")
         if c.fetchone()[0] == 0:
             try:
-                df = pd.read_excel(EXCEL_FILE)
+                df = pd.read_excel(self.excel_file)
+                df, rejected = device_registry.validate_import_serials(conn, df, {'STB No': 'STB'})
+                for index, row in rejected.iterrows():
+                    print(f"Auto-import skipped row {index + 2}: {row['reason']}")
                 for index, row in df.iterrows():
                     can = str(row.get('CAN', '')).strip()
                     if can.lower() == 'nan': can = ""
@@ -189,7 +340,7 @@ class CableManagerApp(ctk.CTk):
     def setup_sidebar(self):
         self.sidebar = ctk.CTkFrame(self, width=220, corner_radius=0)
         self.sidebar.grid(row=0, column=0, sticky="nsew")
-        ctk.CTkLabel(self.sidebar, text=BUSINESS_NAME, font=ctk.CTkFont(size=20, weight="bold"), wraplength=200).grid(row=0, column=0, padx=20, pady=20)
+        ctk.CTkLabel(self.sidebar, text=self.tenant["business_name"], font=ctk.CTkFont(size=20, weight="bold"), wraplength=200).grid(row=0, column=0, padx=20, pady=20)
 
         self.create_nav_btn("Dashboard", self.show_dashboard, 1)
         self.create_nav_btn("Customer Manager", self.show_customer_manager, 2)
@@ -198,8 +349,10 @@ class CableManagerApp(ctk.CTk):
         self.create_nav_btn("Complaints", self.show_complaints, 5)
         self.create_nav_btn("Reports", self.show_reports, 6)
         self.create_nav_btn("Settings", self.show_settings, 7)
+        self.create_nav_btn("Recovery Calendar", self.show_recovery_calendar, 8)
+        self.create_nav_btn("Plans & Billing", self.show_plans_billing, 9)
         
-        ctk.CTkButton(self.sidebar, text="Exit", command=self.destroy, fg_color="#d9534f", hover_color="#c9302c").grid(row=9, column=0, padx=20, pady=40, sticky="s")
+        ctk.CTkButton(self.sidebar, text="Exit", command=self.destroy, fg_color="#d9534f", hover_color="#c9302c").grid(row=10, column=0, padx=20, pady=40, sticky="s")
 
     def create_nav_btn(self, text, command, row):
         ctk.CTkButton(self.sidebar, text=text, command=command, fg_color="transparent", text_color=("gray10", "#DCE4EE"), hover_color=("gray70", "gray30"), anchor="w", height=40).grid(row=row, column=0, padx=10, pady=5, sticky="ew")
@@ -216,6 +369,9 @@ class CableManagerApp(ctk.CTk):
         self.search_entry = ctk.CTkEntry(self.top_bar, placeholder_text="Global Search: Name, CAN, STB...", width=500, font=("Arial", 16), height=40)
         self.search_entry.pack(side="left", padx=20, pady=15)
         self.search_entry.bind('<Return>', self.perform_search) 
+        self.search_entry.bind('<KeyRelease>', self.on_search_key)
+        self.search_entry.bind('<Escape>', self.hide_suggestions)
+        self.search_entry.bind('<FocusOut>', lambda e: self.after(200, self.hide_suggestions))
         ctk.CTkButton(self.top_bar, text="Search", command=self.perform_search, width=120, height=40, font=("Arial", 14, "bold")).pack(side="left", padx=5)
 
     # --- DASHBOARD ---
@@ -230,21 +386,72 @@ class CableManagerApp(ctk.CTk):
         c = conn.cursor()
         c.execute("SELECT COUNT(*) FROM customers WHERE status='Active'")
         active_subs = c.fetchone()[0]
-        c.execute("SELECT COUNT(DISTINCT area_name) FROM areas")
-        coverage = c.fetchone()[0]
+        covered, total_areas, unassigned = area_hierarchy.coverage(conn)
+        if self.area_drill is not None and not c.execute("SELECT 1 FROM areas WHERE id=?", (self.area_drill,)).fetchone():
+            self.area_drill = None
+        drill_rows = area_hierarchy.children(conn, self.area_drill)
+        drill_path = area_hierarchy.breadcrumb(conn, self.area_drill) if self.area_drill is not None else []
+        parents = c.execute("SELECT id, area_name, level FROM areas WHERE level != 'sub_area' ORDER BY area_name").fetchall()
+        high_risk = risk_scoring.high_risk_customers(conn, limit=10)
+        due = recovery_calendar.due_buckets(conn)
         conn.close()
 
         stats = ctk.CTkFrame(content, fg_color="transparent")
         stats.pack(fill="x", padx=10)
         self.card(stats, "Active Subscribers", str(active_subs), "#007bff").pack(side="left", fill="x", expand=True, padx=5)
-        self.card(stats, "Network Coverage", str(coverage), "#6610f2").pack(side="left", fill="x", expand=True, padx=5)
+        self.card(stats, "Network Coverage", f"{covered} / {total_areas} areas", "#6610f2").pack(side="left", fill="x", expand=True, padx=5)
         self.card(stats, "System Date", str(datetime.date.today()), "#28a745").pack(side="left", fill="x", expand=True, padx=5)
 
+        dues = ctk.CTkFrame(content, fg_color="transparent")
+        dues.pack(fill="x", padx=10, pady=(10, 0))
+        self.card(dues, "Overdue", str(due["overdue"]), "#d9534f").pack(side="left", fill="x", expand=True, padx=5)
+        self.card(dues, "Due Today", str(due["today"]), "#f0ad4e").pack(side="left", fill="x", expand=True, padx=5)
+        self.card(dues, "Due This Week", str(due["week"]), "#17a2b8").pack(side="left", fill="x", expand=True, padx=5)
+        ctk.CTkButton(dues, text="Recovery Calendar", command=self.show_recovery_calendar, height=60).pack(side="left", padx=5)
+
+        if high_risk:
+            reminders = ctk.CTkFrame(content)
+            reminders.pack(fill="x", padx=15, pady=(20, 0))
+            ctk.CTkLabel(reminders, text="High-Risk Reminders", font=("Arial", 16, "bold")).pack(anchor="w", padx=10, pady=(10, 5))
+            for cust_id, name, can, contact, score, reason in high_risk:
+                row = ctk.CTkFrame(reminders, fg_color="transparent")
+                row.pack(fill="x", padx=10, pady=2)
+                ctk.CTkLabel(row, text=f"{name} (CAN: {can})", anchor="w", width=260).pack(side="left")
+                ctk.CTkLabel(row, text=f"Risk {score:.0%}" + (f" - {reason}" if reason else ""), text_color="#d9534f", anchor="w").pack(side="left", padx=10)
+                ctk.CTkButton(row, text="Remind", width=80, fg_color="#25D366",
+                              command=lambda cid=cust_id: self.remind_customer(cid)).pack(side="right")
+
+        drill = ctk.CTkFrame(content)
+        drill.pack(fill="x", padx=15, pady=(20, 0))
+        ctk.CTkLabel(drill, text="Coverage by Area", font=("Arial", 16, "bold")).pack(anchor="w", padx=10, pady=(10, 5))
+        path = ctk.CTkFrame(drill, fg_color="transparent")
+        path.pack(fill="x", padx=10)
+        ctk.CTkButton(path, text="All Zones", width=90, command=lambda: self.drill_area(None)).pack(side="left", padx=(0, 5))
+        for area_id, name in drill_path:
+            ctk.CTkLabel(path, text=">").pack(side="left")
+            ctk.CTkButton(path, text=name, width=90, command=lambda a=area_id: self.drill_area(a)).pack(side="left", padx=5)
+        if self.area_drill is None and unassigned:
+            ctk.CTkLabel(path, text=f"{unassigned} customer(s) without an area", text_color="#d9534f").pack(side="right")
+        for area_id, name, level, subs, custs, revenue, outstanding, has_children in drill_rows:
+            row = ctk.CTkFrame(drill, fg_color="transparent")
+            row.pack(fill="x", padx=10, pady=2)
+            ctk.CTkLabel(row, text=f"{name} ({area_hierarchy.LEVEL_LABELS.get(level, level)})", anchor="w", width=220).pack(side="left")
+            ctk.CTkLabel(row, text=f"{subs} active / {custs}   Revenue ₹{revenue:,.0f}   Outstanding ₹{outstanding:,.0f}", anchor="w").pack(side="left", padx=10)
+            if has_children:
+                ctk.CTkButton(row, text="Open", width=70, command=lambda a=area_id: self.drill_area(a)).pack(side="right")
+        if not drill_rows:
+            ctk.CTkLabel(drill, text="No sub-areas here.", text_color="gray").pack(anchor="w", padx=10, pady=5)
+
         area_frame = ctk.CTkFrame(content)
         area_frame.pack(fill="x", padx=15, pady=20)
         ctk.CTkLabel(area_frame, text="Manage Service Areas", font=("Arial", 16, "bold")).pack(anchor="w", padx=10, pady=10)
+        self.area_parents = {f"{name} ({area_hierarchy.LEVEL_LABELS.get(level, level)})": area_id for area_id, name, level in parents}
         ctk.CTkEntry(area_frame, textvariable=self.var_new_area, placeholder_text="Area Name").pack(side="left", padx=10, pady=10)
+        ctk.CTkOptionMenu(area_frame, variable=self.var_area_level, values=[area_hierarchy.LEVEL_LABELS[l] for l in area_hierarchy.LEVELS], width=100).pack(side="left", padx=5)
+        ctk.CTkLabel(area_frame, text="Under:").pack(side="left", padx=(10, 0))
+        ctk.CTkOptionMenu(area_frame, variable=self.var_area_parent, values=["None"] + list(self.area_parents), width=160).pack(side="left", padx=5)
         ctk.CTkButton(area_frame, text="Add Area", command=self.add_area, fg_color="green").pack(side="left", padx=10)
+        ctk.CTkButton(area_frame, text="Move Under", command=self.move_area).pack(side="left", padx=5)
         ctk.CTkButton(area_frame, text="Delete Selected Area", command=self.delete_area, fg_color="red").pack(side="left", padx=10)
 
         actions = ctk.CTkFrame(content)
@@ -270,6 +477,8 @@ class CableManagerApp(ctk.CTk):
         search_frame.pack(fill="x", pady=10)
         ctk.CTkEntry(search_frame, textvariable=self.var_pay_search, placeholder_text="Type Name to Search...", width=300).pack(side="left", padx=10, pady=10)
         ctk.CTkButton(search_frame, text="Find Customer", command=self.search_for_payment).pack(side="left", padx=10)
+        ctk.CTkCheckBox(search_frame, text="High risk only", variable=self.var_high_risk_only).pack(side="left", padx=10)
+        ctk.CTkButton(search_frame, text="Bulk Entry / Batch Upload", command=self.show_bulk_payment_entry, fg_color="#6610f2").pack(side="right", padx=10)
 
         self.pay_results_frame = ctk.CTkScrollableFrame(content, height=100)
         self.pay_results_frame.pack(fill="x", pady=5)
@@ -303,32 +512,79 @@ class CableManagerApp(ctk.CTk):
             ctk.CTkButton(right, text="Receive Payment", command=self.update_payment, fg_color="green").pack(pady=15)
             
             ctk.CTkLabel(right, text="Previous Payments", font=("Arial", 14, "bold")).pack(pady=(20,5))
-            
+            self.history_frame = ctk.CTkFrame(right, fg_color="transparent")
+            self.history_frame.pack(fill="x", padx=10)
+            self.render_payment_history()
+
+            insights = ctk.CTkFrame(content)
+            insights.pack(fill="x", pady=10)
+            ctk.CTkLabel(insights, text="Payment Insights", font=("Arial", 16, "bold")).pack(anchor="w", padx=10, pady=(10, 5))
             conn = self.get_db_connection()
-            c = conn.cursor()
-            c.execute("SELECT date_paid, amount_paid FROM payment_history WHERE customer_id=? ORDER BY date_paid DESC", (self.current_customer_id,))
-            history = c.fetchall()
+            stats = payment_analytics.customer_analytics(conn, self.current_customer_id)
+            risk = conn.execute("SELECT score, band, reason FROM customer_risk WHERE customer_id=?", (self.current_customer_id,)).fetchone()
             conn.close()
-            
-            dates = [f"{h[0]} (₹{h[1]})" for h in history]
-            if not dates: dates = ["No History"]
-            
-            self.history_menu = ctk.CTkOptionMenu(right, variable=self.var_pay_history_date, values=dates)
-            self.history_menu.pack(pady=5)
+            delay = "N/A" if stats["avg_delay_days"] is None else f"{stats['avg_delay_days']:.1f} days"
+            cards = ctk.CTkFrame(insights, fg_color="transparent")
+            cards.pack(fill="x", padx=5, pady=(0, 10))
+            self.card(cards, "Lifetime Value", f"₹{stats['lifetime_value']:,.0f}", "#28a745").pack(side="left", fill="x", expand=True, padx=5)
+            self.card(cards, "Avg Delay vs Recovery", delay, "#f0ad4e").pack(side="left", fill="x", expand=True, padx=5)
+            self.card(cards, "Missed Months", str(stats["missed_months"]), "#d9534f").pack(side="left", fill="x", expand=True, padx=5)
+            self.card(cards, "Payments", str(stats["payments"]), "#007bff").pack(side="left", fill="x", expand=True, padx=5)
+            if risk:
+                risk_colors = {"HIGH": "#d9534f", "MEDIUM": "#f0ad4e", "LOW": "#28a745"}
+                self.card(cards, "Default Risk", f"{risk[1]} ({risk[0]:.0%})", risk_colors[risk[1]]).pack(side="left", fill="x", expand=True, padx=5)
             
         else:
             ctk.CTkLabel(content, text="Please search and select a customer to view payment details.", text_color="gray").pack(pady=20)
 
+    def render_payment_history(self):
+        for widget in self.history_frame.winfo_children():
+            widget.destroy()
+
+        conn = self.get_db_connection()
+        rows, total = payment_analytics.fetch_history_page(conn, self.current_customer_id, self.history_page)
+        conn.close()
+
+        if not rows:
+            ctk.CTkLabel(self.history_frame, text="No History", text_color="gray").pack(pady=5)
+            return
+        for date_paid, amount_paid, remarks in rows:
+            text = f"{date_paid}   ₹{amount_paid}" + (f"   ({remarks})" if remarks else "")
+            row = ctk.CTkFrame(self.history_frame, fg_color="transparent")
+            row.pack(fill="x")
+            ctk.CTkLabel(row, text=text, anchor="w").pack(side="left", fill="x", expand=True)
+            ctk.CTkButton(row, text="Receipt", width=70, height=22, fg_color="#17a2b8",
+                          command=lambda d=date_paid, a=amount_paid: self.print_payment_receipt(d, a)).pack(side="right")
+
+        pages = (total + payment_analytics.PAGE_SIZE - 1) // payment_analytics.PAGE_SIZE
+        nav = ctk.CTkFrame(self.history_frame, fg_color="transparent")
+        nav.pack(fill="x", pady=5)
+        prev_btn = ctk.CTkButton(nav, text="< Newer", width=80, command=lambda: self.change_history_page(-1))
+        prev_btn.pack(side="left")
+        ctk.CTkLabel(nav, text=f"Page {self.history_page + 1} of {pages}").pack(side="left", expand=True)
+        next_btn = ctk.CTkButton(nav, text="Older >", width=80, command=lambda: self.change_history_page(1))
+        next_btn.pack(side="right")
+        if self.history_page == 0: prev_btn.configure(state="disabled")
+        if self.history_page >= pages - 1: next_btn.configure(state="disabled")
+
+    def change_history_page(self, step):
+        self.history_page = max(0, self.history_page + step)
+        self.render_payment_history()
+
     def search_for_payment(self):
         query = self.var_pay_search.get().strip()
-        if not query: return
+        high_risk_only = self.var_high_risk_only.get()
+        if not query and not high_risk_only: return
         
         for widget in self.pay_results_frame.winfo_children():
             widget.destroy()
 
         conn = self.get_db_connection()
         c = conn.cursor()
-        sql = "SELECT id, name, can, address FROM customers WHERE name LIKE ? OR can LIKE ?"
+        sql = "SELECT c.id, c.name, c.can, c.address, r.band, r.score FROM customers c LEFT JOIN customer_risk r ON r.customer_id = c.id WHERE (c.name LIKE ? OR c.can LIKE ?)"
+        if high_risk_only:
+            # Riskiest first; an empty search lists every high-risk active customer
+            sql += " AND r.band = 'HIGH' AND c.status = 'Active' ORDER BY r.score DESC LIMIT 100"
         param = f"%{query}%"
         c.execute(sql, (param, param))
         results = c.fetchall()
@@ -339,6 +595,7 @@ class CableManagerApp(ctk.CTk):
         else:
             for res in results:
                 btn_text = f"{res[1]} (CAN: {res[2]}) - {res[3]}"
+                if res[4] in ("HIGH", "MEDIUM"): btn_text += f"   [{res[4]} RISK {res[5]:.0%}]"
                 btn = ctk.CTkButton(self.pay_results_frame, text=btn_text, anchor="w", fg_color="transparent", border_width=1, border_color="gray",
                                     command=lambda r=res: self.select_payment_customer(r[0]))
                 btn.pack(fill="x", pady=2)
@@ -352,6 +609,7 @@ class CableManagerApp(ctk.CTk):
         
         if row:
             self.load_customer(row)
+            self.history_page = 0
             self.show_payment_tab()
 
     def update_payment(self):
@@ -361,49 +619,176 @@ class CableManagerApp(ctk.CTk):
         if not amt or not date:
             messagebox.showerror("Error", "Enter Amount and Date")
             return
-            
-        conn = self.get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("INSERT INTO payment_history (customer_id, can, amount_paid, date_paid) VALUES (?, ?, ?, ?)",
-                  (self.current_customer_id, self.var_can.get(), amt, date))
-        
-        c.execute("UPDATE customers SET paid_amount=?, last_payment_date=?, outstanding_amount='0' WHERE id=?", 
-                  (amt, date, self.current_customer_id))
-        
-        conn.commit()
-        conn.close()
-        
+        try: amount_val = float(amt)
+        except ValueError: amount_val = float("nan")
+        if not math.isfinite(amount_val) or amount_val <= 0 or amount_val > payment_batch.MAX_AMOUNT:
+            messagebox.showerror("Error", f"Enter an amount between 1 and {payment_batch.MAX_AMOUNT}")
+            return
+
+        cust_id, can = self.current_customer_id, self.var_can.get()
+
+        def work(conn):
+            conn.execute("INSERT INTO payment_history (customer_id, can, amount_paid, date_paid) VALUES (?, ?, ?, ?)",
+                         (cust_id, can, amt, date))
+            conn.execute("UPDATE customers SET paid_amount=?, last_payment_date=?, outstanding_amount='0' WHERE id=?",
+                         (amt, date, cust_id))
+            recovery_calendar.roll_forward(conn, [(cust_id, amt, date)])
+            write_queue.log_intent(conn, "payments", {"payments": [[can, amt, date]]})
+
+        try:
+            self.writes.run(work)
+        except (sqlite3.Error, ValueError) as e:
+            messagebox.showerror("Error", f"Payment not saved: {e}")
+            return
+
         # SYNC TO EXCEL WITH ERROR HANDLING
-        self.sync_payment_to_excel(self.var_can.get(), amt, date)
+        if self.sync_excel():
+            messagebox.showinfo("Success", "Payment Updated & Synced to Excel")
+        self.refresh_risk_scores()
 
         self.var_pay_amount.set("")
+        self.history_page = 0
         self.show_payment_tab()
 
-    def sync_payment_to_excel(self, can, amount, date):
+    def sync_excel(self, notify=True):
+        """
+        Applies the pending Excel intents in commit order. While the workbook is
+        open they stay pending and go out with the next save or start-up.
+        """
+        conn = self.get_db_connection()
+        pending = write_queue.pending_intents(conn)
+        conn.close()
+        if not pending: return True
+        ids = [intent[0] for intent in pending]
+        try:
+            missing = excel_sync.apply_intents(self.excel_file, pending)
+        except PermissionError:
+            if notify: messagebox.showwarning("File Locked", "Please close the Excel file to sync changes.\nData saved to Database; Excel will be updated on the next save.")
+            else: print("Excel sync deferred: workbook is open")
+            return False
+        except Exception as e:
+            self.writes.run(lambda conn: write_queue.mark_intents(conn, ids, e))
+            if notify: messagebox.showerror("Excel Error", f"Could not sync to Excel: {e}")
+            else: print(f"Excel sync failed: {e}")
+            return False
+        self.writes.run(lambda conn: write_queue.mark_intents(conn, ids))
+        if missing and notify:
+            messagebox.showwarning("Excel Sync", f"{len(missing)} customer(s) not found in Excel (CAN: {', '.join(missing[:10])}).\nPayments saved to App only.")
+        return not missing
+
+    # --- BULK PAYMENT ENTRY ---
+    def show_bulk_payment_entry(self, receipts=None):
+        self.clear_content_frame()
+        content = ctk.CTkScrollableFrame(self.content_frame)
+        content.pack(fill="both", expand=True, padx=20, pady=20)
+
+        ctk.CTkLabel(content, text="Bulk Payment Entry", font=("Arial", 22, "bold")).pack(anchor="w", pady=(0, 5))
+        ctk.CTkLabel(content, text="Enter collector receipts below or load a CSV/Excel file with columns CAN, Amount, Date.", text_color="gray").pack(anchor="w", pady=(0, 10))
+
+        tools = ctk.CTkFrame(content)
+        tools.pack(fill="x", pady=5)
+        ctk.CTkButton(tools, text="Load File...", command=self.load_bulk_payment_file).pack(side="left", padx=10, pady=10)
+        ctk.CTkButton(tools, text="Add 10 Rows", command=lambda: self.add_bulk_rows(10)).pack(side="left", padx=10)
+        ctk.CTkButton(tools, text="Back", command=self.show_payment_tab, fg_color="gray").pack(side="right", padx=10)
+        ctk.CTkButton(tools, text="Commit Batch", command=self.commit_bulk_payments, fg_color="green").pack(side="right", padx=10)
+        ctk.CTkButton(tools, text="Validate", command=self.validate_bulk_payments).pack(side="right", padx=10)
+
+        self.bulk_summary_frame = ctk.CTkFrame(content, fg_color="transparent")
+        self.bulk_summary_frame.pack(fill="x", pady=5)
+
+        header = ctk.CTkFrame(content, fg_color="transparent")
+        header.pack(fill="x")
+        for text, width in (("#", 40), ("CAN", 160), ("Amount (₹)", 120), ("Date (YYYY-MM-DD)", 160)):
+            ctk.CTkLabel(header, text=text, width=width, font=("Arial", 12, "bold")).pack(side="left", padx=5)
+
+        self.bulk_grid = ctk.CTkFrame(content, fg_color="transparent")
+        self.bulk_grid.pack(fill="x")
+        self.bulk_rows = []
+        if receipts:
+            for can, amount, date in receipts:
+                self.add_bulk_rows(1, (can, amount, date))
+        else:
+            self.add_bulk_rows(20)
+
+    def add_bulk_rows(self, count, values=None):
+        today = datetime.date.today().strftime("%Y-%m-%d")
+        for _ in range(count):
+            can, amount, date = values if values else ("", "", today)
+            row_vars = (StringVar(value=can), StringVar(value=amount), StringVar(value=date))
+            row = ctk.CTkFrame(self.bulk_grid, fg_color="transparent")
+            row.pack(fill="x", pady=1)
+            ctk.CTkLabel(row, text=str(len(self.bulk_rows) + 1), width=40).pack(side="left", padx=5)
+            ctk.CTkEntry(row, textvariable=row_vars[0], width=160).pack(side="left", padx=5)
+            ctk.CTkEntry(row, textvariable=row_vars[1], width=120).pack(side="left", padx=5)
+            ctk.CTkEntry(row, textvariable=row_vars[2], width=160).pack(side="left", padx=5)
+            self.bulk_rows.append(row_vars)
+
+    def get_bulk_receipts(self):
+        receipts = []
+        for can_var, amt_var, date_var in self.bulk_rows:
+            can, amt = can_var.get().strip(), amt_var.get().strip()
+            if can or amt:
+                receipts.append((can, amt, date_var.get().strip()))
+        return receipts
+
+    def load_bulk_payment_file(self):
+        filename = filedialog.askopenfilename(filetypes=[("Receipts", "*.csv *.xlsx *.xls"), ("All Files", "*.*")])
+        if not filename: return
         try:
-            if os.path.exists(EXCEL_FILE):
-                # Try to open file to check if locked
-                try:
-                    with open(EXCEL_FILE, "r+"): pass
-                except IOError:
-                    messagebox.showwarning("File Locked", "Please close the Excel file to sync changes.\nData saved to Database only.")
-                    return
-
-                df = pd.read_excel(EXCEL_FILE)
-                df['CAN'] = df['CAN'].astype(str)
-                can_str = str(can)
-                
-                if can_str in df['CAN'].values:
-                    idx = df.index[df['CAN'] == can_str].tolist()[0]
-                    df.at[idx, 'Paid'] = amount
-                    df.at[idx, 'Payment Date'] = date
-                    df.to_excel(EXCEL_FILE, index=False)
-                    messagebox.showinfo("Success", "Payment Updated & Synced to Excel")
-                else:
-                    messagebox.showwarning("Excel Sync", "Payment saved to App, but Customer CAN not found in Excel.")
+            df = payment_batch.read_receipts_file(filename)
         except Exception as e:
-            messagebox.showerror("Excel Error", f"Could not sync to Excel: {e}")
+            messagebox.showerror("File Error", f"Could not read receipts file: {e}")
+            return
+        self.show_bulk_payment_entry(list(df.itertuples(index=False, name=None)))
+        self.validate_bulk_payments()
+
+    def validate_bulk_payments(self):
+        receipts = self.get_bulk_receipts()
+        if not receipts:
+            messagebox.showwarning("Warning", "No receipts entered.")
+            return None
+        conn = self.get_db_connection()
+        summary = payment_batch.reconcile_receipts(conn, receipts)
+        conn.close()
+        self.show_bulk_summary(summary)
+        return summary
+
+    def commit_bulk_payments(self):
+        summary = self.validate_bulk_payments()
+        if not summary: return
+        matched = summary["matched"]
+        if not matched:
+            messagebox.showwarning("Nothing to Commit", "No matched receipts in this batch.")
+            return
+        if not messagebox.askyesno("Commit Batch", f"Record {len(matched)} payment(s)?\nUnmatched and duplicate receipts will be skipped."):
+            return
+
+        try:
+            self.writes.run(lambda conn: payment_batch.commit_receipts(conn, matched))
+        except (sqlite3.Error, ValueError) as e:
+            messagebox.showerror("Error", f"Batch rolled back: {e}")
+            return
+
+        # One Excel read/write for the whole batch
+        self.sync_excel()
+        self.refresh_risk_scores()
+
+        report = payment_batch.write_summary_csv(summary, f"reconciliation_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+        messagebox.showinfo("Batch Committed", f"Recorded {len(matched)} payment(s).\nUnmatched: {len(summary['unmatched'])}  Duplicate: {len(summary['duplicate'])}" + (f"\nSummary saved as {report}" if report else ""))
+        leftovers = [(e["can"], e["amount"], e["date"]) for e in summary["unmatched"]]
+        self.show_bulk_payment_entry(leftovers or None)
+
+    def show_bulk_summary(self, summary):
+        for widget in self.bulk_summary_frame.winfo_children():
+            widget.destroy()
+        counts = ctk.CTkFrame(self.bulk_summary_frame, fg_color="transparent")
+        counts.pack(fill="x")
+        self.card(counts, "Matched", str(len(summary["matched"])), "#28a745").pack(side="left", fill="x", expand=True, padx=5)
+        self.card(counts, "Unmatched", str(len(summary["unmatched"])), "#d9534f").pack(side="left", fill="x", expand=True, padx=5)
+        self.card(counts, "Duplicate", str(len(summary["duplicate"])), "#f0ad4e").pack(side="left", fill="x", expand=True, padx=5)
+        for entry in summary["unmatched"] + summary["duplicate"]:
+            ctk.CTkLabel(self.bulk_summary_frame, text=f"Row {entry['line']}: CAN {entry['can']} ₹{entry['amount']} on {entry['date']} - {entry['reason']}",
+                         text_color="orange", anchor="w").pack(fill="x", padx=10)
 
     # --- CUSTOMER MANAGER ---
     def show_customer_manager(self):
@@ -441,6 +826,13 @@ class CableManagerApp(ctk.CTk):
         ctk.CTkLabel(form_frame, text="Status").grid(row=10, column=0, sticky="w", padx=10)
         ctk.CTkOptionMenu(form_frame, variable=self.var_status, values=["Active", "Inactive"]).grid(row=11, column=0, sticky="ew", padx=10, pady=5)
 
+        # A TV pack overrides the typed Monthly Rental with its current price; internet is billed on top
+        plan_codes = self.plan_codes()
+        ctk.CTkLabel(form_frame, text="TV Pack").grid(row=10, column=1, sticky="w", padx=10)
+        ctk.CTkOptionMenu(form_frame, variable=self.var_plan, values=["None"] + plan_codes["tv"]).grid(row=11, column=1, sticky="ew", padx=10, pady=5)
+        ctk.CTkLabel(form_frame, text="Internet Plan").grid(row=12, column=0, sticky="w", padx=10)
+        ctk.CTkOptionMenu(form_frame, variable=self.var_internet_plan, values=["None"] + plan_codes["internet"]).grid(row=13, column=0, sticky="ew", padx=10, pady=5)
+
         btn_frame = ctk.CTkFrame(form_scroll, fg_color="transparent")
         btn_frame.pack(fill="x", pady=20)
         ctk.CTkButton(btn_frame, text="Save / Update", command=self.save_customer, fg_color="green").pack(side="right", padx=10)
@@ -457,31 +849,20 @@ class CableManagerApp(ctk.CTk):
         if not confirm: return
         
         can_to_delete = str(self.var_can.get())
+        cust_id = self.current_customer_id
+
+        def work(conn):
+            old = conn.execute("SELECT stb_no, wifi_router_id FROM customers WHERE id=?", (cust_id,)).fetchone() or ("", "")
+            inventory_ledger.sync_customer_devices(conn, cust_id, {"stb_no": old[0], "wifi_router_id": old[1]}, {})
+            conn.execute("DELETE FROM customers WHERE id=?", (cust_id,))
+            write_queue.log_intent(conn, "delete_customer", {"can": can_to_delete})
 
-        conn = self.get_db_connection()
-        c = conn.cursor()
-        c.execute("DELETE FROM customers WHERE id=?", (self.current_customer_id,))
-        conn.commit()
-        conn.close()
-        
         try:
-            if os.path.exists(EXCEL_FILE):
-                # Check for lock before trying
-                try:
-                    with open(EXCEL_FILE, "r+"): pass
-                except IOError:
-                    messagebox.showwarning("File Locked", "Deleted from App, but Excel file is open.\nClose Excel and try again to sync.")
-                    self.clear_form()
-                    self.show_dashboard()
-                    return
-
-                df = pd.read_excel(EXCEL_FILE)
-                df['CAN'] = df['CAN'].astype(str)
-                df = df[df['CAN'] != can_to_delete]
-                df.to_excel(EXCEL_FILE, index=False)
-                print("Deleted from Excel")
-        except Exception as e:
-            messagebox.showerror("Excel Error", f"Could not remove from Excel: {e}")
+            self.writes.run(work)
+        except (sqlite3.Error, ValueError) as e:
+            messagebox.showerror("Delete Failed", str(e))
+            return
+        self.sync_excel()
 
         messagebox.showinfo("Deleted", "Customer deleted successfully.")
         self.clear_form()
@@ -499,6 +880,11 @@ class CableManagerApp(ctk.CTk):
         c = conn.cursor()
         c.execute("SELECT item_name, quantity FROM inventory")
         items = c.fetchall()
+        c.execute("SELECT item_name, status, COUNT(*) FROM inventory_serials GROUP BY item_name, status")
+        serial_counts = {}
+        for item_name, status, count in c.fetchall():
+            serial_counts.setdefault(item_name, {})[status] = count
+        movements = inventory_ledger.recent_movements(conn)
         conn.close()
         
         for item in items:
@@ -506,6 +892,9 @@ class CableManagerApp(ctk.CTk):
             row.pack(fill="x", pady=2)
             ctk.CTkLabel(row, text=item[0], width=200, anchor="w").pack(side="left", padx=10)
             ctk.CTkLabel(row, text=f"Stock: {item[1]}", width=100).pack(side="left", padx=10)
+            if item[0] in serial_counts:
+                counts = serial_counts[item[0]]
+                ctk.CTkLabel(row, text=f"Serials in stock: {counts.get('IN_STOCK', 0)} | Issued: {counts.get('ISSUED', 0)}", text_color="gray").pack(side="left", padx=10)
         
         update_frame = ctk.CTkFrame(content)
         update_frame.pack(fill="x", pady=20)
@@ -518,19 +907,67 @@ class CableManagerApp(ctk.CTk):
             ctk.CTkEntry(update_frame, textvariable=self.var_inv_qty, placeholder_text="Qty", width=60).pack(side="left", padx=10)
             ctk.CTkButton(update_frame, text="Add (+)", command=lambda: self.update_inventory(1), width=80).pack(side="left", padx=5)
             ctk.CTkButton(update_frame, text="Remove (-)", command=lambda: self.update_inventory(-1), width=80, fg_color="red").pack(side="left", padx=5)
+            ctk.CTkButton(update_frame, text="Receive Serials from File", command=self.receive_serials_file, fg_color="#6610f2").pack(side="left", padx=15)
+
+        lookup = ctk.CTkFrame(content)
+        lookup.pack(fill="x", pady=10)
+        ctk.CTkLabel(lookup, text="Find Serial Number").pack(anchor="w", padx=10, pady=5)
+        ctk.CTkEntry(lookup, textvariable=self.var_serial_lookup, placeholder_text="STB / Router Serial", width=250).pack(side="left", padx=10, pady=10)
+        ctk.CTkButton(lookup, text="Find Holder", command=self.find_serial_holder, width=100).pack(side="left", padx=5)
+        self.serial_result_label = ctk.CTkLabel(lookup, text="")
+        self.serial_result_label.pack(side="left", padx=10)
+
+        ctk.CTkLabel(content, text="Recent Stock Movements", font=("Arial", 16, "bold")).pack(anchor="w", pady=(20, 10))
+        for created_at, item_name, movement, qty, serial_no, customer_name in movements:
+            text = f"{created_at}   {movement:<9} {qty} x {item_name}"
+            if serial_no: text += f"   #{serial_no}"
+            if customer_name: text += f"   -> {customer_name}"
+            ctk.CTkLabel(content, text=text, anchor="w", font=("Courier", 12)).pack(fill="x", padx=10)
 
     def update_inventory(self, multiplier):
         try:
             qty = int(self.var_inv_qty.get())
+            if qty <= 0: raise ValueError
             item = self.var_inv_item.get()
-            conn = self.get_db_connection()
-            c = conn.cursor()
-            c.execute("UPDATE inventory SET quantity = quantity + ? WHERE item_name = ?", (qty * multiplier, item))
-            conn.commit()
-            conn.close()
+            self.writes.run(lambda conn: inventory_ledger.record_movement(conn, item, "IN" if multiplier > 0 else "OUT", qty, remarks="Manual stock update"))
             self.show_inventory() 
         except ValueError:
             messagebox.showerror("Error", "Please enter a valid number")
+        except sqlite3.Error as e:
+            messagebox.showerror("Error", f"Stock not updated: {e}")
+
+    def receive_serials_file(self):
+        item = self.var_inv_item.get()
+        if not item:
+            messagebox.showwarning("Warning", "Select the item being received first.")
+            return
+        filename = filedialog.askopenfilename(filetypes=[("Serial List", "*.csv *.xlsx *.xls"), ("All Files", "*.*")])
+        if not filename: return
+        try:
+            serials = inventory_ledger.read_serials_file(filename)
+            received, rejected = self.writes.run(lambda conn: inventory_ledger.receive_serials(conn, item, serials))
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not receive serials: {e}")
+            return
+        msg = f"Received {len(received)} x {item}."
+        if rejected:
+            msg += f"\n\nRejected {len(rejected)}:\n" + "\n".join(f"{s} - {reason}" for s, reason in rejected[:15])
+            if len(rejected) > 15: msg += f"\n... and {len(rejected) - 15} more"
+        messagebox.showinfo("Batch Receive", msg)
+        self.show_inventory()
+
+    def find_serial_holder(self):
+        serial = self.var_serial_lookup.get().strip()
+        if not serial: return
+        conn = self.get_db_connection()
+        row = inventory_ledger.find_serial_holder(conn, serial)
+        conn.close()
+        if not row:
+            self.serial_result_label.configure(text="Serial not found in ledger.", text_color="orange")
+        elif row[2] == "ISSUED":
+            self.serial_result_label.configure(text=f"{row[1]} issued to {row[4]} (CAN: {row[5]})", text_color="green")
+        else:
+            self.serial_result_label.configure(text=f"{row[1]} - {row[2].replace('_', ' ').title()}", text_color=("gray10", "#DCE4EE"))
 
     # --- COMPLAINTS ---
     def show_complaints(self):
@@ -549,45 +986,159 @@ class CableManagerApp(ctk.CTk):
         else:
             ctk.CTkLabel(content, text="Select a customer to log a new complaint.", text_color="gray").pack(anchor="w", padx=20)
 
+        self.complaint_sla_frame = ctk.CTkFrame(content, fg_color="transparent")
+        self.complaint_sla_frame.pack(fill="x", pady=(20, 0))
+
         ctk.CTkLabel(content, text="All Active Complaints", font=("Arial", 16, "bold")).pack(anchor="w", pady=(20, 10))
+        self.complaint_list = ctk.CTkFrame(content, fg_color="transparent")
+        self.complaint_list.pack(fill="x")
+        self.complaint_cards = {}
+        self.complaints_synced_at = ""
+
         conn = self.get_db_connection()
         c = conn.cursor()
-        c.execute("SELECT id, customer_name, issue, date_logged, status FROM complaints WHERE status='Open' ORDER BY date_logged DESC")
-        rows = c.fetchall()
-        
-        if not rows:
-            ctk.CTkLabel(content, text="No open complaints.").pack(pady=10)
-            
-        for r in rows:
-            card = ctk.CTkFrame(content)
-            card.pack(fill="x", pady=5)
-            ctk.CTkLabel(card, text=f"{r[3]}", width=100).pack(side="left", padx=5)
-            ctk.CTkLabel(card, text=f"{r[1]}", width=150, font=("Arial", 12, "bold")).pack(side="left", padx=5)
-            ctk.CTkLabel(card, text=f"{r[2]}", width=300, anchor="w").pack(side="left", padx=5)
-            ctk.CTkButton(card, text="Mark Resolved", fg_color="green", width=100,
-                          command=lambda cid=r[0]: self.resolve_complaint(cid)).pack(side="right", padx=10, pady=5)
+        # Served by the partial index idx_complaints_open
+        c.execute("SELECT id, customer_name, issue, logged_at, technician, updated_at FROM complaints WHERE status='Open' ORDER BY logged_at DESC")
+        for r in c.fetchall():
+            self.complaint_cards[r[0]] = self.complaint_card(r)
+        c.execute("SELECT MAX(updated_at) FROM complaints")
+        self.complaints_synced_at = c.fetchone()[0] or self.complaints_synced_at
         conn.close()
 
-    def log_complaint(self):
-        if not self.var_complaint_issue.get(): return
+        self.render_complaint_sla()
+        self.toggle_empty_complaints()
+
+    def complaint_card(self, r, before=None):
+        cid, customer_name, issue, logged_at, technician = r[:5]
+        card = ctk.CTkFrame(self.complaint_list)
+        if before is not None: card.pack(fill="x", pady=5, before=before)
+        else: card.pack(fill="x", pady=5)
+        ctk.CTkLabel(card, text=f"{logged_at[:10] if logged_at else ''}", width=100).pack(side="left", padx=5)
+        ctk.CTkLabel(card, text=self.complaint_age(logged_at), width=70, text_color="orange").pack(side="left", padx=5)
+        ctk.CTkLabel(card, text=f"{customer_name}", width=150, font=("Arial", 12, "bold")).pack(side="left", padx=5)
+        ctk.CTkLabel(card, text=f"{issue}", width=300, anchor="w").pack(side="left", padx=5)
+        ctk.CTkButton(card, text="Mark Resolved", fg_color="green", width=100,
+                      command=lambda: self.resolve_complaint(cid)).pack(side="right", padx=10, pady=5)
+        ctk.CTkButton(card, text="Assign", width=70, fg_color="gray",
+                      command=lambda: self.assign_technician(cid)).pack(side="right", padx=5, pady=5)
+        ctk.CTkLabel(card, text=f"Tech: {technician}" if technician else "Unassigned", width=120,
+                     text_color=("gray10", "#DCE4EE") if technician else "gray").pack(side="right", padx=5)
+        return card
+
+    def complaint_age(self, logged_at):
+        try:
+            age = datetime.datetime.now() - datetime.datetime.strptime(logged_at, "%Y-%m-%d %H:%M:%S")
+        except (TypeError, ValueError):
+            return ""
+        return f"{age.days}d {age.seconds // 3600}h"
+
+    def render_complaint_sla(self):
+        for widget in self.complaint_sla_frame.winfo_children():
+            widget.destroy()
         conn = self.get_db_connection()
         c = conn.cursor()
-        c.execute("INSERT INTO complaints (customer_id, customer_name, issue, date_logged, status) VALUES (?, ?, ?, ?, 'Open')",
-                  (self.current_customer_id, self.var_name.get(), self.var_complaint_issue.get(), datetime.date.today()))
-        conn.commit()
+        c.execute("""
+            SELECT
+                SUM(CASE WHEN age < 1 THEN 1 ELSE 0 END),
+                SUM(CASE WHEN age >= 1 AND age < 3 THEN 1 ELSE 0 END),
+                SUM(CASE WHEN age >= 3 AND age < 7 THEN 1 ELSE 0 END),
+                SUM(CASE WHEN age >= 7 THEN 1 ELSE 0 END),
+                SUM(CASE WHEN age * 24 > ? THEN 1 ELSE 0 END)
+            FROM (SELECT julianday('now', 'localtime') - julianday(logged_at) AS age FROM complaints WHERE status='Open')
+        """, (COMPLAINT_SLA_HOURS,))
+        under_1d, d1_3, d3_7, over_7d, breached = [v or 0 for v in c.fetchone()]
+        c.execute("""
+            SELECT COUNT(*),
+                   AVG((julianday(resolved_at) - julianday(logged_at)) * 24),
+                   SUM(CASE WHEN (julianday(resolved_at) - julianday(logged_at)) * 24 <= ? THEN 1 ELSE 0 END)
+            FROM complaints
+            WHERE status='Resolved' AND resolved_at >= datetime('now', 'localtime', '-30 days')
+        """, (COMPLAINT_SLA_HOURS,))
+        resolved, avg_hours, within_sla = c.fetchone()
         conn.close()
-        self.var_complaint_issue.set("")
-        self.show_complaints()
 
-    def resolve_complaint(self, complaint_id):
+        row = ctk.CTkFrame(self.complaint_sla_frame, fg_color="transparent")
+        row.pack(fill="x")
+        self.card(row, "Open < 1 Day", str(under_1d), "#28a745").pack(side="left", fill="x", expand=True, padx=5)
+        self.card(row, "1-3 Days", str(d1_3), "#17a2b8").pack(side="left", fill="x", expand=True, padx=5)
+        self.card(row, "3-7 Days", str(d3_7), "#f0ad4e").pack(side="left", fill="x", expand=True, padx=5)
+        self.card(row, "Over 7 Days", str(over_7d), "#d9534f").pack(side="left", fill="x", expand=True, padx=5)
+        sla_text = f"{breached} open past {COMPLAINT_SLA_HOURS}h SLA"
+        if resolved:
+            sla_text += f"  |  Last 30 days: {resolved} resolved, avg {avg_hours:.1f}h, {100 * within_sla / resolved:.0f}% within SLA"
+        ctk.CTkLabel(self.complaint_sla_frame, text=sla_text, text_color="gray").pack(anchor="w", padx=5, pady=5)
+
+    def toggle_empty_complaints(self):
+        if self.complaint_empty_label is not None and self.complaint_empty_label.winfo_exists():
+            self.complaint_empty_label.destroy()
+        self.complaint_empty_label = None
+        if not self.complaint_cards:
+            self.complaint_empty_label = ctk.CTkLabel(self.complaint_list, text="No open complaints.")
+            self.complaint_empty_label.pack(pady=10)
+
+    def refresh_complaints(self):
+        """ Redraws only the complaint cards changed since the last refresh """
+        if self.complaint_list is None or not self.complaint_list.winfo_exists():
+            return
         conn = self.get_db_connection()
         c = conn.cursor()
-        c.execute("UPDATE complaints SET status='Resolved', date_resolved=? WHERE id=?", 
-                  (datetime.date.today(), complaint_id))
-        conn.commit()
+        c.execute("SELECT id, customer_name, issue, logged_at, technician, updated_at, status FROM complaints WHERE updated_at >= ? ORDER BY logged_at ASC",
+                  (self.complaints_synced_at,))
+        changed = c.fetchall()
         conn.close()
+
+        for r in changed:
+            old = self.complaint_cards.pop(r[0], None)
+            if r[6] == 'Open':
+                if old is not None:
+                    self.complaint_cards[r[0]] = self.complaint_card(r, before=old)
+                else:
+                    # Newest complaints go on top
+                    first = self.complaint_list.winfo_children()
+                    self.complaint_cards[r[0]] = self.complaint_card(r, before=first[0] if first else None)
+            if old is not None:
+                old.destroy()
+            self.complaints_synced_at = max(self.complaints_synced_at, r[5] or "")
+
+        self.render_complaint_sla()
+        self.toggle_empty_complaints()
+
+    def log_complaint(self):
+        if not self.var_complaint_issue.get(): return
+        now = timestamp_now()
+        values = (self.current_customer_id, self.var_name.get(), self.var_complaint_issue.get(), datetime.date.today(), now, now)
+        try:
+            self.writes.run(lambda conn: conn.execute(
+                "INSERT INTO complaints (customer_id, customer_name, issue, date_logged, logged_at, updated_at, status) VALUES (?, ?, ?, ?, ?, ?, 'Open')", values))
+        except sqlite3.Error as e:
+            messagebox.showerror("Error", f"Complaint not logged: {e}")
+            return
+        self.var_complaint_issue.set("")
+        self.refresh_complaints()
+
+    def assign_technician(self, complaint_id):
+        dialog = ctk.CTkInputDialog(text="Technician Name:", title="Assign Complaint")
+        technician = dialog.get_input()
+        if technician is None: return
+        values = (technician.strip() or None, timestamp_now(), complaint_id)
+        try:
+            self.writes.run(lambda conn: conn.execute("UPDATE complaints SET technician=?, updated_at=? WHERE id=?", values))
+        except sqlite3.Error as e:
+            messagebox.showerror("Error", f"Technician not assigned: {e}")
+            return
+        self.refresh_complaints()
+
+    def resolve_complaint(self, complaint_id):
+        now = timestamp_now()
+        values = (datetime.date.today(), now, now, complaint_id)
+        try:
+            self.writes.run(lambda conn: conn.execute(
+                "UPDATE complaints SET status='Resolved', date_resolved=?, resolved_at=?, updated_at=? WHERE id=?", values))
+        except sqlite3.Error as e:
+            messagebox.showerror("Error", f"Complaint not resolved: {e}")
+            return
         messagebox.showinfo("Success", "Complaint marked as Resolved.")
-        self.show_complaints()
+        self.refresh_complaints()
 
     # --- REPORTS ---
     def show_reports(self):
@@ -614,6 +1165,307 @@ class CableManagerApp(ctk.CTk):
         
         ctk.CTkLabel(content, text="Note: Dates filter based on 'Recovery/Payment Date'").pack(pady=10)
 
+        ctk.CTkButton(content, text="Check Duplicate Device Serials", command=self.show_duplicate_devices, fg_color="#f0ad4e").pack(pady=10)
+
+        trends = ctk.CTkFrame(content)
+        trends.pack(pady=10, padx=20, fill="both", expand=True)
+        ctk.CTkLabel(trends, text="Trend Reports", font=("Arial", 16, "bold")).pack(anchor="w", padx=10, pady=(10, 0))
+        info = analytics_snapshot.snapshot_info(self.tenant["snapshot_dir"])
+        status = f"Snapshot of {info['created_at'].replace('T', ' ')} ({info['customers']} customers, {info['payments']} payments)" if info else "No snapshot built yet."
+        self.snapshot_label = ctk.CTkLabel(trends, text=status, text_color="gray")
+        self.snapshot_label.pack(anchor="w", padx=10)
+
+        btns = ctk.CTkFrame(trends, fg_color="transparent")
+        btns.pack(fill="x", padx=5, pady=5)
+        ctk.CTkButton(btns, text="Revenue Trend (12 Months)", command=lambda: self.show_trend_report(analytics_snapshot.monthly_revenue_trend)).pack(side="left", padx=5)
+        ctk.CTkButton(btns, text="Churn by Area", command=lambda: self.show_trend_report(analytics_snapshot.churn_by_area)).pack(side="left", padx=5)
+        ctk.CTkButton(btns, text="HD / SD Mix", command=lambda: self.show_trend_report(analytics_snapshot.hd_sd_mix)).pack(side="left", padx=5)
+        ctk.CTkButton(btns, text="Rebuild Snapshot", command=lambda: self.refresh_snapshot_if_stale(force=True), fg_color="gray").pack(side="right", padx=5)
+        if len(self.router.tenants()) > 1:
+            ctk.CTkButton(btns, text="All Networks Summary", command=self.show_consolidated_report, fg_color="#6610f2").pack(side="right", padx=5)
+
+        self.trend_output = ctk.CTkTextbox(trends, font=("Courier", 13), height=260)
+        self.trend_output.pack(fill="both", expand=True, padx=10, pady=10)
+
+    def show_trend_report(self, report):
+        try:
+            df = report(self.tenant["snapshot_dir"])
+            text = "No data in snapshot." if df.empty else df.to_string(index=False)
+        except FileNotFoundError as e:
+            text = str(e)
+        except Exception as e:
+            text = f"Report failed: {e}"
+        self.trend_output.delete("1.0", "end")
+        self.trend_output.insert("1.0", text)
+
+    def show_consolidated_report(self):
+        try:
+            rows = tenants.consolidated_report(self.router.tenants())
+            df = pd.DataFrame(rows, columns=tenants.CONSOLIDATED_COLUMNS)
+            text = "No tenant databases found." if df.empty else df.to_string(index=False)
+        except sqlite3.Error as e:
+            text = f"Consolidated report failed: {e}"
+        self.trend_output.delete("1.0", "end")
+        self.trend_output.insert("1.0", text)
+
+    def refresh_snapshot_if_stale(self, force=False):
+        if self.snapshot_thread and self.snapshot_thread.is_alive(): return
+        db_file, snapshot_dir = self.db_file, self.tenant["snapshot_dir"]
+        if not force and not analytics_snapshot.snapshot_is_stale(snapshot_dir): return
+
+        def build():
+            try: analytics_snapshot.build_snapshot(db_file, snapshot_dir)
+            except Exception as e: print(f"Snapshot build failed: {e}")
+
+        self.snapshot_thread = threading.Thread(target=build, daemon=True)
+        self.snapshot_thread.start()
+        if force and self.snapshot_label is not None and self.snapshot_label.winfo_exists():
+            self.snapshot_label.configure(text="Rebuilding snapshot in the background...")
+
+    def refresh_risk_scores(self):
+        """ Rescores customers with new payments on a background thread; the upsert goes through the write queue """
+        if self.risk_thread and self.risk_thread.is_alive(): return
+        db_file, writes = self.db_file, self.writes
+
+        def score():
+            try:
+                conn = sqlite3.connect(db_file)
+                try: scores = risk_scoring.compute_scores(conn)
+                finally: conn.close()
+                if scores is not None:
+                    writes.run(lambda c: risk_scoring.store_scores(c, scores))
+            except Exception as e:
+                print(f"Risk scoring failed: {e}")
+
+        self.risk_thread = threading.Thread(target=score, daemon=True)
+        self.risk_thread.start()
+
+    def remind_customer(self, cust_id):
+        conn = self.get_db_connection()
+        row = conn.execute("SELECT * FROM customers WHERE id=?", (cust_id,)).fetchone()
+        conn.close()
+        if row:
+            self.load_customer(row)
+            self.open_whatsapp_web()
+
+    # --- RECOVERY CALENDAR ---
+    def show_recovery_calendar(self, year=None, month=None):
+        today = datetime.date.today()
+        year, month = year or today.year, month or today.month
+        conn = self.get_db_connection()
+        heat = recovery_calendar.month_heatmap(conn, year, month)
+        overdue = recovery_calendar.due_customers(conn, datetime.date.min, today, limit=30)
+        upcoming = recovery_calendar.due_customers(conn, today, today + datetime.timedelta(days=7), limit=30)
+        conn.close()
+
+        self.clear_content_frame()
+        content = ctk.CTkScrollableFrame(self.content_frame)
+        content.pack(fill="both", expand=True, padx=20, pady=20)
+        ctk.CTkLabel(content, text="Recovery Calendar", font=("Arial", 22, "bold")).pack(anchor="w", pady=(0, 10))
+
+        nav = ctk.CTkFrame(content, fg_color="transparent")
+        nav.pack(fill="x")
+        prev_month = recovery_calendar.due_date(year, month - 1, 1)
+        next_month = recovery_calendar.due_date(year, month + 1, 1)
+        ctk.CTkButton(nav, text="< Prev", width=80, command=lambda: self.show_recovery_calendar(prev_month.year, prev_month.month)).pack(side="left")
+        ctk.CTkLabel(nav, text=datetime.date(year, month, 1).strftime("%B %Y"), font=("Arial", 16, "bold"), width=180).pack(side="left", padx=10)
+        ctk.CTkButton(nav, text="Next >", width=80, command=lambda: self.show_recovery_calendar(next_month.year, next_month.month)).pack(side="left")
+        expected = sum(e for e, _ in heat.values())
+        collected = sum(c for _, c in heat.values())
+        ctk.CTkLabel(nav, text=f"Expected ₹{expected:,.0f}  |  Collected ₹{collected:,.0f}", text_color="gray").pack(side="right", padx=10)
+
+        # Heatmap: rentals falling due on each day against what was collected that day
+        grid = ctk.CTkFrame(content)
+        grid.pack(fill="x", pady=10)
+        for col, name in enumerate(("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")):
+            grid.grid_columnconfigure(col, weight=1)
+            ctk.CTkLabel(grid, text=name, font=("Arial", 12, "bold")).grid(row=0, column=col, pady=5)
+        offset = datetime.date(year, month, 1).weekday()
+        for day, (due, paid) in heat.items():
+            pos = offset + day - 1
+            cell = ctk.CTkFrame(grid, fg_color=self.heat_color(due, paid, datetime.date(year, month, day) > today), corner_radius=4)
+            cell.grid(row=pos // 7 + 1, column=pos % 7, sticky="nsew", padx=2, pady=2)
+            ctk.CTkLabel(cell, text=str(day), font=("Arial", 12, "bold")).pack(anchor="w", padx=6)
+            ctk.CTkLabel(cell, text=f"Due ₹{due:,.0f}\nPaid ₹{paid:,.0f}", font=("Arial", 10), justify="left").pack(anchor="w", padx=6, pady=(0, 4))
+        ctk.CTkLabel(content, text="Green: collected covers the rentals due that day  |  Amber: half or more  |  Red: less  |  Grey: upcoming or nothing due",
+                     text_color="gray").pack(anchor="w")
+
+        for title, rows, color in (("Overdue", overdue, "#d9534f"), ("Due in the Next 7 Days", upcoming, "#17a2b8")):
+            section = ctk.CTkFrame(content)
+            section.pack(fill="x", pady=(15, 0))
+            ctk.CTkLabel(section, text=f"{title} ({len(rows)}{'+' if len(rows) == 30 else ''})", font=("Arial", 16, "bold")).pack(anchor="w", padx=10, pady=(10, 5))
+            if not rows:
+                ctk.CTkLabel(section, text="Nobody.", text_color="gray").pack(anchor="w", padx=10, pady=(0, 10))
+            for cust_id, name, can, contact, next_due, rental in rows:
+                row = ctk.CTkFrame(section, fg_color="transparent")
+                row.pack(fill="x", padx=10, pady=2)
+                ctk.CTkLabel(row, text=f"{name} (CAN: {can})", anchor="w", width=260).pack(side="left")
+                ctk.CTkLabel(row, text=f"Due {next_due}  ₹{rental or 0}", text_color=color, anchor="w").pack(side="left", padx=10)
+                ctk.CTkButton(row, text="Remind", width=80, fg_color="#25D366",
+                              command=lambda cid=cust_id: self.remind_customer(cid)).pack(side="right")
+
+    def heat_color(self, due, paid, upcoming):
+        if upcoming or not (due or paid): return ("gray85", "gray25")
+        ratio = paid / due if due else 1.0
+        if ratio >= 1: return "#2e7d32"
+        if ratio >= 0.5: return "#f9a825"
+        return "#c62828"
+
+    # --- PLANS & BILLING ---
+    def plan_codes(self):
+        conn = self.get_db_connection()
+        rows = conn.execute("SELECT code, kind FROM plans ORDER BY code").fetchall()
+        conn.close()
+        return {kind: [code for code, k in rows if k == kind] for kind in billing.KINDS}
+
+    def show_plans_billing(self, preview=None):
+        today = datetime.date.today()
+        conn = self.get_db_connection()
+        plans = billing.plan_list(conn, today)
+        runs = billing.bill_months(conn)
+        unplanned = conn.execute("SELECT COUNT(*) FROM customers WHERE status='Active' AND plan_id IS NULL").fetchone()[0]
+        conn.close()
+        if not self.var_plan_effective.get():
+            self.var_plan_effective.set(recovery_calendar.due_date(today.year, today.month + 1, 1).isoformat())
+        if not self.var_bill_month.get():
+            self.var_bill_month.set(today.strftime("%Y-%m"))
+
+        self.clear_content_frame()
+        content = ctk.CTkScrollableFrame(self.content_frame)
+        content.pack(fill="both", expand=True, padx=20, pady=20)
+        ctk.CTkLabel(content, text="Plans & Billing", font=("Arial", 22, "bold")).pack(anchor="w", pady=(0, 10))
+
+        catalog = ctk.CTkFrame(content)
+        catalog.pack(fill="x", pady=(0, 10))
+        ctk.CTkLabel(catalog, text="Plan Catalog", font=("Arial", 16, "bold")).pack(anchor="w", padx=10, pady=(10, 5))
+        if not plans:
+            ctk.CTkLabel(catalog, text="No plans yet. Add one below.", text_color="gray").pack(anchor="w", padx=10, pady=(0, 10))
+        for plan_id, code, name, kind, base, hd, extra, effective, subs, next_change in plans:
+            row = ctk.CTkFrame(catalog, fg_color="transparent")
+            row.pack(fill="x", padx=10, pady=2)
+            ctk.CTkLabel(row, text=f"{code} - {name} ({billing.KIND_LABELS[kind]})", anchor="w", width=260).pack(side="left")
+            if base is None:
+                price = "No price in effect yet"
+            else:
+                price = f"₹{base:,.0f}" + (f"  HD +₹{hd:,.0f}  Extra conn. +₹{extra:,.0f}" if kind == "tv" else "")
+            ctk.CTkLabel(row, text=f"{price}  |  {subs} active" + (f"  |  changes on {next_change}" if next_change else ""), anchor="w").pack(side="left", padx=10)
+            if kind == "tv":
+                ctk.CTkButton(row, text="Match Rentals", width=110, command=lambda p=plan_id: self.adopt_plan(p)).pack(side="right", padx=5)
+            ctk.CTkButton(row, text="Edit", width=70, command=lambda p=(code, name, kind, base, hd, extra): self.edit_plan(*p)).pack(side="right", padx=5)
+        ctk.CTkLabel(catalog, text=f"{unplanned} active customer(s) on no TV pack are billed their typed Monthly Rental (plus any internet plan).", text_color="gray").pack(anchor="w", padx=10, pady=(0, 10))
+
+        form = ctk.CTkFrame(content)
+        form.pack(fill="x", pady=10)
+        ctk.CTkLabel(form, text="Add Plan / Change Price", font=("Arial", 16, "bold")).grid(row=0, column=0, columnspan=4, sticky="w", padx=10, pady=(10, 5))
+        fields = [("Code", self.var_plan_code), ("Name", self.var_plan_name), ("Base Price", self.var_plan_base),
+                  ("HD Surcharge", self.var_plan_hd), ("Per Extra Connection", self.var_plan_extra), ("Effective From (YYYY-MM-DD)", self.var_plan_effective)]
+        for i, (label, var) in enumerate(fields):
+            ctk.CTkLabel(form, text=label).grid(row=1 + (i // 3) * 2, column=i % 3, sticky="w", padx=10)
+            ctk.CTkEntry(form, textvariable=var).grid(row=2 + (i // 3) * 2, column=i % 3, sticky="ew", padx=10, pady=(0, 10))
+        ctk.CTkLabel(form, text="Type").grid(row=1, column=3, sticky="w", padx=10)
+        ctk.CTkOptionMenu(form, variable=self.var_plan_kind, values=[billing.KIND_LABELS[k] for k in billing.KINDS]).grid(row=2, column=3, sticky="ew", padx=10, pady=(0, 10))
+        btns = ctk.CTkFrame(form, fg_color="transparent")
+        btns.grid(row=5, column=0, columnspan=4, sticky="ew", padx=10, pady=(0, 10))
+        ctk.CTkButton(btns, text="Preview Impact", command=self.preview_plan_price).pack(side="left", padx=(0, 10))
+        ctk.CTkButton(btns, text="Save Price", command=self.save_plan_price, fg_color="green").pack(side="left")
+        if preview:
+            delta = preview["proposed"] - preview["current"]
+            base_delta = preview["base_proposed"] - preview["base_current"]
+            share = base_delta / preview["base_current"] if preview["base_current"] else 0
+            text = (f"{preview['customers']} customer(s) on this plan: ₹{preview['current']:,.0f} -> ₹{preview['proposed']:,.0f} a month ({delta:+,.0f})\n"
+                    f"Whole base: ₹{preview['base_current']:,.0f} -> ₹{preview['base_proposed']:,.0f} a month ({base_delta:+,.0f}, {share:+.1%})")
+            ctk.CTkLabel(form, text=text, justify="left", text_color="#17a2b8" if delta >= 0 else "#d9534f").grid(row=6, column=0, columnspan=4, sticky="w", padx=10, pady=(0, 10))
+
+        bills = ctk.CTkFrame(content)
+        bills.pack(fill="x", pady=10)
+        ctk.CTkLabel(bills, text="Bill Run", font=("Arial", 16, "bold")).pack(anchor="w", padx=10, pady=(10, 5))
+        run = ctk.CTkFrame(bills, fg_color="transparent")
+        run.pack(fill="x", padx=10)
+        ctk.CTkLabel(run, text="Month (YYYY-MM):").pack(side="left")
+        ctk.CTkEntry(run, textvariable=self.var_bill_month, width=100).pack(side="left", padx=10)
+        ctk.CTkButton(run, text="Run Bills", command=self.run_bills, fg_color="green").pack(side="left")
+        for month, count, total in runs:
+            ctk.CTkLabel(bills, text=f"{month}: {count} bill(s), ₹{total:,.0f}", anchor="w").pack(anchor="w", padx=10)
+        ctk.CTkLabel(bills, text="Re-running a month replaces its bills.", text_color="gray").pack(anchor="w", padx=10, pady=(0, 10))
+
+    def plan_form_kind(self):
+        return {label: kind for kind, label in billing.KIND_LABELS.items()}.get(self.var_plan_kind.get(), "tv")
+
+    def edit_plan(self, code, name, kind, base, hd, extra):
+        self.var_plan_code.set(code)
+        self.var_plan_name.set(name or "")
+        self.var_plan_kind.set(billing.KIND_LABELS[kind])
+        for var, value in ((self.var_plan_base, base), (self.var_plan_hd, hd), (self.var_plan_extra, extra)):
+            var.set(f"{value:g}" if value is not None else "")
+        self.show_plans_billing()
+
+    def preview_plan_price(self):
+        code = self.var_plan_code.get().strip().upper()
+        conn = self.get_db_connection()
+        try:
+            row = conn.execute("SELECT id FROM plans WHERE code=?", (code,)).fetchone()
+            if not row: raise ValueError("Save a price for a new plan first; the preview compares against its current price.")
+            preview = billing.preview_price_change(conn, row[0], self.var_plan_base.get(), self.var_plan_hd.get(), self.var_plan_extra.get())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        finally:
+            conn.close()
+        self.show_plans_billing(preview)
+
+    def save_plan_price(self):
+        fields = (self.var_plan_code.get(), self.var_plan_name.get(), self.plan_form_kind(), self.var_plan_base.get(),
+                  self.var_plan_hd.get(), self.var_plan_extra.get(), self.var_plan_effective.get())
+
+        def work(conn):
+            billing.save_price(conn, *fields)
+            return billing.sync_rentals(conn)
+
+        try:
+            repriced = self.writes.run(work)
+        except (sqlite3.Error, ValueError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+        messagebox.showinfo("Success", f"Price saved for {fields[0].strip().upper()}." + (f"\n{repriced} customer rental(s) updated." if repriced else ""))
+        self.show_plans_billing()
+
+    def adopt_plan(self, plan_id):
+        try:
+            moved = self.writes.run(lambda conn: billing.adopt_plan(conn, plan_id))
+        except (sqlite3.Error, ValueError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+        messagebox.showinfo("Plans", f"{moved} customer(s) whose rental matches this plan were moved onto it.")
+        self.show_plans_billing()
+
+    def run_bills(self):
+        month = self.var_bill_month.get()
+        try:
+            count, total = self.writes.run(lambda conn: billing.run_bills(conn, month))
+        except (sqlite3.Error, ValueError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+        messagebox.showinfo("Bill Run", f"{count} bill(s) for {month.strip()[:7]}, total ₹{total:,.2f}")
+        self.show_plans_billing()
+
+    def show_duplicate_devices(self):
+        conn = self.get_db_connection()
+        dups = device_registry.find_duplicate_serials(conn)
+        conn.close()
+
+        self.clear_content_frame()
+        content = ctk.CTkScrollableFrame(self.content_frame)
+        content.pack(fill="both", expand=True, padx=20, pady=20)
+        ctk.CTkLabel(content, text="Duplicate Device Serials", font=("Arial", 22, "bold")).pack(anchor="w", pady=(0, 10))
+        ctk.CTkButton(content, text="Back to Reports", command=self.show_reports, fg_color="gray").pack(anchor="w", pady=(0, 10))
+        if not dups:
+            ctk.CTkLabel(content, text="No duplicate STB, smart card or router serials found.", text_color="green").pack(anchor="w", pady=10)
+        for device_type, serial, count, holders in dups:
+            row = ctk.CTkFrame(content)
+            row.pack(fill="x", pady=3)
+            ctk.CTkLabel(row, text=f"{device_type.replace('_', ' ').title()}  {serial}  (x{count})", width=260, anchor="w", font=("Arial", 12, "bold")).pack(side="left", padx=10, pady=5)
+            ctk.CTkLabel(row, text=holders, anchor="w", wraplength=650, justify="left").pack(side="left", padx=10)
+
     # --- SETTINGS (PASSWORD PROTECTED) ---
     def show_settings(self):
         dialog = ctk.CTkInputDialog(text="Enter Developer Password:", title="Admin Access")
@@ -638,6 +1490,372 @@ class CableManagerApp(ctk.CTk):
         ctk.CTkLabel(s2, text="Data Backup").pack(anchor="w", padx=10, pady=5)
         ctk.CTkButton(s2, text="One-Click Backup", command=self.backup_db, fg_color="#f0ad4e").pack(padx=10, pady=10, anchor="w")
 
+        s4 = ctk.CTkFrame(content)
+        s4.pack(fill="x", pady=10)
+        ctk.CTkLabel(s4, text="Networks (each with its own database, workbook and branding)").pack(anchor="w", padx=10, pady=5)
+        names = {t["business_name"]: t["id"] for t in self.router.tenants()}
+        var_active = StringVar(value=self.tenant["business_name"])
+        switch_row = ctk.CTkFrame(s4, fg_color="transparent")
+        switch_row.pack(fill="x")
+        ctk.CTkOptionMenu(switch_row, values=list(names), variable=var_active).pack(side="left", padx=10, pady=5)
+        ctk.CTkButton(switch_row, text="Switch Network", command=lambda: self.switch_tenant(names[var_active.get()])).pack(side="left", padx=10)
+        add_row = ctk.CTkFrame(s4, fg_color="transparent")
+        add_row.pack(fill="x", pady=5)
+        ctk.CTkEntry(add_row, textvariable=self.var_tenant_id, placeholder_text="Short ID", width=100).pack(side="left", padx=(10, 5))
+        ctk.CTkEntry(add_row, textvariable=self.var_tenant_name, placeholder_text="Business Name", width=200).pack(side="left", padx=5)
+        ctk.CTkEntry(add_row, textvariable=self.var_tenant_address, placeholder_text="Address", width=200).pack(side="left", padx=5)
+        ctk.CTkEntry(add_row, textvariable=self.var_tenant_contact, placeholder_text="Support Contact", width=130).pack(side="left", padx=5)
+        ctk.CTkButton(add_row, text="Add Network", command=self.add_tenant, fg_color="green", width=110).pack(side="left", padx=5)
+
+        s3 = ctk.CTkFrame(content)
+        s3.pack(fill="x", pady=10)
+        ctk.CTkLabel(s3, text="Excel Reconciliation (pull edits made directly in the workbook)").pack(anchor="w", padx=10, pady=5)
+        ctk.CTkButton(s3, text="Reconcile Now", command=self.show_excel_reconciliation).pack(side="left", padx=10, pady=10)
+        ctk.CTkButton(s3, text="Full Reconcile", command=lambda: self.show_excel_reconciliation(force=True), fg_color="gray").pack(side="left", padx=10, pady=10)
+
+        s5 = ctk.CTkFrame(content)
+        s5.pack(fill="x", pady=10)
+        header = ctk.CTkFrame(s5, fg_color="transparent")
+        header.pack(fill="x")
+        ctk.CTkLabel(header, text=f"Database Maintenance (runs when idle, every {maintenance.MAINTENANCE_INTERVAL_HOURS}h)").pack(side="left", padx=10, pady=5)
+        ctk.CTkButton(header, text="Run Maintenance Now", command=lambda: self.start_maintenance(), fg_color="gray").pack(side="right", padx=10, pady=5)
+        self.maintenance_frame = ctk.CTkFrame(s5, fg_color="transparent")
+        self.maintenance_frame.pack(fill="x", padx=10, pady=(0, 10))
+        self.render_maintenance()
+
+        s6 = ctk.CTkFrame(content)
+        s6.pack(fill="x", pady=10)
+        ctk.CTkLabel(s6, text="Standby Database (kept current from the change feed; open it on another PC to take over)").pack(anchor="w", padx=10, pady=5)
+        standby_row = ctk.CTkFrame(s6, fg_color="transparent")
+        standby_row.pack(fill="x")
+        self.var_standby_db.set(self.tenant.get("standby_db", ""))
+        ctk.CTkEntry(standby_row, textvariable=self.var_standby_db, placeholder_text="Standby file on another PC or shared folder", width=420).pack(side="left", padx=10, pady=5)
+        ctk.CTkButton(standby_row, text="Browse...", width=90, command=self.choose_standby_db, fg_color="gray").pack(side="left", padx=5)
+        ctk.CTkButton(standby_row, text="Save", width=80, command=self.save_standby_db, fg_color="green").pack(side="left", padx=5)
+        ctk.CTkButton(standby_row, text="Sync Now", width=90, command=self.start_replication).pack(side="left", padx=5)
+        self.replication_frame = ctk.CTkFrame(s6, fg_color="transparent")
+        self.replication_frame.pack(fill="x", padx=10, pady=(0, 10))
+        self.render_replication()
+
+        s7 = ctk.CTkFrame(content)
+        s7.pack(fill="x", pady=10)
+        ctk.CTkLabel(s7, text="Field Web View (read-only customer lookup for collectors' phones on the same Wi-Fi)").pack(anchor="w", padx=10, pady=5)
+        self.web_frame = ctk.CTkFrame(s7, fg_color="transparent")
+        self.web_frame.pack(fill="x", padx=10, pady=(0, 10))
+        self.render_web_view()
+
+    def render_maintenance(self):
+        if self.maintenance_frame is None or not self.maintenance_frame.winfo_exists(): return
+        for widget in self.maintenance_frame.winfo_children():
+            widget.destroy()
+        conn = self.get_db_connection()
+        runs = maintenance.recent_runs(conn)
+        conn.close()
+
+        if self.maintenance_thread and self.maintenance_thread.is_alive():
+            ctk.CTkLabel(self.maintenance_frame, text="Maintenance running in the background...", text_color="orange").pack(anchor="w")
+        if not runs:
+            ctk.CTkLabel(self.maintenance_frame, text="No maintenance runs yet.", text_color="gray").pack(anchor="w")
+        for started_at, duration_ms, size_before, size_after, integrity, notes in runs:
+            delta = (size_after - size_before) / 1024
+            text = f"{started_at}   {duration_ms} ms   {size_after / 1024:,.0f} KB ({delta:+,.0f} KB)   integrity: {integrity}"
+            if notes: text += f"   [{notes}]"
+            ctk.CTkLabel(self.maintenance_frame, text=text, anchor="w", font=("Courier", 12),
+                         text_color=None if integrity == "ok" else "red").pack(fill="x")
+
+        report = self.index_health.get(self.db_file)
+        if report is None: return
+        ctk.CTkLabel(self.maintenance_frame, text="Index health (from captured query plans)", font=("Arial", 13, "bold")).pack(anchor="w", pady=(10, 2))
+        for label, table, rows in report["scans"]:
+            ctk.CTkLabel(self.maintenance_frame, text=f"Missing index? Full scan of {table} ({rows:,} rows): {label[:90]}",
+                         anchor="w", text_color="orange").pack(fill="x")
+        if report["unused"]:
+            ctk.CTkLabel(self.maintenance_frame, text="Not used by any captured query: " + ", ".join(report["unused"]),
+                         anchor="w", text_color="gray", wraplength=900, justify="left").pack(fill="x")
+        if not report["scans"] and not report["unused"]:
+            ctk.CTkLabel(self.maintenance_frame, text="All captured queries use an index.", text_color="green").pack(anchor="w")
+
+    def note_input(self, event=None):
+        self.last_input = time.monotonic()
+
+    def check_idle_maintenance(self):
+        self.after(60000, self.check_idle_maintenance)
+        if self.maintenance_thread and self.maintenance_thread.is_alive(): return
+        if time.monotonic() - self.last_input < maintenance.IDLE_SECONDS: return
+        conn = self.get_db_connection()
+        due = maintenance.maintenance_due(conn)
+        conn.close()
+        if due: self.start_maintenance()
+
+    def start_maintenance(self):
+        if self.maintenance_thread and self.maintenance_thread.is_alive(): return
+        db_file, writes = self.db_file, self.writes
+        captured = maintenance.query_log(db_file).snapshot()
+
+        def run():
+            try:
+                result = maintenance.run_maintenance(db_file)
+                writes.run(lambda c: maintenance.record_run(c, result))
+                conn = sqlite3.connect(db_file)
+                try: self.index_health[db_file] = maintenance.index_report(conn, captured)
+                finally: conn.close()
+            except Exception as e:
+                print(f"Maintenance failed: {e}")
+
+        self.maintenance_thread = threading.Thread(target=run, daemon=True)
+        self.maintenance_thread.start()
+        self.render_maintenance()
+        self.after(1000, self.poll_maintenance)
+
+    def poll_maintenance(self):
+        if self.maintenance_thread and self.maintenance_thread.is_alive():
+            self.after(1000, self.poll_maintenance)
+        else:
+            self.render_maintenance()
+
+    def choose_standby_db(self):
+        filename = filedialog.asksaveasfilename(defaultextension=".db", filetypes=[("SQLite Database", "*.db")])
+        if filename: self.var_standby_db.set(filename)
+
+    def save_standby_db(self):
+        standby = self.var_standby_db.get().strip()
+        if standby and os.path.abspath(standby) == os.path.abspath(self.db_file):
+            messagebox.showerror("Error", "The standby must be a different file from the live database.")
+            return
+        self.tenant["standby_db"] = standby
+        tenants.save_registry(self.router.registry)
+        if standby: self.start_replication()
+        else: self.render_replication()
+
+    def replicate_standby(self):
+        self.after(change_feed.REPLICATE_INTERVAL_MS, self.replicate_standby)
+        self.start_replication()
+
+    def start_replication(self):
+        standby = self.tenant.get("standby_db")
+        if not standby or (self.replica_thread and self.replica_thread.is_alive()): return
+        db_file, writes = self.db_file, self.writes
+        previous = self.replica_status.get(db_file)
+
+        def run():
+            status = change_feed.replicate(db_file, standby)
+            self.replica_status[db_file] = status
+            # Nothing new to report: skip the write, so an idle app stays idle
+            if previous and not (status["applied"] or status["seeded"] or status["error"] or previous["error"]): return
+            def record(conn):
+                change_feed.record_status(conn, status)
+                change_feed.prune_log(conn)
+            try:
+                writes.run(record)
+            except sqlite3.Error as e:
+                print(f"Could not record replication status: {e}")
+
+        self.replica_thread = threading.Thread(target=run, daemon=True)
+        self.replica_thread.start()
+        self.after(1000, self.poll_replication)
+
+    def poll_replication(self):
+        if self.replica_thread and self.replica_thread.is_alive():
+            self.after(1000, self.poll_replication)
+        else:
+            self.render_replication()
+
+    def render_replication(self):
+        if self.replication_frame is None or not self.replication_frame.winfo_exists(): return
+        for widget in self.replication_frame.winfo_children():
+            widget.destroy()
+        status = self.replica_status.get(self.db_file)
+        if not self.tenant.get("standby_db"):
+            ctk.CTkLabel(self.replication_frame, text="No standby configured.", text_color="gray").pack(anchor="w")
+        elif status is None:
+            ctk.CTkLabel(self.replication_frame, text="Waiting for the first sync...", text_color="gray").pack(anchor="w")
+        elif status["error"]:
+            ctk.CTkLabel(self.replication_frame, text=f"Last sync failed at {status['applied_at']}: {status['error']}", text_color="red",
+                         anchor="w", wraplength=900, justify="left").pack(fill="x")
+        else:
+            color = "green" if status["lag_rows"] == 0 else "orange"
+            text = f"In sync up to change #{status['last_seq']} at {status['applied_at']}. Lag: {status['lag_rows']} change(s), {status['lag_seconds']:.0f}s"
+            if status["seeded"]: text += "  (standby seeded from a full copy)"
+            ctk.CTkLabel(self.replication_frame, text=text, text_color=color, anchor="w").pack(fill="x")
+
+    def toggle_web_view(self):
+        if self.web_server is not None:
+            self.web_server.stop()
+            self.web_server = None
+        else:
+            try:
+                self.web_server = web_view.WebViewServer(self.db_file, self.tenant["business_name"]).start()
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not start the web view on port {web_view.DEFAULT_PORT}: {e}")
+        self.render_web_view()
+
+    def render_web_view(self):
+        if self.web_frame is None or not self.web_frame.winfo_exists(): return
+        for widget in self.web_frame.winfo_children():
+            widget.destroy()
+        running = self.web_server is not None
+        ctk.CTkButton(self.web_frame, text="Stop Web View" if running else "Start Web View", width=140, command=self.toggle_web_view,
+                      fg_color="#d9534f" if running else "green").pack(anchor="w", pady=(0, 5))
+        if not running:
+            ctk.CTkLabel(self.web_frame, text="Not running.", text_color="gray").pack(anchor="w")
+            return
+        urls = self.web_server.urls()
+        for url in urls:
+            row = ctk.CTkFrame(self.web_frame, fg_color="transparent")
+            row.pack(fill="x")
+            ctk.CTkLabel(row, text=url, font=("Courier", 12), anchor="w").pack(side="left")
+            ctk.CTkButton(row, text="Open", width=60, command=lambda u=url: webbrowser.open(u)).pack(side="left", padx=10)
+        ctk.CTkButton(self.web_frame, text="Send Link via WhatsApp", width=180, fg_color="#25D366",
+                      command=lambda: webbrowser.open("https://web.whatsapp.com/send?text=" + urllib.parse.quote(urls[0]))).pack(anchor="w", pady=5)
+        ctk.CTkLabel(self.web_frame, text="Anyone with this link can look up customers while the app is open. Stop and start again for a new link.",
+                     text_color="gray").pack(anchor="w")
+
+    def switch_tenant(self, tenant_id):
+        if tenant_id == self.router.active_id: return
+        self.router.activate(tenant_id)
+        tenants.save_registry(self.router.registry)
+        if self.web_server is not None:
+            # Restarted on the new database with a fresh key, so links shared for the previous tenant stop working
+            self.web_server.stop()
+            self.web_server = None
+            self.toggle_web_view()
+        payment_analytics.clear_cache()
+
+        self.init_database()
+        self.check_db_schema()
+        self.auto_import_data()
+        self.writes.run(recovery_calendar.refresh_due_dates)
+        self.writes.run(billing.sync_rentals)  # prices that took effect since the last start
+        self.sync_excel(notify=False)
+
+        self.clear_form()
+        self.area_drill = None
+        self.sidebar.destroy()
+        self.setup_sidebar()
+        self.show_dashboard()
+        self.refresh_snapshot_if_stale()
+        self.refresh_risk_scores()
+
+    def add_tenant(self):
+        try:
+            tenant = tenants.make_tenant(self.var_tenant_id.get(), self.var_tenant_name.get(),
+                                         self.var_tenant_address.get(), self.var_tenant_contact.get())
+            self.router.add(tenant)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        tenants.save_registry(self.router.registry)
+        for v in (self.var_tenant_id, self.var_tenant_name, self.var_tenant_address, self.var_tenant_contact):
+            v.set("")
+        if messagebox.askyesno("Network Added", f"{tenant['business_name']} added.\nDatabase: {tenant['db_file']}\nWorkbook: {tenant['excel_file']}\n\nSwitch to it now?"):
+            self.switch_tenant(tenant["id"])
+
+    # --- EXCEL RECONCILIATION ---
+    def show_excel_reconciliation(self, force=False):
+        if not os.path.exists(self.excel_file):
+            messagebox.showerror("Data doesn't exist", f"{self.excel_file} not found.")
+            return
+        # Queued app-side edits must reach the workbook before it is compared
+        self.sync_excel(notify=False)
+        conn = self.get_db_connection()
+        try:
+            plan = excel_reconcile.plan_reconciliation(conn, self.excel_file, force=force)
+        except Exception as e:
+            messagebox.showerror("Excel Error", f"Could not read workbook: {e}")
+            return
+        finally:
+            conn.close()
+        if plan is None:
+            messagebox.showinfo("Excel Reconciliation", "Workbook unchanged since the last reconciliation.")
+            return
+
+        self.reconcile_plan = plan
+        self.reconcile_choices = {}
+        self.reconcile_bulk_choice = None
+        counts = excel_reconcile.summarize(plan)
+
+        self.clear_content_frame()
+        content = ctk.CTkScrollableFrame(self.content_frame)
+        content.pack(fill="both", expand=True, padx=20, pady=20)
+        ctk.CTkLabel(content, text="Excel Reconciliation", font=("Arial", 22, "bold")).pack(anchor="w", pady=(0, 10))
+
+        row1 = ctk.CTkFrame(content, fg_color="transparent")
+        row1.pack(fill="x", pady=5)
+        self.card(row1, "Excel -> App: New", str(counts["insert_db"]), "#28a745").pack(side="left", fill="x", expand=True, padx=5)
+        self.card(row1, "Excel -> App: Updated", str(counts["update_db"]), "#28a745").pack(side="left", fill="x", expand=True, padx=5)
+        self.card(row1, "Removed in Excel", str(counts["delete_db"]), "#d9534f").pack(side="left", fill="x", expand=True, padx=5)
+        row2 = ctk.CTkFrame(content, fg_color="transparent")
+        row2.pack(fill="x", pady=5)
+        self.card(row2, "App -> Excel: New", str(counts["insert_sheet"]), "#007bff").pack(side="left", fill="x", expand=True, padx=5)
+        self.card(row2, "App -> Excel: Updated", str(counts["update_sheet"]), "#007bff").pack(side="left", fill="x", expand=True, padx=5)
+        self.card(row2, "Removed in App", str(counts["delete_sheet"]), "#d9534f").pack(side="left", fill="x", expand=True, padx=5)
+        self.card(row2, "Conflicts", str(counts["conflict"]), "#f0ad4e").pack(side="left", fill="x", expand=True, padx=5)
+        ctk.CTkLabel(content, text=f"{counts['same']} rows already match.", text_color="gray").pack(anchor="w", pady=5)
+
+        deletes = list(plan["delete_db"].index)
+        if deletes:
+            ctk.CTkLabel(content, text=f"Will be deleted from the App (missing in Excel): {', '.join(deletes[:30])}" + (" ..." if len(deletes) > 30 else ""),
+                         text_color="red", wraplength=900, justify="left").pack(anchor="w", pady=5)
+
+        conflicts = plan["conflict"]
+        if len(conflicts):
+            ctk.CTkLabel(content, text="Conflicts - edited on both sides", font=("Arial", 16, "bold")).pack(anchor="w", pady=(15, 5))
+            bulk = ctk.CTkFrame(content, fg_color="transparent")
+            bulk.pack(fill="x")
+            ctk.CTkButton(bulk, text="All: Keep App", width=120, command=lambda: self.set_all_reconcile_choices("App")).pack(side="left", padx=5)
+            ctk.CTkButton(bulk, text="All: Keep Excel", width=120, command=lambda: self.set_all_reconcile_choices("Excel")).pack(side="left", padx=5)
+            for can, r in conflicts.head(200).iterrows():
+                box = ctk.CTkFrame(content)
+                box.pack(fill="x", pady=3)
+                app_side = "(deleted)" if pd.isna(r["h_db"]) else f"{r['name_db']} | {r['address_db']} | {r['contact_no_db']} | {r['stb_no_db']}"
+                excel_side = "(deleted)" if pd.isna(r["h_sheet"]) else f"{r['name_sheet']} | {r['address_sheet']} | {r['contact_no_sheet']} | {r['stb_no_sheet']}"
+                ctk.CTkLabel(box, text=f"CAN {can}", width=120, font=("Arial", 12, "bold")).pack(side="left", padx=5)
+                texts = ctk.CTkFrame(box, fg_color="transparent")
+                texts.pack(side="left", fill="x", expand=True)
+                ctk.CTkLabel(texts, text=f"App:   {app_side}", anchor="w").pack(fill="x")
+                ctk.CTkLabel(texts, text=f"Excel: {excel_side}", anchor="w").pack(fill="x")
+                choice = StringVar(value="Skip")
+                self.reconcile_choices[can] = choice
+                ctk.CTkSegmentedButton(box, values=["App", "Excel", "Skip"], variable=choice).pack(side="right", padx=10)
+            if len(conflicts) > 200:
+                ctk.CTkLabel(content, text=f"{len(conflicts) - 200} more conflicts follow the 'All' choice.", text_color="gray").pack(anchor="w")
+
+        btns = ctk.CTkFrame(content, fg_color="transparent")
+        btns.pack(fill="x", pady=20)
+        ctk.CTkButton(btns, text="Apply Changes", command=self.apply_excel_reconciliation, fg_color="green").pack(side="right", padx=10)
+        ctk.CTkButton(btns, text="Cancel", command=self.show_dashboard, fg_color="gray").pack(side="right", padx=10)
+
+    def set_all_reconcile_choices(self, side):
+        self.reconcile_bulk_choice = side
+        for choice in self.reconcile_choices.values():
+            choice.set(side)
+
+    def apply_excel_reconciliation(self):
+        plan = self.reconcile_plan
+        side_map = {"App": "db", "Excel": "sheet"}
+        resolutions = {can: side_map[var.get()] for can, var in self.reconcile_choices.items() if var.get() in side_map}
+        bulk = side_map.get(self.reconcile_bulk_choice)
+        if bulk:
+            for can in plan["conflict"].index[200:]:
+                resolutions[can] = bulk
+
+        if len(plan["delete_db"]) and not messagebox.askyesno("Confirm", f"{len(plan['delete_db'])} customer(s) were removed from Excel and will be deleted from the App. Continue?"):
+            return
+        try:
+            result = excel_reconcile.apply_reconciliation(self.writes.run, plan, self.excel_file, resolutions)
+        except PermissionError as e:
+            messagebox.showwarning("File Locked", str(e))
+            return
+        except Exception as e:
+            messagebox.showerror("Reconciliation Failed", str(e))
+            return
+        self.reconcile_plan = None
+        messagebox.showinfo("Reconciled", f"App: {result['db_updates']} updated, {result['db_inserts']} added, {result['db_deletes']} deleted\n"
+                                          f"Excel: {result['sheet_updates']} written, {result['sheet_deletes']} removed\n"
+                                          f"Conflicts left for later: {result['unresolved']}"
+                                          + "".join(f"\nSkipped CAN {can}: {reason}" for can, reason in result["db_skipped"][:10]))
+        self.show_dashboard()
+
     # --- LOGIC & HELPERS ---
     def get_area_list(self):
         conn = self.get_db_connection()
@@ -647,49 +1865,163 @@ class CableManagerApp(ctk.CTk):
         conn.close()
         return areas if areas else ["Unassigned"]
 
+    def selected_area_parent(self):
+        return getattr(self, "area_parents", {}).get(self.var_area_parent.get())
+
+    def find_area(self, name):
+        conn = self.get_db_connection()
+        c = conn.cursor()
+        c.execute("SELECT id FROM areas WHERE area_name=? COLLATE NOCASE", (name,))
+        row = c.fetchone()
+        conn.close()
+        return row[0] if row else None
+
     def add_area(self):
         new_area = self.var_new_area.get().strip().upper()
         if new_area:
-            conn = self.get_db_connection()
+            level = {label: key for key, label in area_hierarchy.LEVEL_LABELS.items()}.get(self.var_area_level.get(), "area")
+            parent_id = self.selected_area_parent()
             try:
-                conn.execute("INSERT INTO areas (area_name) VALUES (?)", (new_area,))
-                conn.commit()
+                self.writes.run(lambda conn: area_hierarchy.create_area(conn, new_area, parent_id, level))
                 messagebox.showinfo("Success", "Area Added")
                 self.var_new_area.set("")
                 self.show_dashboard() 
             except sqlite3.IntegrityError:
                 messagebox.showerror("Error", "Area already exists")
-            conn.close()
+            except (sqlite3.Error, ValueError) as e:
+                messagebox.showerror("Error", str(e))
+
+    def move_area(self):
+        area_id = self.find_area(self.var_new_area.get().strip().upper())
+        if area_id is None:
+            messagebox.showerror("Error", "The area doesn't exist.")
+            return
+        parent_id = self.selected_area_parent()
+        try:
+            self.writes.run(lambda conn: area_hierarchy.move_area(conn, area_id, parent_id))
+        except (sqlite3.Error, ValueError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.var_new_area.set("")
+        self.show_dashboard()
 
     def delete_area(self):
         area = self.var_new_area.get().strip().upper()
         if not area:
             messagebox.showwarning("Warning", "Please enter area name to delete.")
             return
-        conn = self.get_db_connection()
-        c = conn.cursor()
-        c.execute("SELECT 1 FROM areas WHERE area_name=?", (area,))
-        exists = c.fetchone()
-        if not exists:
+        area_id = self.find_area(area)
+        if area_id is None:
             messagebox.showerror("Error", "The area doesn't exist.")
+            return
+        try:
+            self.writes.run(lambda conn: area_hierarchy.delete_area(conn, area_id))
+        except (sqlite3.Error, ValueError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+        messagebox.showinfo("Success", "Area Deleted")
+        self.var_new_area.set("")
+        self.show_dashboard()
+
+    def drill_area(self, area_id):
+        self.area_drill = area_id
+        self.show_dashboard()
+
+    # --- LIVE SEARCH ---
+    @property
+    def searcher(self):
+        # One worker per tenant database, replaced on tenant switch
+        if self.search_worker is None or self.search_worker.db_file != self.db_file:
+            if self.search_worker is not None: self.search_worker.stop()
+            self.search_worker = live_search.SearchWorker(self.db_file)
+        return self.search_worker
+
+    def data_version(self):
+        # Changes whenever another connection (the writer) commits
+        return self.get_db_connection().execute("PRAGMA data_version").fetchone()[0]
+
+    def on_search_key(self, event=None):
+        if event is not None and event.keysym in ("Return", "KP_Enter", "Escape", "Tab", "Up", "Down", "Left", "Right"): return
+        if self.search_after is not None:
+            self.after_cancel(self.search_after)
+            self.search_after = None
+        query = self.search_entry.get().strip()
+        if not query:
+            self.searcher.cancel()
+            self.hide_suggestions()
+            return
+        version = self.data_version()
+        rows = self.searcher.cached(query, version)
+        if rows is not None:
+            # Narrowing a complete result: no query, and nothing older may overwrite it
+            self.searcher.cancel()
+            self.show_suggestions(live_search.top_suggestions(rows))
+        else:
+            self.search_after = self.after(live_search.DEBOUNCE_MS, lambda: self.dispatch_search("suggest", query, version))
+
+    def dispatch_search(self, kind, query, version=None):
+        self.search_after = None
+        self.searcher.submit(kind, query, version)
+        if not self.search_polling:
+            self.search_polling = True
+            self.after(live_search.POLL_MS, self.poll_search)
+
+    def poll_search(self):
+        worker = self.searcher
+        while not worker.results.empty():
+            generation, kind, query, rows = worker.results.get()
+            if generation != worker.latest: continue
+            if kind == "full":
+                self.show_search_results(rows)
+            elif query == self.search_entry.get().strip():
+                self.show_suggestions(live_search.top_suggestions(rows))
+        if worker.pending:
+            self.after(live_search.POLL_MS, self.poll_search)
         else:
-            c.execute("DELETE FROM areas WHERE area_name=?", (area,))
-            conn.commit()
-            messagebox.showinfo("Success", "Area Deleted")
-            self.var_new_area.set("")
-            self.show_dashboard()
+            self.search_polling = False
+
+    def show_suggestions(self, rows):
+        if not rows:
+            self.hide_suggestions()
+            return
+        if self.suggest_frame is None:
+            # Built once and reused; only texts and commands change per keystroke
+            self.suggest_frame = ctk.CTkFrame(self, corner_radius=6, border_width=1)
+            self.suggest_buttons = [
+                ctk.CTkButton(self.suggest_frame, text="", anchor="w", height=30, fg_color="transparent",
+                              text_color=("gray10", "#DCE4EE"), hover_color=("gray75", "gray30"))
+                for _ in range(live_search.DISPLAY_LIMIT)]
+        for btn in self.suggest_buttons: btn.pack_forget()
+        for btn, (cid, name, can, kind, text) in zip(self.suggest_buttons, rows):
+            label = f"{name}  |  CAN: {can}" if kind in ("Name", "CAN") else f"{name}  |  CAN: {can}  |  {kind}: {text}"
+            btn.configure(text=label, command=lambda i=cid: self.open_suggestion(i))
+            btn.pack(fill="x", padx=4, pady=1)
+        self.suggest_frame.place(in_=self.search_entry, x=0, rely=1.0, relwidth=1.0)
+        self.suggest_frame.lift()
+
+    def hide_suggestions(self, event=None):
+        if self.suggest_frame is not None: self.suggest_frame.place_forget()
+
+    def open_suggestion(self, customer_id):
+        self.hide_suggestions()
+        conn = self.get_db_connection()
+        row = conn.execute("SELECT * FROM customers WHERE id = ?", (customer_id,)).fetchone()
         conn.close()
+        if row:
+            self.load_customer(row)
+            self.show_customer_manager()
 
     def perform_search(self, event=None):
         query = self.search_entry.get().strip()
         if not query: return
-        conn = self.get_db_connection()
-        c = conn.cursor()
-        sql = "SELECT * FROM customers WHERE name LIKE ? OR can LIKE ? OR stb_no LIKE ?"
-        param = f"%{query}%"
-        c.execute(sql, (param, param, param))
-        results = c.fetchall()
-        conn.close()
+        if self.search_after is not None:
+            self.after_cancel(self.search_after)
+            self.search_after = None
+        self.hide_suggestions()
+        # Runs on the search worker; poll_search() hands the rows to show_search_results()
+        self.dispatch_search("full", query)
+
+    def show_search_results(self, results):
         if len(results) == 0: messagebox.showinfo("Data doesn't exist", "No customer found.")
         elif len(results) == 1: 
             self.load_customer(results[0])
@@ -736,65 +2068,74 @@ class CableManagerApp(ctk.CTk):
         self.var_connections.set(row[14])
         self.var_status.set(row[15])
         self.var_outstanding.set(row[19] if row[19] else "0")
+        conn = self.get_db_connection()
+        plans = conn.execute("SELECT (SELECT code FROM plans WHERE id = cu.plan_id), (SELECT code FROM plans WHERE id = cu.internet_plan_id) FROM customers cu WHERE cu.id=?",
+                             (row[0],)).fetchone() or (None, None)
+        conn.close()
+        self.var_plan.set(plans[0] or "None")
+        self.var_internet_plan.set(plans[1] or "None")
 
     def save_customer(self):
         if not self.var_name.get(): return
-        conn = self.get_db_connection()
-        c = conn.cursor()
         data = (
             self.var_can.get(), self.var_name.get(), self.var_address.get(), self.var_contact.get(),
             self.var_stb.get(), self.var_stb_type.get(), self.var_recovery.get(), self.var_area.get(), 
             self.var_smartcard.get(), self.var_router.get(), self.var_net_acc.get(), self.var_install_date.get(), 
             self.var_rental.get(), self.var_connections.get(), self.var_status.get(), self.var_outstanding.get()
         )
-        
-        if self.current_customer_id:
-            c.execute("UPDATE customers SET can=?, name=?, address=?, contact_no=?, stb_no=?, stb_type=?, recovery_date=?, area=?, smart_card_no=?, wifi_router_id=?, net_acc_no=?, install_date=?, monthly_rental=?, total_connections=?, status=?, outstanding_amount=? WHERE id=?", data + (self.current_customer_id,))
-            messagebox.showinfo("Success", "Updated")
-        else:
-            # Note: inserts new customers with outstanding default 0
-            c.execute("INSERT INTO customers (can, name, address, contact_no, stb_no, stb_type, recovery_date, area, smart_card_no, wifi_router_id, net_acc_no, install_date, monthly_rental, total_connections, status, outstanding_amount) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", data)
-            messagebox.showinfo("Success", "Created")
-        
-        conn.commit()
-        conn.close()
-        
+        cust_id = self.current_customer_id
+        new_devices = {"stb_no": self.var_stb.get(), "wifi_router_id": self.var_router.get()}
+        plan_codes = (self.var_plan.get(), self.var_internet_plan.get())
         # EXCEL SYNC (Runs for both ADD and UPDATE)
-        self.sync_full_customer_to_excel(self.var_can.get(), self.var_name.get(), self.var_address.get(), self.var_contact.get(), self.var_stb.get(), self.var_recovery.get())
+        sheet_row = {"can": self.var_can.get(), "name": self.var_name.get(), "address": self.var_address.get(),
+                     "contact": self.var_contact.get(), "stb": self.var_stb.get(), "date": self.var_recovery.get()}
+
+        def work(conn):
+            c = conn.cursor()
+            if cust_id:
+                c.execute("SELECT stb_no, wifi_router_id FROM customers WHERE id=?", (cust_id,))
+                old = c.fetchone() or ("", "")
+                inventory_ledger.sync_customer_devices(conn, cust_id, {"stb_no": old[0], "wifi_router_id": old[1]}, new_devices)
+                c.execute("UPDATE customers SET can=?, name=?, address=?, contact_no=?, stb_no=?, stb_type=?, recovery_date=?, area=?, smart_card_no=?, wifi_router_id=?, net_acc_no=?, install_date=?, monthly_rental=?, total_connections=?, status=?, outstanding_amount=? WHERE id=?", data + (cust_id,))
+                saved_id, msg = cust_id, "Updated"
+            else:
+                # Note: inserts new customers with outstanding default 0
+                c.execute("INSERT INTO customers (can, name, address, contact_no, stb_no, stb_type, recovery_date, area, smart_card_no, wifi_router_id, net_acc_no, install_date, monthly_rental, total_connections, status, outstanding_amount) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", data)
+                saved_id, msg = c.lastrowid, "Created"
+                inventory_ledger.sync_customer_devices(conn, saved_id, {}, new_devices)
+            plan_ids = [conn.execute("SELECT id FROM plans WHERE code=?", (code,)).fetchone() for code in plan_codes]
+            billing.assign_plans(conn, saved_id, *[row[0] if row else None for row in plan_ids])
+            # A new or changed recovery date leaves next_due_date empty
+            recovery_calendar.refresh_due_dates(conn, customer_ids=[saved_id])
+            write_queue.log_intent(conn, "customer", sheet_row)
+            return msg
 
-    def sync_full_customer_to_excel(self, can, name, address, contact, stb, date):
         try:
-            if os.path.exists(EXCEL_FILE):
-                # LOCK CHECK
-                try:
-                    with open(EXCEL_FILE, "r+"): pass
-                except IOError:
-                    messagebox.showwarning("File Locked", "Customer saved to Database, but NOT Excel.\nPlease close the Excel file.")
-                    return
-
-                df = pd.read_excel(EXCEL_FILE)
-                df['CAN'] = df['CAN'].astype(str)
-                can_str = str(can)
-                
-                if can_str in df['CAN'].values:
-                    # Update existing
-                    idx = df.index[df['CAN'] == can_str].tolist()[0]
-                    df.at[idx, 'Customer Name'] = name
-                    df.at[idx, 'Address'] = address
-                    df.at[idx, 'Contact'] = contact
-                    df.at[idx, 'STB No'] = stb
-                    df.at[idx, 'Payment Date'] = date
-                else:
-                    # Append New
-                    new_row = {
-                        'CAN': can, 'Customer Name': name, 'Address': address, 
-                        'Contact': contact, 'STB No': stb, 'Payment Date': date, 'Paid': '0'
-                    }
-                    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                
-                df.to_excel(EXCEL_FILE, index=False)
-        except Exception as e:
-            messagebox.showerror("Excel Error", f"Sync failed: {e}")
+            msg = self.writes.run(work)
+        except sqlite3.IntegrityError:
+            # The device registry rejects an STB / smart card / router already held by someone else
+            conn = self.get_db_connection()
+            c = conn.cursor()
+            conflicts = []
+            for device_type, serial in (("STB", self.var_stb.get()), ("SMART_CARD", self.var_smartcard.get()), ("ROUTER", self.var_router.get())):
+                if not serial.strip(): continue
+                for _, holder_id in device_registry.lookup_device(conn, serial, device_type):
+                    if holder_id != cust_id:
+                        c.execute("SELECT name, can FROM customers WHERE id=?", (holder_id,))
+                        holder = c.fetchone()
+                        if holder: conflicts.append(f"{device_type.replace('_', ' ').title()} {serial} is assigned to {holder[0]} (CAN: {holder[1]})")
+            conn.close()
+            messagebox.showerror("Duplicate Device", "\n".join(conflicts) or "Serial number already assigned to another customer.")
+            return
+        except ValueError as e:
+            # The stock ledger refuses a serial that is not available to issue
+            messagebox.showerror("Device Not Available", str(e))
+            return
+        except sqlite3.Error as e:
+            messagebox.showerror("Error", f"Customer not saved: {e}")
+            return
+        messagebox.showinfo("Success", msg)
+        self.sync_excel()
 
     def open_whatsapp_web(self):
         phone = self.var_contact.get().strip()
@@ -803,7 +2144,7 @@ class CableManagerApp(ctk.CTk):
             return
         
         if len(phone) == 10: phone = "91" + phone
-        msg = f"""📢 *{BUSINESS_NAME} - PAYMENT REMINDER*
+        msg = f"""📢 *{self.tenant['business_name']} - PAYMENT REMINDER*
         
 Hello *{self.var_name.get()}*,
 
@@ -822,64 +2163,37 @@ Your Cable/Internet bill has been generated. Please pay before the due date to e
 🔸 Amount: ₹{self.var_rental.get()}
 🔸 Due Date: {self.var_recovery.get()}
 
-💳 *Support:* {SUPPORT_CONTACT}
-Thank you for choosing {BUSINESS_NAME}.
+💳 *Support:* {self.tenant['support_contact']}
+Thank you for choosing {self.tenant['business_name']}.
 """
         encoded_msg = urllib.parse.quote(msg)
         webbrowser.open(f"https://web.whatsapp.com/send?phone={phone}&text={encoded_msg}")
 
-    def generate_receipt_pdf(self):
-        html_content = f"""
-        <html>
-        <head><title>Invoice</title></head>
-        <body style="font-family: Arial, sans-serif; padding: 40px; background: #f9f9f9;">
-            <div style="background: white; padding: 30px; border: 1px solid #ccc; max-width: 800px; margin: auto;">
-                <div style="display: flex; justify-content: space-between;">
-                    <div>
-                        <h1 style="color: #333;">{BUSINESS_NAME}</h1>
-                        <p>{BUSINESS_ADDRESS}<br>Support: {SUPPORT_CONTACT}</p>
-                    </div>
-                    <div style="text-align: right;">
-                        <h3>INVOICE</h3>
-                        <p>Date: {datetime.date.today()}<br>Due: {self.var_recovery.get()}</p>
-                    </div>
-                </div>
-                <hr>
-                <div style="margin-top: 20px;">
-                    <b>BILL TO:</b><br>
-                    {self.var_name.get()} (CAN: {self.var_can.get()})<br>
-                    {self.var_address.get()}<br>
-                    {self.var_contact.get()}
-                </div>
-                <table style="width: 100%; margin-top: 30px; border-collapse: collapse;">
-                    <tr style="background: #eee;">
-                        <th style="text-align: left; padding: 10px;">Description</th>
-                        <th style="text-align: right; padding: 10px;">Amount</th>
-                    </tr>
-                    <tr>
-                        <td style="padding: 10px; border-bottom: 1px solid #ddd;">Monthly Rental ({self.var_status.get()})</td>
-                        <td style="text-align: right; padding: 10px; border-bottom: 1px solid #ddd;">{self.var_rental.get()}</td>
-                    </tr>
-                    <tr>
-                        <td style="padding: 10px;"><b>TOTAL DUE</b></td>
-                        <td style="text-align: right; padding: 10px;"><b>{self.var_rental.get()}</b></td>
-                    </tr>
-                </table>
-                <div style="margin-top: 50px; font-size: 12px; color: #777; text-align: center;">
-                    {self.var_invoice_footer.get()}
-                </div>
-            </div>
-            <script>window.print();</script>
-        </body>
-        </html>
-        """
+    def receipt_fields(self):
+        return {
+            "business_name": self.tenant['business_name'], "business_address": self.tenant['business_address'],
+            "support_contact": self.tenant['support_contact'], "date": datetime.date.today(),
+            "name": self.var_name.get(), "can": self.var_can.get(), "address": self.var_address.get(),
+            "contact": self.var_contact.get(), "footer": self.var_invoice_footer.get(),
+        }
+
+    def open_receipt(self, template, fields):
         try:
-            with open("temp_receipt.html", "w", encoding="utf-8") as f:
-                f.write(html_content)
-            webbrowser.open("file://" + os.path.realpath("temp_receipt.html"))
+            path, _ = receipts.render_to_file(template, fields, os.path.join(receipts.RECEIPT_DIR, self.tenant["id"]))
+            webbrowser.open("file://" + os.path.realpath(path))
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def generate_receipt_pdf(self):
+        fields = self.receipt_fields()
+        fields.update(due=self.var_recovery.get(), status=self.var_status.get(), rental=self.var_rental.get())
+        self.open_receipt("invoice", fields)
+
+    def print_payment_receipt(self, date_paid, amount_paid):
+        fields = self.receipt_fields()
+        fields.update(date_paid=date_paid, amount=amount_paid)
+        self.open_receipt("receipt", fields)
+
     def export_report(self):
         area = self.var_filter_area.get()
         start = self.var_start_date.get().strip()
@@ -909,7 +2223,12 @@ Thank you for choosing {BUSINESS_NAME}.
     def backup_db(self):
         filename = filedialog.asksaveasfilename(defaultextension=".db")
         if filename:
-            shutil.copy(DB_FILE, filename)
+            # Online backup API: includes commits still in the WAL file
+            conn = self.get_db_connection()
+            dest = sqlite3.connect(filename)
+            conn.backup(dest)
+            dest.close()
+            conn.close()
             messagebox.showinfo("Backup", "Database Backed up!")
 
     def card(self, parent, title, val, color):
@@ -936,6 +2255,8 @@ Thank you for choosing {BUSINESS_NAME}.
             v.set("")
         self.var_area.set("Unassigned")
         self.var_status.set("Active")
+        self.var_plan.set("None")
+        self.var_internet_plan.set("None")
 
 if __name__ == "__main__":
     app = CableManagerApp()
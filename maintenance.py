@@ -0,0 +1,235 @@
+import sqlite3
+import datetime
+import re
+import threading
+import time
+from timestamps import timestamp_now
+
+# --- DATABASE MAINTENANCE ---
+# Run in the background while the app is idle:
+#   quick_check        -> catches corruption early
+#   incremental_vacuum -> returns pages freed by deletes (auto_vacuum is switched
+#                         to INCREMENTAL once at startup, see enable_incremental_vacuum)
+#   ANALYZE / optimize -> keeps planner statistics current
+# Each run is recorded in maintenance_runs with its duration and size change.
+#
+# Index health comes from query plans: SELECTs issued by the app are captured
+# through the connection trace callback, and EXPLAIN QUERY PLAN on them shows
+# which indexes are used and which tables are still scanned.
+MAINTENANCE_INTERVAL_HOURS = 24
+IDLE_SECONDS = 120
+BUSY_TIMEOUT_MS = 10000
+SCAN_WARN_ROWS = 1000  # full scans of smaller tables are not worth an index
+MAX_CAPTURED = 300
+
+# Representative queries on the hot paths, checked even before anything is captured
+HOT_QUERIES = [
+    ("Customer search by name", "SELECT id FROM customers WHERE name LIKE 'a%'"),
+    ("Customer by CAN", "SELECT * FROM customers WHERE can = '1001'"),
+    ("Payment history page", "SELECT date_paid, amount_paid, remarks FROM payment_history WHERE customer_id = 1 ORDER BY date_paid DESC, id DESC LIMIT 10"),
+    ("Open complaints", "SELECT id FROM complaints WHERE status = 'Open' ORDER BY logged_at"),
+    ("Device lookup", "SELECT customer_id FROM devices WHERE device_type = 'STB' AND serial_no = 'X'"),
+    ("High-risk customers", "SELECT customer_id FROM customer_risk WHERE band = 'HIGH' ORDER BY score DESC LIMIT 10"),
+]
+
+
+# --- QUERY CAPTURE ---
+_NORMALIZE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class QueryLog:
+    """ Distinct SELECT shapes seen on a database, with one concrete example each """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = {}
+
+    def capture(self, sql):
+        # Trace callback: runs for every statement, so keep it cheap
+        if not sql.lstrip()[:6].upper() == "SELECT" or "sqlite_" in sql: return
+        shape = _NORMALIZE.sub("?", " ".join(sql.split()))
+        with self.lock:
+            entry = self.queries.get(shape)
+            if entry:
+                entry[1] += 1
+            elif len(self.queries) < MAX_CAPTURED:
+                self.queries[shape] = [sql, 1]
+
+    def snapshot(self):
+        with self.lock:
+            return [(shape, sql, count) for shape, (sql, count) in self.queries.items()]
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def query_log(db_file):
+    with _logs_lock:
+        return _logs.setdefault(db_file, QueryLog())
+
+
+# --- RUNS ---
+def init_maintenance(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TIMESTAMP,
+            duration_ms INTEGER,
+            size_before INTEGER,
+            size_after INTEGER,
+            freed_pages INTEGER,
+            integrity TEXT,
+            notes TEXT
+        )
+    ''')
+
+
+def db_size(conn):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return pages * page_size, free
+
+
+def maintenance_due(conn, hours=MAINTENANCE_INTERVAL_HOURS):
+    row = conn.execute("SELECT MAX(started_at) FROM maintenance_runs").fetchone()
+    if not row or not row[0]: return True
+    return datetime.datetime.now() - datetime.datetime.fromisoformat(row[0]) > datetime.timedelta(hours=hours)
+
+
+def enable_incremental_vacuum(db_file):
+    """
+    Switches a database to incremental auto-vacuum. That takes one full VACUUM,
+    which holds the write lock for as long as it runs, so it is done at startup
+    before the tenant's writer opens rather than from the idle job.
+    Returns True when the database was converted.
+    """
+    conn = sqlite3.connect(db_file, isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2: return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+    finally:
+        conn.close()
+
+
+def run_maintenance(db_file):
+    """
+    One maintenance pass on its own connection. Returns the run as a dict for
+    record_run(); nothing is written to maintenance_runs here.
+    """
+    started, t = timestamp_now(), time.perf_counter()
+    notes = []
+    conn = sqlite3.connect(db_file, isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        size_before, free_before = db_size(conn)
+
+        problems = [row[0] for row in conn.execute("PRAGMA quick_check(20)")]
+        integrity = "ok" if problems == ["ok"] else "; ".join(problems)
+
+        if free_before and conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            conn.execute("PRAGMA incremental_vacuum").fetchall()
+
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+            conn.execute("ANALYZE")
+            notes.append("initial ANALYZE")
+        else:
+            conn.execute("PRAGMA analysis_limit = 1000")
+            conn.execute("PRAGMA optimize")
+
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+        size_after, free_after = db_size(conn)
+    finally:
+        conn.close()
+
+    return {"started_at": started, "duration_ms": int((time.perf_counter() - t) * 1000),
+            "size_before": size_before, "size_after": size_after,
+            "freed_pages": max(0, free_before - free_after), "integrity": integrity, "notes": ", ".join(notes)}
+
+
+def record_run(conn, run):
+    """ The caller owns the transaction """
+    conn.execute('''
+        INSERT INTO maintenance_runs (started_at, duration_ms, size_before, size_after, freed_pages, integrity, notes)
+        VALUES (:started_at, :duration_ms, :size_before, :size_after, :freed_pages, :integrity, :notes)
+    ''', run)
+
+
+def recent_runs(conn, limit=5):
+    c = conn.cursor()
+    c.execute("SELECT started_at, duration_ms, size_before, size_after, integrity, notes FROM maintenance_runs ORDER BY id DESC LIMIT ?", (limit,))
+    return c.fetchall()
+
+
+# --- INDEX HEALTH ---
+_PLAN_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+_PLAN_SCAN = re.compile(r"^SCAN (\w+)$")
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_NOT_ALIAS = {"WHERE", "JOIN", "LEFT", "INNER", "CROSS", "ON", "GROUP", "ORDER", "LIMIT", "USING", "UNION", "NATURAL"}
+
+
+def table_aliases(sql):
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in _NOT_ALIAS:
+            aliases[alias] = table
+    return aliases
+
+
+def index_report(conn, captured=()):
+    """
+    Explains the hot queries plus everything captured and returns
+    {"unused": [index names], "scans": [(label, table, rows)]}. Unique indexes
+    are never reported as unused, since they enforce a constraint.
+    """
+    c = conn.cursor()
+    queries = list(HOT_QUERIES) + [(shape, sql) for shape, sql, _ in captured]
+    used, scans = set(), {}
+    row_counts = {}
+    for label, sql in queries:
+        try:
+            plan = c.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+        except sqlite3.Error:
+            continue  # table from another schema version, or a statement we cannot replay
+        # A full scan only matters when the query filters; plain listings read every row anyway
+        filtered = " WHERE " in " ".join(sql.split()).upper()
+        aliases = table_aliases(sql)
+        for *_, detail in plan:
+            used.update(_PLAN_INDEX.findall(detail))
+            match = _PLAN_SCAN.match(detail)
+            if not match or not filtered: continue
+            table = aliases.get(match.group(1), match.group(1))
+            if table not in row_counts:
+                try: row_counts[table] = c.execute(f"SELECT COUNT(*) FROM \"{table}\"").fetchone()[0]
+                except sqlite3.Error: row_counts[table] = 0
+            if row_counts[table] >= SCAN_WARN_ROWS:
+                scans.setdefault((table, label), row_counts[table])
+
+    c.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")
+    unused = [name for name, sql in c.fetchall() if name not in used and not sql.upper().startswith("CREATE UNIQUE")]
+    return {"unused": sorted(unused), "scans": [(label, table, rows) for (table, label), rows in sorted(scans.items())]}
+
+
+if __name__ == "__main__":
+    import sys
+    db_file = sys.argv[1] if len(sys.argv) > 1 else "cable_manager.db"
+    if enable_incremental_vacuum(db_file):
+        print("Switched to incremental auto-vacuum.")
+    run = run_maintenance(db_file)
+    conn = sqlite3.connect(db_file)
+    init_maintenance(conn)
+    with conn:
+        record_run(conn, run)
+    print(f"Maintenance took {run['duration_ms']} ms, size {run['size_before']:,} -> {run['size_after']:,} bytes, integrity: {run['integrity']}")
+    report = index_report(conn)
+    conn.close()
+    for label, table, rows in report["scans"]:
+        print(f"Full scan of {table} ({rows:,} rows): {label}")
+    if report["unused"]:
+        print("Indexes not used by any checked query: " + ", ".join(report["unused"]))
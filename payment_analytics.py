@@ -0,0 +1,100 @@
+import datetime
+
+# --- PAYMENT HISTORY QUERIES ---
+# Relies on idx_payment_history_customer_date (customer_id, date_paid) so the
+# history page, the page count and the cache fingerprint are all index lookups.
+PAGE_SIZE = 10
+
+# due_day is the day of month parsed from recovery_date by recovery_calendar's trigger
+ANALYTICS_SQL = """
+    WITH due AS (
+        SELECT due_day FROM customers WHERE id = :cid
+    ),
+    pays AS (
+        SELECT date(date_paid) AS paid_on,
+               CAST(amount_paid AS REAL) AS amount,
+               CAST(strftime('%Y', date_paid) AS INTEGER) * 12 + CAST(strftime('%m', date_paid) AS INTEGER) AS month_idx
+        FROM payment_history
+        WHERE customer_id = :cid AND date(date_paid) IS NOT NULL
+    ),
+    delays AS (
+        SELECT julianday(p.paid_on) - julianday(date(p.paid_on, 'start of month',
+                   '+' || (min(d.due_day, CAST(strftime('%d', date(p.paid_on, 'start of month', '+1 month', '-1 day')) AS INTEGER)) - 1) || ' days')) AS delay
+        FROM pays p, due d
+        WHERE d.due_day IS NOT NULL
+    ),
+    months AS (
+        SELECT month_idx, month_idx - LAG(month_idx) OVER (ORDER BY month_idx) - 1 AS gap
+        FROM (SELECT DISTINCT month_idx FROM pays)
+    )
+    SELECT
+        (SELECT COUNT(*) FROM pays),
+        (SELECT COALESCE(SUM(amount), 0) FROM pays),
+        (SELECT AVG(amount) FROM pays),
+        (SELECT AVG(delay) FROM delays),
+        (SELECT MAX(delay) FROM delays),
+        (SELECT COALESCE(SUM(gap), 0) FROM months),
+        (SELECT MAX(month_idx) FROM months),
+        (SELECT MIN(paid_on) FROM pays),
+        (SELECT MAX(paid_on) FROM pays)
+"""
+
+_cache = {}
+
+
+def fetch_history_page(conn, customer_id, page=0, page_size=PAGE_SIZE):
+    """ Returns (rows, total_rows) for one page of a customer's payments, newest first """
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*) FROM payment_history WHERE customer_id=?", (customer_id,))
+    total = c.fetchone()[0]
+    c.execute("SELECT date_paid, amount_paid, remarks FROM payment_history WHERE customer_id=? "
+              "ORDER BY date_paid DESC, id DESC LIMIT ? OFFSET ?",
+              (customer_id, page_size, page * page_size))
+    return c.fetchall(), total
+
+
+def history_fingerprint(conn, customer_id):
+    """ Changes with the inputs of the stats: the payments and the customer's due day """
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*), MAX(id), (SELECT due_day FROM customers WHERE id = :cid) FROM payment_history WHERE customer_id = :cid",
+              {"cid": customer_id})
+    return c.fetchone()
+
+
+def customer_analytics(conn, customer_id, today=None):
+    """
+    Average delay against the recovery day, missed months and lifetime value,
+    computed in one SQL statement. Results are cached per customer and reused
+    until the customer's payment history or due day changes.
+    """
+    today = today or datetime.date.today()
+    fingerprint = (history_fingerprint(conn, customer_id), today)
+    cached = _cache.get(customer_id)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+
+    c = conn.cursor()
+    c.execute(ANALYTICS_SQL, {"cid": customer_id})
+    count, lifetime, avg_amount, avg_delay, max_delay, gaps, last_month, first_paid, last_paid = c.fetchone()
+
+    # Months since the last payment (excluding the running month) are missed as well
+    trailing = 0
+    if last_month:
+        trailing = max(0, today.year * 12 + today.month - last_month - 1)
+
+    stats = {
+        "payments": count,
+        "lifetime_value": lifetime or 0,
+        "avg_amount": avg_amount or 0,
+        "avg_delay_days": avg_delay,
+        "max_delay_days": max_delay,
+        "missed_months": (gaps or 0) + trailing,
+        "first_paid": first_paid,
+        "last_paid": last_paid,
+    }
+    _cache[customer_id] = (fingerprint, stats)
+    return stats
+
+
+def clear_cache():
+    _cache.clear()
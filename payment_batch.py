@@ -0,0 +1,187 @@
+import sqlite3
+import datetime
+import math
+import os
+import pandas as pd
+import recovery_calendar
+import write_queue
+
+# --- BATCH FILE FORMAT ---
+# One receipt per row. Header names are matched case-insensitively.
+#   CAN, Amount, Date (YYYY-MM-DD)
+BATCH_COLUMNS = {"can": "CAN", "amount": "Amount", "date": "Date"}
+# Larger than any real receipt; anything above is a typo in the sheet
+MAX_AMOUNT = 100000
+
+
+def clean_can(val):
+    if pd.isna(val) or str(val).strip() == "": return ""
+    try: return str(int(float(val)))
+    except: return str(val).strip()
+
+
+def read_receipts_file(path):
+    """ Loads a collector's CSV/xlsx sheet into a (can, amount, date) DataFrame """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        df = pd.read_csv(path, dtype=str)
+    else:
+        df = pd.read_excel(path, dtype=str)
+
+    headers = {str(col).strip().lower(): col for col in df.columns}
+    missing = [name for key, name in BATCH_COLUMNS.items() if key not in headers]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    return pd.DataFrame({
+        "can": df[headers["can"]].map(clean_can),
+        "amount": df[headers["amount"]],
+        "date": df[headers["date"]],
+    })
+
+
+def build_can_index(conn):
+    """
+    CAN -> customer id, built with a single scan of the customers table. A CAN
+    shared by several customers maps to the first of them, as a per-receipt
+    lookup would.
+    """
+    c = conn.cursor()
+    c.execute("SELECT can, id FROM customers WHERE can IS NOT NULL AND can != '' ORDER BY id")
+    index = {}
+    for can, cust_id in c.fetchall():
+        index.setdefault(str(can).strip(), cust_id)
+    return index
+
+
+def reconcile_receipts(conn, receipts):
+    """
+    Splits a batch of receipts into matched / unmatched / duplicate.
+    `receipts` is an iterable of (can, amount, date) tuples or the DataFrame
+    returned by read_receipts_file. Nothing is written to the database here.
+    """
+    if isinstance(receipts, pd.DataFrame):
+        receipts = receipts[["can", "amount", "date"]].itertuples(index=False, name=None)
+
+    can_index = build_can_index(conn)
+    summary = {"matched": [], "unmatched": [], "duplicate": []}
+    rows = []
+
+    for line_no, (can, amount, date) in enumerate(receipts, start=1):
+        can = clean_can(can)
+        amount = "" if pd.isna(amount) else str(amount).strip()
+        date = "" if pd.isna(date) else str(date).strip()
+        entry = {"line": line_no, "can": can, "amount": amount, "date": date}
+
+        try:
+            amount_val = float(amount)
+            if not math.isfinite(amount_val) or amount_val <= 0 or amount_val > MAX_AMOUNT: raise ValueError
+            entry["amount"] = f"{amount_val:g}"
+        except ValueError:
+            entry["reason"] = "Invalid amount"
+            summary["unmatched"].append(entry)
+            continue
+        try:
+            entry["date"] = pd.to_datetime(date).strftime("%Y-%m-%d")
+        except (ValueError, TypeError):
+            entry["reason"] = "Invalid date"
+            summary["unmatched"].append(entry)
+            continue
+        if can not in can_index:
+            entry["reason"] = "CAN not found"
+            summary["unmatched"].append(entry)
+            continue
+
+        entry["customer_id"] = can_index[can]
+        rows.append(entry)
+
+    if not rows:
+        return summary
+
+    # Receipts already in payment_history, fetched with one range query
+    dates = [r["date"] for r in rows]
+    c = conn.cursor()
+    c.execute("SELECT customer_id, date_paid, amount_paid FROM payment_history WHERE date_paid BETWEEN ? AND ?",
+              (min(dates), max(dates)))
+    seen = set()
+    for cust_id, date_paid, amount_paid in c.fetchall():
+        try: amount_paid = f"{float(amount_paid):g}"
+        except (TypeError, ValueError): pass
+        seen.add((cust_id, date_paid, amount_paid))
+
+    in_batch = set()
+    for entry in rows:
+        key = (entry["customer_id"], entry["date"], entry["amount"])
+        if key in seen:
+            entry["reason"] = "Already recorded"
+            summary["duplicate"].append(entry)
+        elif key in in_batch:
+            entry["reason"] = "Repeated in batch"
+            summary["duplicate"].append(entry)
+        else:
+            in_batch.add(key)
+            summary["matched"].append(entry)
+
+    return summary
+
+
+def commit_receipts(conn, matched, remarks="Batch upload"):
+    """
+    Writes all matched receipts, rolls the customers' due dates forward and
+    queues the Excel update; the caller owns the transaction so the batch
+    commits or rolls back as a whole. Returns the latest payment per CAN.
+    """
+    if not matched: return []
+
+    latest = {}
+    for entry in matched:
+        prev = latest.get(entry["customer_id"])
+        if prev is None or entry["date"] >= prev["date"]:
+            latest[entry["customer_id"]] = entry
+
+    conn.executemany(
+        "INSERT INTO payment_history (customer_id, can, amount_paid, date_paid, remarks) VALUES (?, ?, ?, ?, ?)",
+        [(e["customer_id"], e["can"], e["amount"], e["date"], remarks) for e in matched])
+    conn.executemany(
+        "UPDATE customers SET paid_amount=?, last_payment_date=?, outstanding_amount='0' "
+        "WHERE id=? AND (last_payment_date IS NULL OR last_payment_date = '' OR last_payment_date <= ?)",
+        [(e["amount"], e["date"], cust_id, e["date"]) for cust_id, e in latest.items()])
+    recovery_calendar.roll_forward(conn, [(e["customer_id"], e["amount"], e["date"]) for e in matched])
+
+    payments = [(e["can"], e["amount"], e["date"]) for e in latest.values()]
+    write_queue.log_intent(conn, "payments", {"payments": payments})
+    return payments
+
+
+def write_summary_csv(summary, path):
+    """ Reconciliation sheet handed back to the collector """
+    frames = []
+    for status, entries in summary.items():
+        if entries:
+            df = pd.DataFrame(entries)
+            df.insert(0, "status", status)
+            frames.append(df)
+    if not frames: return None
+    out = pd.concat(frames, ignore_index=True)
+    out = out[[col for col in ["status", "line", "can", "amount", "date", "reason"] if col in out.columns]]
+    out.to_csv(path, index=False)
+    return path
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python payment_batch.py <receipts.csv|xlsx> [cable_manager.db]")
+        sys.exit(1)
+    db_file = sys.argv[2] if len(sys.argv) > 2 else "cable_manager.db"
+    conn = sqlite3.connect(db_file)
+    result = reconcile_receipts(conn, read_receipts_file(sys.argv[1]))
+    conn.close()
+    # Same write path as the app; the queued Excel update goes out when the app next starts
+    writes = write_queue.WriteService(db_file)
+    writes.start()
+    try: writes.run(lambda conn: commit_receipts(conn, result["matched"]))
+    finally: writes.stop()
+    print(f"Matched: {len(result['matched'])}  Unmatched: {len(result['unmatched'])}  Duplicate: {len(result['duplicate'])}")
+    out = write_summary_csv(result, f"reconciliation_{datetime.date.today()}.csv")
+    if out: print(f"Summary written to {out}")
@@ -0,0 +1,239 @@
+import datetime
+import hashlib
+import json
+import os
+import string
+import tempfile
+import time
+
+# --- RECEIPT RENDERING ---
+# Receipts and invoices are drawn straight to PDF with the standard Helvetica
+# fonts, so no browser, print dialog or external service is involved.
+# A layout is compiled once: static text and rules become fixed PDF operators,
+# and only the $fields are filled in per render. Output files are named by a
+# hash of the template and its fields, so a reprint is just a file lookup.
+RECEIPT_DIR = "receipts"
+TEMPLATE_VERSION = 1  # bump when a layout changes, so cached files are not reused
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+
+# Advance widths (1/1000 em) for chars 32..126 of the two fonts we use
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584]
+HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584]
+FONTS = {"F1": ("Helvetica", HELVETICA_WIDTHS), "F2": ("Helvetica-Bold", HELVETICA_BOLD_WIDTHS)}
+
+
+def text_width(text, font, size):
+    widths = FONTS[font][1]
+    return sum(widths[ord(ch) - 32] if 32 <= ord(ch) <= 126 else 556 for ch in text) * size / 1000.0
+
+
+def pdf_text(value):
+    """ A value as a PDF literal string body: WinAnsi bytes with ( ) \\ escaped """
+    value = str(value).replace("₹", "Rs.").replace("\n", " ")
+    value = value.encode("cp1252", "replace").decode("latin-1")
+    return value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+# Layout elements:
+#   ("text", x, y, font, size, "literal or $field", align)   align: left | right | center
+#   ("line", x1, y1, x2, y2)
+#   ("box", x, y, width, height, gray)                       filled rectangle
+LAYOUTS = {
+    "invoice": [
+        ("text", 50, 780, "F2", 20, "$business_name", "left"),
+        ("text", 50, 760, "F1", 10, "$business_address", "left"),
+        ("text", 50, 746, "F1", 10, "Support: $support_contact", "left"),
+        ("text", 545, 780, "F2", 14, "INVOICE", "right"),
+        ("text", 545, 760, "F1", 10, "Date: $date", "right"),
+        ("text", 545, 746, "F1", 10, "Due: $due", "right"),
+        ("line", 50, 730, 545, 730),
+        ("text", 50, 705, "F2", 11, "BILL TO:", "left"),
+        ("text", 50, 689, "F1", 11, "$name (CAN: $can)", "left"),
+        ("text", 50, 675, "F1", 11, "$address", "left"),
+        ("text", 50, 661, "F1", 11, "$contact", "left"),
+        ("box", 50, 612, 495, 22, 0.93),
+        ("text", 60, 619, "F2", 11, "Description", "left"),
+        ("text", 535, 619, "F2", 11, "Amount", "right"),
+        ("text", 60, 590, "F1", 11, "Monthly Rental ($status)", "left"),
+        ("text", 535, 590, "F1", 11, "Rs. $rental", "right"),
+        ("line", 50, 580, 545, 580),
+        ("text", 60, 560, "F2", 11, "TOTAL DUE", "left"),
+        ("text", 535, 560, "F2", 11, "Rs. $rental", "right"),
+        ("text", 297, 500, "F1", 9, "$footer", "center"),
+    ],
+    "receipt": [
+        ("text", 50, 780, "F2", 20, "$business_name", "left"),
+        ("text", 50, 760, "F1", 10, "$business_address", "left"),
+        ("text", 50, 746, "F1", 10, "Support: $support_contact", "left"),
+        ("text", 545, 780, "F2", 14, "PAYMENT RECEIPT", "right"),
+        ("text", 545, 760, "F1", 10, "Date: $date", "right"),
+        ("line", 50, 730, 545, 730),
+        ("text", 50, 705, "F2", 11, "RECEIVED FROM:", "left"),
+        ("text", 50, 689, "F1", 11, "$name (CAN: $can)", "left"),
+        ("text", 50, 675, "F1", 11, "$address", "left"),
+        ("box", 50, 626, 495, 22, 0.93),
+        ("text", 60, 633, "F2", 11, "Paid On", "left"),
+        ("text", 535, 633, "F2", 11, "Amount", "right"),
+        ("text", 60, 604, "F1", 11, "$date_paid", "left"),
+        ("text", 535, 604, "F1", 11, "Rs. $amount", "right"),
+        ("line", 50, 594, 545, 594),
+        ("text", 60, 574, "F2", 11, "TOTAL RECEIVED", "left"),
+        ("text", 535, 574, "F2", 11, "Rs. $amount", "right"),
+        ("text", 297, 520, "F1", 9, "$footer", "center"),
+    ],
+}
+
+
+class CompiledTemplate:
+    """ A layout turned into fixed PDF operators plus the few pieces that depend on fields """
+
+    def __init__(self, name, layout):
+        self.name = name
+        self.parts = []  # str (finished operators) or (Template, font, size, x, y, align)
+        self.fields = set()
+        static = []
+        for element in layout:
+            kind = element[0]
+            if kind == "line":
+                _, x1, y1, x2, y2 = element
+                static.append(f"0.5 w {x1} {y1} m {x2} {y2} l S")
+            elif kind == "box":
+                _, x, y, w, h, gray = element
+                static.append(f"{gray} g {x} {y} {w} {h} re f 0 g")
+            elif kind == "text":
+                _, x, y, font, size, text, align = element
+                tmpl = string.Template(text)
+                names = {m.group("named") or m.group("braced") for m in tmpl.pattern.finditer(text)} - {None}
+                if not names:
+                    static.append(self.text_op(text, font, size, x, y, align))
+                    continue
+                self.fields |= names
+                if static:
+                    self.parts.append("\n".join(static))
+                    static = []
+                self.parts.append((tmpl, font, size, x, y, align))
+            else:
+                raise ValueError(f"Unknown layout element: {kind}")
+        if static:
+            self.parts.append("\n".join(static))
+
+    @staticmethod
+    def text_op(text, font, size, x, y, align):
+        if align != "left":
+            width = text_width(text, font, size)
+            x = x - width if align == "right" else x - width / 2
+        return f"BT /{font} {size} Tf {x:.2f} {y} Td ({pdf_text(text)}) Tj ET"
+
+    def content(self, fields):
+        values = {key: str(fields.get(key, "") or "") for key in self.fields}
+        out = []
+        for part in self.parts:
+            if isinstance(part, str):
+                out.append(part)
+            else:
+                tmpl, font, size, x, y, align = part
+                out.append(self.text_op(tmpl.substitute(values), font, size, x, y, align))
+        return "\n".join(out).encode("latin-1")
+
+    def render(self, fields):
+        return build_pdf(self.content(fields))
+
+
+def build_pdf(content):
+    """ Single-page PDF around a content stream. No timestamps, so equal input gives equal bytes. """
+    fonts = " ".join(f"/{key} {5 + i} 0 R" for i, key in enumerate(FONTS))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+        f"/Resources << /Font << {fonts} >> >> /Contents 4 0 R >>".encode(),
+        b"<< /Length " + str(len(content)).encode() + b" >>\nstream\n" + content + b"\nendstream",
+    ] + [f"<< /Type /Font /Subtype /Type1 /BaseFont /{base} /Encoding /WinAnsiEncoding >>".encode()
+         for base, _ in FONTS.values()]
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+_compiled = {}
+
+
+def get_template(name):
+    template = _compiled.get(name)
+    if template is None:
+        template = _compiled[name] = CompiledTemplate(name, LAYOUTS[name])
+    return template
+
+
+def cache_key(name, fields):
+    template = get_template(name)
+    payload = json.dumps([name, TEMPLATE_VERSION, {k: str(fields.get(k, "") or "") for k in sorted(template.fields)}])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def render_to_file(name, fields, out_dir=RECEIPT_DIR):
+    """
+    Returns (path, cached). The file name is derived from the content, so
+    equal receipts share one file and different receipts never collide.
+    """
+    path = os.path.join(out_dir, f"{name}_{cache_key(name, fields)[:32]}.pdf")
+    if os.path.exists(path):
+        return path, True
+    os.makedirs(out_dir, exist_ok=True)
+    data = get_template(name).render(fields)
+    fd, tmp = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path, False
+
+
+def benchmark(count=10_000, out_dir=None):
+    """ Renders `count` distinct receipts to disk, then reprints them all from the cache """
+    out_dir = out_dir or tempfile.mkdtemp(prefix="receipt_bench_")
+    base = {"business_name": "VAV CABLE NETWORKS", "business_address": "Nagpur, Maharashtra", "support_contact": "9876543210",
+            "address": "Plot 12, Ward 4", "footer": "*Terms & Conditions Apply."}
+    batch = [dict(base, name=f"Customer {i}", can=str(100000 + i), amount=str(300 + i % 500),
+                  date_paid=str(datetime.date(2025, 1, 1) + datetime.timedelta(days=i % 365)), date=str(datetime.date.today()))
+             for i in range(count)]
+
+    t = time.perf_counter()
+    for fields in batch:
+        render_to_file("receipt", fields, out_dir)
+    first = time.perf_counter() - t
+    t = time.perf_counter()
+    hits = sum(render_to_file("receipt", fields, out_dir)[1] for fields in batch)
+    again = time.perf_counter() - t
+    print(f"Rendered {count:,} receipts in {first:.2f}s ({count / first:,.0f}/s)")
+    print(f"Reprinted {hits:,} from cache in {again:.2f}s ({count / again:,.0f}/s)")
+    return first, again
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+    else:
+        path, _ = render_to_file("receipt", {"business_name": "VAV CABLE NETWORKS", "name": "Sample Customer", "can": "1001",
+                                             "amount": "500", "date_paid": str(datetime.date.today()), "date": str(datetime.date.today())})
+        print(f"Sample receipt written to {path}")
@@ -0,0 +1,184 @@
+import sqlite3
+import calendar
+import datetime
+import math
+
+# --- RECOVERY CALENDAR ---
+# recovery_date is free text ("5", "5th", "2025-12-05", "05/12/2025"). A
+# trigger normalizes it to due_day (day of month) whenever it is written, and
+# next_due_date holds the next date a customer owes their rental. Payments
+# roll next_due_date forward by the months they cover, so "due today",
+# "this week" and "overdue" are index range scans on (status, next_due_date)
+# instead of a parse of every row.
+MAX_MONTHS_COVERED = 24  # advance payments beyond two years are treated as a typo
+
+
+def due_day_sql(expr):
+    """ Day of month from a recovery_date expression; NULL when it cannot be read """
+    return f'''(CASE
+        WHEN {expr} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*' THEN CAST(substr({expr}, 9, 2) AS INTEGER)
+        WHEN trim({expr}) GLOB '[0-9]*' AND CAST(trim({expr}) AS INTEGER) BETWEEN 1 AND 31 THEN CAST(trim({expr}) AS INTEGER)
+    END)'''
+
+
+def init_calendar(conn):
+    c = conn.cursor()
+    for col, dtype in (("due_day", "INTEGER"), ("next_due_date", "TEXT")):
+        try: c.execute(f"SELECT {col} FROM customers LIMIT 1")
+        except sqlite3.OperationalError:
+            c.execute(f"ALTER TABLE customers ADD COLUMN {col} {dtype}")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_customers_next_due ON customers(status, next_due_date)")
+    # Covering indexes for the two halves of month_heatmap()
+    c.execute("CREATE INDEX IF NOT EXISTS idx_customers_due_day ON customers(status, due_day, monthly_rental)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_payment_history_date ON payment_history(date_paid, amount_paid)")
+
+    # A changed due day invalidates next_due_date; refresh_due_dates() recomputes it
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_customers_due_day_insert
+        AFTER INSERT ON customers
+        BEGIN
+            UPDATE customers SET due_day = {due_day_sql('NEW.recovery_date')} WHERE id = NEW.id;
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_customers_due_day_update
+        AFTER UPDATE OF recovery_date ON customers
+        WHEN {due_day_sql('NEW.recovery_date')} IS NOT OLD.due_day
+        BEGIN
+            UPDATE customers SET due_day = {due_day_sql('NEW.recovery_date')}, next_due_date = NULL WHERE id = NEW.id;
+        END
+    ''')
+    c.execute(f"UPDATE customers SET due_day = {due_day_sql('recovery_date')} WHERE due_day IS NULL AND recovery_date IS NOT NULL")
+
+
+def due_date(year, month, day):
+    """ `day` of the given month, clamped to the month's length (31 -> 30 Apr, 28/29 Feb) """
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return datetime.date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+def parse_date(value):
+    try: return datetime.date.fromisoformat(str(value or "").strip()[:10])
+    except ValueError: return None
+
+
+def initial_due_date(due_day, last_payment_date, today):
+    """ The month after the last payment, or the first due date from today for customers who never paid """
+    paid = parse_date(last_payment_date)
+    if paid:
+        return due_date(paid.year, paid.month + 1, due_day)
+    due = due_date(today.year, today.month, due_day)
+    return due if due >= today else due_date(today.year, today.month + 1, due_day)
+
+
+def refresh_due_dates(conn, today=None, customer_ids=None):
+    """ Fills next_due_date where it is missing. The caller owns the transaction. """
+    today = today or datetime.date.today()
+    c = conn.cursor()
+    sql = "SELECT id, due_day, last_payment_date FROM customers WHERE due_day IS NOT NULL AND next_due_date IS NULL"
+    if customer_ids is not None:
+        sql += f" AND id IN ({','.join('?' * len(customer_ids))})"
+    c.execute(sql, list(customer_ids or []))
+    rows = [(initial_due_date(day, last_paid, today).isoformat(), cid) for cid, day, last_paid in c.fetchall()]
+    c.executemany("UPDATE customers SET next_due_date = ? WHERE id = ?", rows)
+    return len(rows)
+
+
+def months_covered(amount, rental):
+    """
+    Whole months a payment pays for; anything short of two rentals counts as
+    one. Capped at MAX_MONTHS_COVERED, so a mistyped amount cannot push the
+    due date years ahead (or past datetime's range).
+    """
+    try: amount, rental = float(amount), float(rental)
+    except (TypeError, ValueError): return 1
+    if not (math.isfinite(amount) and math.isfinite(rental)) or rental <= 0: return 1
+    return min(MAX_MONTHS_COVERED, max(1, int(amount // rental)))
+
+
+def roll_forward(conn, payments):
+    """
+    Advances next_due_date for [(customer_id, amount, date_paid)], applied in
+    date order. The caller owns the transaction.
+    """
+    c = conn.cursor()
+    state = {}
+    for cust_id, amount, date_paid in sorted(payments, key=lambda p: str(p[2])):
+        if cust_id not in state:
+            c.execute("SELECT due_day, next_due_date, monthly_rental FROM customers WHERE id = ?", (cust_id,))
+            row = c.fetchone()
+            if not row or row[0] is None: continue
+            state[cust_id] = [row[0], parse_date(row[1]), row[2]]
+        day, due, rental = state[cust_id]
+        paid = parse_date(date_paid)
+        if due is None:
+            if paid is None: continue
+            due = due_date(paid.year, paid.month, day)  # the first payment settles the month it falls in
+        state[cust_id][1] = due_date(due.year, due.month + months_covered(amount, rental), day)
+    c.executemany("UPDATE customers SET next_due_date = ? WHERE id = ?",
+                  [(due.isoformat(), cust_id) for cust_id, (_, due, _) in state.items()])
+
+
+def due_buckets(conn, today=None):
+    """ {"overdue", "today", "week"} counts of active customers; "week" is the six days after today """
+    today = today or datetime.date.today()
+    week_end = today + datetime.timedelta(days=7)
+    c = conn.cursor()
+    c.execute('''
+        SELECT COALESCE(SUM(next_due_date < :today), 0), COALESCE(SUM(next_due_date = :today), 0),
+               COALESCE(SUM(next_due_date > :today), 0)
+        FROM customers WHERE status = 'Active' AND next_due_date < :week_end
+    ''', {"today": today.isoformat(), "week_end": week_end.isoformat()})
+    overdue, due_today, week = c.fetchone()
+    return {"overdue": overdue, "today": due_today, "week": week}
+
+
+def due_customers(conn, start, end, limit=50):
+    """ Active customers with next_due_date in [start, end), earliest first """
+    c = conn.cursor()
+    c.execute('''
+        SELECT id, name, can, contact_no, next_due_date, monthly_rental FROM customers
+        WHERE status = 'Active' AND next_due_date >= ? AND next_due_date < ?
+        ORDER BY next_due_date LIMIT ?
+    ''', (start.isoformat(), end.isoformat(), limit))
+    return c.fetchall()
+
+
+def month_heatmap(conn, year, month):
+    """
+    {day: (expected, collected)} for one month in a single grouped query:
+    rentals of active customers by due day, and payments by the day received.
+    """
+    days = calendar.monthrange(year, month)[1]
+    start = datetime.date(year, month, 1)
+    end = due_date(year, month + 1, 1)
+    c = conn.cursor()
+    c.execute('''
+        SELECT day, SUM(expected), SUM(collected) FROM (
+            SELECT MIN(due_day, :days) AS day, CAST(monthly_rental AS REAL) AS expected, 0 AS collected
+            FROM customers WHERE status = 'Active' AND due_day IS NOT NULL
+            UNION ALL
+            SELECT CAST(substr(date_paid, 9, 2) AS INTEGER), 0, CAST(amount_paid AS REAL)
+            FROM payment_history WHERE date_paid >= :start AND date_paid < :end
+        ) GROUP BY day
+    ''', {"days": days, "start": start.isoformat(), "end": end.isoformat()})
+    heat = {day: (0.0, 0.0) for day in range(1, days + 1)}
+    for day, expected, collected in c.fetchall():
+        if day in heat:
+            heat[day] = (expected or 0.0, collected or 0.0)
+    return heat
+
+
+if __name__ == "__main__":
+    import sys
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else "cable_manager.db")
+    init_calendar(conn)
+    with conn:
+        filled = refresh_due_dates(conn)
+    buckets = due_buckets(conn)
+    print(f"Filled {filled} due date(s). Overdue: {buckets['overdue']}, due today: {buckets['today']}, this week: {buckets['week']}")
+    today = datetime.date.today()
+    for day, (expected, collected) in month_heatmap(conn, today.year, today.month).items():
+        if expected or collected:
+            print(f"{today.year}-{today.month:02d}-{day:02d}  expected {expected:10,.0f}  collected {collected:10,.0f}")
+    conn.close()
@@ -0,0 +1,215 @@
+import sqlite3
+import datetime
+import time
+import numpy as np
+import pandas as pd
+from timestamps import timestamp_now
+
+# --- DEFAULT RISK SCORING ---
+# Scores each customer's chance of defaulting from their payment history.
+# Features are built for all customers at once with pandas/NumPy and fed to a
+# hand-tuned logistic model; the scores live in customer_risk so the payment
+# search and the dashboard can filter on them with an index.
+#
+# A customer is rescored when they have payments newer than their last score.
+# Everyone is rescored once per calendar month, since "months since last
+# payment" moves with the calendar even without new payments.
+HIGH_RISK = 0.6
+MEDIUM_RISK = 0.3
+LATE_AFTER_DAYS = 5
+
+# (feature, weight, cap, reason shown to the collector)
+WEIGHTS = [
+    ("avg_delay", 0.04, 60, "Pays late"),
+    ("months_since_paid", 0.6, 6, "No recent payment"),
+    ("longest_gap", 0.35, 6, "Skips months"),
+    ("late_share", 1.2, 1, "Pays late"),
+    ("partial_share", 1.0, 1, "Partial payments"),
+    ("outstanding_ratio", 0.5, 6, "Outstanding dues"),
+    ("never_paid", 1.0, 1, "Never paid"),
+    ("current_streak", -0.15, 12, None),
+]
+INTERCEPT = -2.0
+
+FEATURE_COLUMNS = ["avg_delay", "months_since_paid", "longest_gap", "current_streak", "late_share", "partial_share"]
+
+
+def init_risk(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS customer_risk (
+            customer_id INTEGER PRIMARY KEY,
+            score REAL NOT NULL,
+            band TEXT NOT NULL,
+            reason TEXT,
+            avg_delay REAL,
+            months_since_paid INTEGER,
+            longest_gap INTEGER,
+            current_streak INTEGER,
+            late_share REAL,
+            partial_share REAL,
+            last_payment_id INTEGER NOT NULL DEFAULT 0,
+            scored_month TEXT,
+            scored_at TIMESTAMP
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customer_risk_band ON customer_risk(band, score DESC)")
+
+
+def stale_customers(conn, month):
+    """ Ids of customers with no score, a score from an earlier month, or newer payments """
+    c = conn.cursor()
+    c.execute('''
+        SELECT cu.id FROM customers cu
+        LEFT JOIN customer_risk r ON r.customer_id = cu.id
+        LEFT JOIN (SELECT customer_id, MAX(id) AS last_id FROM payment_history GROUP BY customer_id) p ON p.customer_id = cu.id
+        WHERE r.customer_id IS NULL OR r.scored_month IS NOT ? OR COALESCE(p.last_id, 0) > r.last_payment_id
+    ''', (month,))
+    return [row[0] for row in c.fetchall()]
+
+
+def load_inputs(conn, customer_ids):
+    c = conn.cursor()
+    c.execute("CREATE TEMP TABLE IF NOT EXISTS risk_queue (customer_id INTEGER PRIMARY KEY)")
+    c.execute("DELETE FROM risk_queue")
+    c.executemany("INSERT OR IGNORE INTO risk_queue VALUES (?)", [(i,) for i in customer_ids])
+    customers = pd.read_sql_query('''
+        SELECT cu.id AS customer_id, cu.due_day, cu.monthly_rental, cu.outstanding_amount
+        FROM customers cu JOIN risk_queue q ON q.customer_id = cu.id
+    ''', conn)
+    payments = pd.read_sql_query('''
+        SELECT p.id, p.customer_id, CAST(p.amount_paid AS REAL) AS amount, p.date_paid
+        FROM payment_history p JOIN risk_queue q ON q.customer_id = p.customer_id
+    ''', conn)
+    c.execute("DELETE FROM risk_queue")
+    conn.commit()
+    return customers, payments
+
+
+def build_features(customers, payments, today):
+    """ One row of features per customer, computed with grouped vector operations """
+    cust = customers.set_index("customer_id")
+    rental = pd.to_numeric(cust["monthly_rental"], errors="coerce").fillna(0.0)
+    outstanding = pd.to_numeric(cust["outstanding_amount"], errors="coerce").fillna(0.0)
+    due_day = pd.to_numeric(cust["due_day"], errors="coerce")
+
+    p = payments.copy()
+    p["paid_on"] = pd.to_datetime(p["date_paid"], format="ISO8601", errors="coerce")
+    p = p.dropna(subset=["paid_on"])
+    p["amount"] = p["amount"].fillna(0.0)
+    p["month"] = p["paid_on"].dt.year * 12 + p["paid_on"].dt.month
+
+    # Delay against the due day of the month paid in (clamped to the month's length)
+    day = np.minimum(p["customer_id"].map(due_day).to_numpy(), p["paid_on"].dt.days_in_month.to_numpy())
+    month_start = p["paid_on"].dt.to_period("M").dt.to_timestamp()
+    p["delay"] = (p["paid_on"] - month_start).dt.days - (day - 1)
+    p["late"] = p["delay"] > LATE_AFTER_DAYS
+    p["rental"] = p["customer_id"].map(rental)
+    p["partial"] = (p["rental"] > 0) & (p["amount"] < p["rental"] - 0.5)
+
+    g = p.groupby("customer_id")
+    feats = pd.DataFrame({
+        "payments": g.size(),
+        "last_payment_id": g["id"].max(),
+        "avg_delay": g["delay"].mean(),
+        "late_share": g["late"].mean(),
+        "partial_share": g["partial"].mean(),
+        "last_month": g["month"].max(),
+    })
+
+    # Gaps and the run of consecutive paid months ending at the latest one
+    m = p[["customer_id", "month"]].drop_duplicates().sort_values(["customer_id", "month"])
+    new_customer = m["customer_id"] != m["customer_id"].shift()
+    step = m["month"].diff()
+    m["gap"] = (step - 1).where(~new_customer, 0).clip(lower=0)
+    m["run"] = (new_customer | (step != 1)).cumsum()
+    run_len = m.groupby("run")["month"].transform("size")
+    last = m.groupby("customer_id").tail(1)
+    feats["longest_gap"] = m.groupby("customer_id")["gap"].max()
+    feats["current_streak"] = pd.Series(run_len.loc[last.index].to_numpy(), index=last["customer_id"].to_numpy())
+
+    feats = feats.reindex(cust.index)
+    this_month = today.year * 12 + today.month
+    feats["months_since_paid"] = (this_month - feats["last_month"] - 1).clip(lower=0)
+    feats.loc[feats["months_since_paid"] > 0, "current_streak"] = 0
+    feats["never_paid"] = feats["payments"].isna().astype(float)
+    feats["outstanding_ratio"] = np.where(rental > 0, outstanding / rental.where(rental > 0, 1), 0.0)
+    fills = {"payments": 0, "last_payment_id": 0, "late_share": 0, "partial_share": 0, "longest_gap": 0, "current_streak": 0, "months_since_paid": 0}
+    return feats.fillna(fills)
+
+
+def score_features(feats):
+    """ Logistic score in [0, 1], band and the strongest contributing reason """
+    contributions = np.column_stack([
+        weight * np.clip(feats[name].fillna(0).to_numpy(dtype=float), 0, cap)
+        for name, weight, cap, _ in WEIGHTS])
+    z = INTERCEPT + contributions.sum(axis=1)
+    score = 1.0 / (1.0 + np.exp(-z))
+
+    reasons = np.array([reason or "" for _, _, _, reason in WEIGHTS], dtype=object)
+    top = contributions.argmax(axis=1)
+    out = feats[FEATURE_COLUMNS + ["last_payment_id"]].copy()
+    out["score"] = score.round(4)
+    out["band"] = np.select([score >= HIGH_RISK, score >= MEDIUM_RISK], ["HIGH", "MEDIUM"], "LOW")
+    out["reason"] = np.where(contributions.max(axis=1) > 0.25, reasons[top], "")
+    return out
+
+
+def compute_scores(conn, today=None, full=False):
+    """ Scores the customers that need it (all of them with full=True). Writes only to the temp schema. """
+    today = today or datetime.date.today()
+    month = today.strftime("%Y-%m")
+    if full:
+        ids = [row[0] for row in conn.execute("SELECT id FROM customers")]
+    else:
+        ids = stale_customers(conn, month)
+    if not ids:
+        return None
+    customers, payments = load_inputs(conn, ids)
+    scores = score_features(build_features(customers, payments, today))
+    scores.attrs["month"] = month
+    return scores
+
+
+def store_scores(conn, scores):
+    """ Upserts a compute_scores() result. The caller owns the transaction. """
+    now = timestamp_now()
+    rows = [(int(cid), float(r.score), r.band, r.reason,
+             None if pd.isna(r.avg_delay) else float(r.avg_delay), int(r.months_since_paid), int(r.longest_gap),
+             int(r.current_streak), float(r.late_share), float(r.partial_share), int(r.last_payment_id),
+             scores.attrs["month"], now)
+            for cid, r in zip(scores.index, scores.itertuples(index=False))]
+    conn.executemany('''
+        INSERT OR REPLACE INTO customer_risk (customer_id, score, band, reason, avg_delay, months_since_paid, longest_gap,
+            current_streak, late_share, partial_share, last_payment_id, scored_month, scored_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.execute("DELETE FROM customer_risk WHERE customer_id NOT IN (SELECT id FROM customers)")
+    return len(rows)
+
+
+def high_risk_customers(conn, limit=10):
+    """ Active customers in the HIGH band, riskiest first, via idx_customer_risk_band """
+    c = conn.cursor()
+    c.execute('''
+        SELECT cu.id, cu.name, cu.can, cu.contact_no, r.score, r.reason
+        FROM customer_risk r JOIN customers cu ON cu.id = r.customer_id
+        WHERE r.band = 'HIGH' AND cu.status = 'Active'
+        ORDER BY r.score DESC LIMIT ?
+    ''', (limit,))
+    return c.fetchall()
+
+
+if __name__ == "__main__":
+    import sys
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else "cable_manager.db")
+    init_risk(conn)
+    started = time.perf_counter()
+    scores = compute_scores(conn, full="--full" in sys.argv)
+    if scores is None:
+        print("All scores are current.")
+    else:
+        with conn:
+            store_scores(conn, scores)
+        print(f"Scored {len(scores)} customer(s) in {time.perf_counter() - started:.2f}s: "
+              f"{(scores['band'] == 'HIGH').sum()} high, {(scores['band'] == 'MEDIUM').sum()} medium risk")
+    conn.close()
@@ -0,0 +1,183 @@
+import sqlite3
+import datetime
+import json
+import os
+import pathlib
+import threading
+import write_queue
+import maintenance
+
+# --- TENANT REGISTRY ---
+# Each franchise network (tenant) has its own database, workbook and branding.
+# The registry lives in tenants.json next to the app:
+#   {"active": "vav", "tenants": [{"id": "vav", "business_name": "...", "db_file": "...", ...}]}
+# standby_db, when set, is a second database file kept current by change_feed.
+TENANTS_FILE = "tenants.json"
+TENANT_FIELDS = ["id", "business_name", "business_address", "support_contact", "db_file", "excel_file", "snapshot_dir", "standby_db"]
+
+# SQLite allows 10 attached databases per connection by default
+MAX_ATTACHED = 10
+
+
+def load_registry(default, path=TENANTS_FILE):
+    """ Reads tenants.json; without one, the app runs as the single `default` tenant """
+    if not os.path.exists(path):
+        return {"active": default["id"], "tenants": [dict(default, standby_db=default.get("standby_db", ""))]}
+    with open(path, encoding="utf-8") as f:
+        registry = json.load(f)
+    for tenant in registry["tenants"]:
+        tenant.setdefault("snapshot_dir", os.path.join("snapshots", tenant["id"]))
+        tenant.setdefault("standby_db", "")
+    if registry.get("active") not in [t["id"] for t in registry["tenants"]]:
+        registry["active"] = registry["tenants"][0]["id"]
+    return registry
+
+
+def save_registry(registry, path=TENANTS_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(registry, f, indent=2)
+    os.replace(tmp, path)
+
+
+def make_tenant(tenant_id, business_name, business_address="", support_contact="", db_file=None, excel_file=None):
+    tenant_id = tenant_id.strip().lower().replace(" ", "_")
+    if not tenant_id:
+        raise ValueError("Tenant id is required")
+    return {
+        "id": tenant_id,
+        "business_name": business_name.strip() or tenant_id.upper(),
+        "business_address": business_address.strip(),
+        "support_contact": support_contact.strip(),
+        "db_file": db_file or f"cable_manager_{tenant_id}.db",
+        "excel_file": excel_file or f"Customer_List_{tenant_id}.xlsx",
+        "snapshot_dir": os.path.join("snapshots", tenant_id),
+        "standby_db": "",
+    }
+
+
+class RoutedConnection(sqlite3.Connection):
+    """ Cached per tenant and thread by TenantRouter. close() only ends the open transaction. """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def release(self):
+        super().close()
+
+
+class TenantRouter:
+    """
+    Routes connections to the active tenant's database and caches one
+    connection per (tenant, thread), so switching tenants at runtime is just
+    a change of the active id. Writes go through one WriteService per tenant.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.local = threading.local()
+        self.writers = {}
+        self.writers_lock = threading.Lock()
+
+    @property
+    def active_id(self):
+        return self.registry["active"]
+
+    def tenant(self, tenant_id=None):
+        tenant_id = tenant_id or self.active_id
+        for tenant in self.registry["tenants"]:
+            if tenant["id"] == tenant_id:
+                return tenant
+        raise KeyError(f"Unknown tenant: {tenant_id}")
+
+    def tenants(self):
+        return list(self.registry["tenants"])
+
+    def activate(self, tenant_id):
+        self.tenant(tenant_id)
+        self.registry["active"] = tenant_id
+
+    def add(self, tenant):
+        if any(t["id"] == tenant["id"] for t in self.registry["tenants"]):
+            raise ValueError(f"Tenant '{tenant['id']}' already exists")
+        self.registry["tenants"].append(tenant)
+
+    def connect(self, tenant_id=None):
+        tenant = self.tenant(tenant_id)
+        cache = getattr(self.local, "connections", None)
+        if cache is None:
+            cache = self.local.connections = {}
+        conn = cache.get(tenant["id"])
+        if conn is None:
+            conn = sqlite3.connect(tenant["db_file"], factory=RoutedConnection)
+            # SELECTs are captured for the index-health report
+            conn.set_trace_callback(maintenance.query_log(tenant["db_file"]).capture)
+            cache[tenant["id"]] = conn
+        return conn
+
+    def writer(self, tenant_id=None):
+        """ The tenant's write service, started on first use """
+        tenant = self.tenant(tenant_id)
+        with self.writers_lock:
+            service = self.writers.get(tenant["id"])
+            if service is None:
+                service = self.writers[tenant["id"]] = write_queue.WriteService(tenant["db_file"])
+                service.start()
+        return service
+
+    def stop_writers(self):
+        """ Drains and stops every tenant's write service """
+        with self.writers_lock:
+            for service in self.writers.values():
+                service.stop()
+            self.writers = {}
+
+    def close_all(self):
+        """ Closes the connections cached for the calling thread """
+        for conn in getattr(self.local, "connections", {}).values():
+            conn.release()
+        self.local.connections = {}
+
+
+# --- CONSOLIDATED REPORT ---
+CONSOLIDATED_COLUMNS = ["Tenant", "Active", "Customers", "Outstanding", "Collected This Month", "Open Complaints"]
+
+
+def tenant_summary_sql(alias):
+    return f"""
+        SELECT ? AS tenant,
+            (SELECT COUNT(*) FROM {alias}.customers WHERE status = 'Active'),
+            (SELECT COUNT(*) FROM {alias}.customers),
+            (SELECT COALESCE(SUM(CAST(outstanding_amount AS REAL)), 0) FROM {alias}.customers),
+            (SELECT COALESCE(SUM(CAST(amount_paid AS REAL)), 0) FROM {alias}.payment_history WHERE date_paid >= ?),
+            (SELECT COUNT(*) FROM {alias}.complaints WHERE status = 'Open')
+    """
+
+
+def consolidated_report(tenant_list, month_start=None):
+    """
+    One row per tenant plus a total row, aggregated inside SQLite by attaching
+    every tenant database read-only to an in-memory connection.
+    """
+    month_start = month_start or datetime.date.today().replace(day=1).isoformat()
+    tenant_list = [t for t in tenant_list if os.path.exists(t["db_file"])]
+    rows = []
+    for start in range(0, len(tenant_list), MAX_ATTACHED):
+        chunk = tenant_list[start:start + MAX_ATTACHED]
+        conn = sqlite3.connect("file::memory:", uri=True)
+        try:
+            parts, params = [], []
+            for i, tenant in enumerate(chunk):
+                uri = pathlib.Path(tenant["db_file"]).resolve().as_uri() + "?mode=ro"
+                conn.execute(f"ATTACH DATABASE ? AS t{i}", (uri,))
+                parts.append(tenant_summary_sql(f"t{i}"))
+                params += [tenant["business_name"], month_start]
+            rows += conn.execute(" UNION ALL ".join(parts), params).fetchall()
+        finally:
+            conn.close()
+
+    if rows:
+        totals = ["ALL NETWORKS"] + [sum(r[i] for r in rows) for i in range(1, len(CONSOLIDATED_COLUMNS))]
+        rows.append(tuple(totals))
+    return rows
@@ -0,0 +1,84 @@
+import sqlite3
+import pytest
+import area_hierarchy
+
+
+def make_db(areas=(), customers=()):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE areas (id INTEGER PRIMARY KEY AUTOINCREMENT, area_name TEXT UNIQUE)")
+    conn.execute('''
+        CREATE TABLE customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, area TEXT, status TEXT DEFAULT 'Active',
+            monthly_rental TEXT, outstanding_amount TEXT
+        )
+    ''')
+    conn.executemany("INSERT INTO areas (area_name) VALUES (?)", [(a,) for a in areas])
+    conn.executemany("INSERT INTO customers (name, area, monthly_rental, outstanding_amount) VALUES (?, ?, ?, ?)", customers)
+    area_hierarchy.init_hierarchy(conn)
+    return conn
+
+
+@pytest.fixture
+def conn():
+    conn = make_db()
+    yield conn
+    conn.close()
+
+
+def area_names(conn):
+    return [row[0] for row in conn.execute("SELECT area_name FROM areas ORDER BY id")]
+
+
+def rollup(conn, name):
+    return conn.execute('''
+        SELECT r.subscribers, r.customers, r.revenue, r.outstanding FROM area_rollups r
+        JOIN areas a ON a.id = r.area_id WHERE a.area_name = ?
+    ''', (name,)).fetchone()
+
+
+def test_migration_reuses_existing_area_of_any_case():
+    conn = make_db(["North Ward"], [("a", "north ward ", "300", "0"), ("b", "NORTH WARD", "200", "50"), ("c", "nan", "100", "0")])
+    assert area_names(conn) == ["North Ward"]
+    assert rollup(conn, "North Ward") == (2, 2, 500.0, 50.0)
+    conn.execute("INSERT INTO customers (name, area, monthly_rental) VALUES ('d', 'NORTH ward', '100')")
+    assert area_names(conn) == ["North Ward"]
+    assert rollup(conn, "North Ward")[1] == 3
+
+
+def test_create_area_refuses_case_variant():
+    conn = make_db(["North Ward"])
+    with pytest.raises(ValueError):
+        area_hierarchy.create_area(conn, "north ward")
+
+
+def test_rollups_follow_customer_changes_up_the_tree(conn):
+    zone = area_hierarchy.create_area(conn, "East", level="zone")
+    ward = area_hierarchy.create_area(conn, "Ward 1", zone, "area")
+    conn.execute("INSERT INTO customers (name, area, monthly_rental, outstanding_amount) VALUES ('a', 'ward 1', '300', '100')")
+    assert rollup(conn, "EAST") == rollup(conn, "WARD 1") == (1, 1, 300.0, 100.0)
+
+    conn.execute("UPDATE customers SET status = 'Inactive', outstanding_amount = '0'")
+    assert rollup(conn, "EAST") == (0, 1, 0.0, 0.0)
+    conn.execute("DELETE FROM customers")
+    assert rollup(conn, "EAST") == (0, 0, 0.0, 0.0)
+    assert area_hierarchy.breadcrumb(conn, ward) == [(zone, "EAST"), (ward, "WARD 1")]
+
+
+def test_move_area_carries_its_totals(conn):
+    east = area_hierarchy.create_area(conn, "East", level="zone")
+    west = area_hierarchy.create_area(conn, "West", level="zone")
+    ward = area_hierarchy.create_area(conn, "Ward 1", east, "area")
+    conn.execute("INSERT INTO customers (name, area, monthly_rental) VALUES ('a', 'WARD 1', '300')")
+    area_hierarchy.move_area(conn, ward, west)
+    assert rollup(conn, "EAST")[1] == 0 and rollup(conn, "WEST")[1] == 1
+    with pytest.raises(ValueError):
+        area_hierarchy.move_area(conn, east, ward)
+
+
+def test_startup_does_not_rebuild(conn):
+    area_hierarchy.create_area(conn, "East", level="zone")
+    conn.execute("UPDATE area_rollups SET customers = 7")
+    area_hierarchy.init_hierarchy(conn)
+    assert rollup(conn, "EAST")[1] == 7
+    area_hierarchy.rebuild(conn)
+    assert rollup(conn, "EAST")[1] == 0
@@ -0,0 +1,118 @@
+import sqlite3
+import datetime
+import pytest
+import billing
+
+AS_OF = datetime.date(2026, 10, 1)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute('''
+        CREATE TABLE customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, stb_type TEXT, total_connections TEXT,
+            net_acc_no TEXT, monthly_rental TEXT, status TEXT DEFAULT 'Active'
+        )
+    ''')
+    billing.init_billing(conn)
+    yield conn
+    conn.close()
+
+
+def add_customer(conn, name, rental, net_acc_no="", stb_type="SD", connections="1"):
+    return conn.execute("INSERT INTO customers (name, stb_type, total_connections, net_acc_no, monthly_rental) VALUES (?, ?, ?, ?, ?)",
+                        (name, stb_type, connections, net_acc_no, rental)).lastrowid
+
+
+@pytest.fixture
+def plans(conn):
+    tv = billing.save_price(conn, "basic", "Basic", "tv", 250, 50, 100, "2026-01-01")
+    net = billing.save_price(conn, "net50", "50 Mbps", "internet", 500, 0, 0, "2026-01-01")
+    return tv, net
+
+
+def rental(conn, cust_id):
+    return conn.execute("SELECT monthly_rental FROM customers WHERE id = ?", (cust_id,)).fetchone()[0]
+
+
+def bill(conn, cust_id, month="2026-10"):
+    return conn.execute("SELECT tv_amount, internet_amount, amount FROM bills WHERE customer_id = ? AND bill_month = ?",
+                        (cust_id, month)).fetchone()
+
+
+def test_no_plan_is_billed_typed_rental(conn, plans):
+    cust = add_customer(conn, "none", "300")
+    billing.sync_rentals(conn, AS_OF)
+    billing.run_bills(conn, "2026-10")
+    assert rental(conn, cust) == "300"
+    assert bill(conn, cust) == (300.0, 0.0, 300.0)
+
+
+def test_tv_only_rental_follows_pack_price(conn, plans):
+    tv, _ = plans
+    cust = add_customer(conn, "tv", "300", stb_type="HD", connections="2")
+    billing.assign_plans(conn, cust, tv, None)
+    billing.run_bills(conn, "2026-10")
+    assert rental(conn, cust) == "400"
+    assert bill(conn, cust) == (400.0, 0.0, 400.0)
+
+
+def test_internet_only_keeps_typed_tv_rental(conn, plans):
+    _, net = plans
+    cust = add_customer(conn, "net", "300", net_acc_no="NET-1")
+    billing.assign_plans(conn, cust, None, net)
+    billing.run_bills(conn, "2026-10")
+    assert rental(conn, cust) == "300"
+    assert bill(conn, cust) == (300.0, 500.0, 800.0)
+
+
+def test_internet_only_without_account_is_not_zeroed(conn, plans):
+    _, net = plans
+    cust = add_customer(conn, "net", "300", net_acc_no="nan")
+    billing.assign_plans(conn, cust, None, net)
+    assert billing.sync_rentals(conn, AS_OF) == 0
+    billing.run_bills(conn, "2026-10")
+    assert rental(conn, cust) == "300"
+    assert bill(conn, cust) == (300.0, 0.0, 300.0)
+
+
+def test_both_plans_bill_separately(conn, plans):
+    tv, net = plans
+    cust = add_customer(conn, "both", "999", net_acc_no="NET-2")
+    billing.assign_plans(conn, cust, tv, net)
+    billing.run_bills(conn, "2026-10")
+    assert rental(conn, cust) == "250"
+    assert bill(conn, cust) == (250.0, 500.0, 750.0)
+
+
+def test_future_price_applies_from_its_month(conn, plans):
+    tv, _ = plans
+    cust = add_customer(conn, "tv", "250")
+    billing.assign_plans(conn, cust, tv, None)
+    billing.save_price(conn, "basic", "", "tv", 300, 50, 100, "2026-11-01")
+    billing.run_bills(conn, "2026-10")
+    billing.run_bills(conn, "2026-11")
+    assert bill(conn, cust, "2026-10")[2] == 250.0
+    assert bill(conn, cust, "2026-11")[2] == 300.0
+
+
+def test_preview_matches_bill_delta(conn, plans):
+    tv, _ = plans
+    for i in range(3):
+        billing.assign_plans(conn, add_customer(conn, f"c{i}", "250"), tv, None)
+    add_customer(conn, "other", "300")
+    preview = billing.preview_price_change(conn, tv, 275, 50, 100, AS_OF)
+    assert preview["customers"] == 3
+    assert preview["proposed"] - preview["current"] == 75
+    assert preview["base_current"] == 1050
+
+
+def test_adopt_plan_matches_rental_regardless_of_internet(conn, plans):
+    tv, net = plans
+    match = add_customer(conn, "match", "250", net_acc_no="NET-3")
+    billing.assign_plans(conn, match, None, net)
+    other = add_customer(conn, "other", "260")
+    assert billing.adopt_plan(conn, tv, AS_OF) == 1
+    assert conn.execute("SELECT plan_id FROM customers WHERE id = ?", (match,)).fetchone()[0] == tv
+    assert conn.execute("SELECT plan_id FROM customers WHERE id = ?", (other,)).fetchone()[0] is None
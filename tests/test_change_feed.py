@@ -0,0 +1,111 @@
+import sqlite3
+import pytest
+import change_feed
+
+
+@pytest.fixture
+def primary(tmp_path):
+    path = str(tmp_path / "primary.db")
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, paid_amount TEXT)")
+    conn.execute("CREATE TABLE payment_history (id INTEGER PRIMARY KEY, customer_id INTEGER, amount_paid TEXT)")
+    change_feed.init_change_feed(conn)
+    conn.close()
+    return path
+
+
+def write(path, *statements):
+    conn = sqlite3.connect(path)
+    with conn:
+        for sql in statements:
+            conn.execute(sql)
+    conn.close()
+
+
+def table(path, name):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(f"SELECT * FROM {name} ORDER BY id").fetchall()
+    conn.close()
+    return rows
+
+
+def checkpoint(path):
+    conn = sqlite3.connect(path)
+    last_seq = change_feed.standby_checkpoint(conn)
+    conn.close()
+    return last_seq
+
+
+def test_seeds_then_replays_inserts_updates_and_deletes(primary, tmp_path):
+    standby = str(tmp_path / "standby.db")
+    write(primary, "INSERT INTO customers VALUES (1, 'A', '0')")
+    status = change_feed.replicate(primary, standby)
+    assert status["seeded"] and status["error"] is None and status["applied"] == 0
+
+    write(primary, "INSERT INTO customers VALUES (2, 'B', '0')",
+          "UPDATE customers SET paid_amount = '300' WHERE id = 1",
+          "INSERT INTO payment_history VALUES (1, 1, '300')",
+          "DELETE FROM customers WHERE id = 2")
+    status = change_feed.replicate(primary, standby)
+    assert not status["seeded"] and status["applied"] == 4 and status["lag_rows"] == 0
+    assert table(standby, "customers") == table(primary, "customers") == [(1, "A", "300")]
+    assert table(standby, "payment_history") == [(1, 1, "300")]
+
+
+def test_checkpoint_advances_with_each_batch(primary, tmp_path):
+    standby = str(tmp_path / "standby.db")
+    change_feed.replicate(primary, standby)
+    write(primary, *[f"INSERT INTO customers VALUES ({i}, 'C{i}', '0')" for i in range(1, 6)])
+
+    status = change_feed.replicate(primary, standby, batch_size=2, max_batches=1)
+    assert status["applied"] == 2 and status["lag_rows"] == 3
+    assert checkpoint(standby) == status["last_seq"] == 2
+    assert [row[0] for row in table(standby, "customers")] == [1, 2]
+
+    status = change_feed.replicate(primary, standby, batch_size=2)
+    assert status["applied"] == 3 and status["lag_rows"] == 0 and checkpoint(standby) == 5
+    assert table(standby, "customers") == table(primary, "customers")
+
+
+def test_failed_batch_rolls_back_with_its_checkpoint(primary, tmp_path):
+    standby = str(tmp_path / "standby.db")
+    change_feed.replicate(primary, standby)
+    write(primary, "INSERT INTO customers VALUES (1, 'A', '0')", "INSERT INTO customers VALUES (2, 'B', '0')",
+          "INSERT INTO customers VALUES (3, 'C', '0')", "INSERT INTO payment_history VALUES (1, 3, '300')")
+    # The standby refuses the last change of the second batch
+    write(standby, "CREATE TRIGGER refuse BEFORE INSERT ON payment_history BEGIN SELECT RAISE(ABORT, 'refused'); END")
+
+    status = change_feed.replicate(primary, standby, batch_size=2)
+    assert status["error"] == "refused" and status["applied"] == 2
+    assert checkpoint(standby) == status["last_seq"] == 2 and status["lag_rows"] == 2
+    assert [row[0] for row in table(standby, "customers")] == [1, 2]
+
+    write(standby, "DROP TRIGGER refuse")
+    status = change_feed.replicate(primary, standby, batch_size=2)
+    assert status["error"] is None and checkpoint(standby) == 4
+    assert table(standby, "customers") == table(primary, "customers")
+    assert table(standby, "payment_history") == [(1, 3, "300")]
+
+
+def test_reseeds_when_the_log_was_pruned_past_the_checkpoint(primary, tmp_path):
+    standby = str(tmp_path / "standby.db")
+    write(primary, "INSERT INTO customers VALUES (1, 'A', '0')")
+    change_feed.replicate(primary, standby)
+    write(primary, "INSERT INTO customers VALUES (2, 'B', '0')", "UPDATE customers SET name = 'AA' WHERE id = 1",
+          "INSERT INTO customers VALUES (3, 'C', '0')")
+    # Changes the standby never saw are pruned
+    write(primary, "DELETE FROM change_log WHERE seq <= 3")
+
+    status = change_feed.replicate(primary, standby)
+    assert status["seeded"] and status["error"] is None and status["lag_rows"] == 0
+    assert checkpoint(standby) == status["last_seq"] == 4
+    assert table(standby, "customers") == [(1, "AA", "0"), (2, "B", "0"), (3, "C", "0")]
+
+
+def test_refuses_a_file_that_is_not_a_standby(primary, tmp_path):
+    other = str(tmp_path / "other.db")
+    write(other, "CREATE TABLE notes (id INTEGER PRIMARY KEY)")
+    status = change_feed.replicate(primary, other)
+    assert "not a standby" in status["error"] and not status["seeded"]
+    assert table(other, "notes") == []
+    assert change_feed.replicate(primary, primary)["error"]
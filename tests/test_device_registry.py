@@ -0,0 +1,37 @@
+import sqlite3
+import pytest
+import device_registry
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, can TEXT, stb_no TEXT, smart_card_no TEXT, wifi_router_id TEXT)")
+    # Two customers already share an STB before the registry exists
+    conn.executemany("INSERT INTO customers (name, stb_no, smart_card_no, wifi_router_id) VALUES (?, ?, ?, ?)",
+                     [("A", "STB-1", "SC-1", ""), ("B", "stb-1", "SC-2", "nan")])
+    device_registry.init_registry(conn)
+    yield conn
+    conn.close()
+
+
+def devices(conn, customer_id):
+    return conn.execute("SELECT device_type, serial_no FROM devices WHERE customer_id = ? ORDER BY device_type", (customer_id,)).fetchall()
+
+
+def test_backfill_keeps_first_holder(conn):
+    assert devices(conn, 1) == [("SMART_CARD", "SC-1"), ("STB", "STB-1")]
+    assert devices(conn, 2) == [("SMART_CARD", "SC-2")]
+    assert len(device_registry.find_duplicate_serials(conn)) == 1
+
+
+def test_legacy_duplicate_customer_can_be_edited(conn):
+    conn.execute("UPDATE customers SET name = 'B2', smart_card_no = 'SC-3', wifi_router_id = 'R-1' WHERE id = 2")
+    assert devices(conn, 2) == [("ROUTER", "R-1"), ("SMART_CARD", "SC-3")]
+
+
+def test_new_duplicate_is_rejected(conn):
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("UPDATE customers SET smart_card_no = 'sc-1' WHERE id = 2")
+    conn.execute("UPDATE customers SET stb_no = 'STB-2' WHERE id = 2")
+    assert devices(conn, 2) == [("SMART_CARD", "SC-2"), ("STB", "STB-2")]
@@ -0,0 +1,103 @@
+import sqlite3
+import pandas as pd
+import pytest
+import excel_reconcile
+import inventory_ledger
+
+STB = inventory_ledger.CUSTOMER_DEVICE_ITEMS["stb_no"]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute('''
+        CREATE TABLE customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, can TEXT, name TEXT, address TEXT, contact_no TEXT,
+            stb_no TEXT, wifi_router_id TEXT, status TEXT, stb_type TEXT, outstanding_amount TEXT
+        )
+    ''')
+    conn.execute("CREATE TABLE inventory (id INTEGER PRIMARY KEY AUTOINCREMENT, item_name TEXT UNIQUE, quantity INTEGER)")
+    inventory_ledger.init_ledger(conn)
+    yield conn
+    conn.close()
+
+
+def run_on(conn):
+    def run(work):
+        with conn:
+            return work(conn)
+    return run
+
+
+def write_sheet(path, rows):
+    pd.DataFrame(rows, columns=["CAN", "Customer Name", "Address", "Contact", "STB No", "Paid"]).to_excel(path, index=False)
+
+
+def agreed(conn):
+    return dict(conn.execute("SELECT can, row_hash FROM excel_sync_state").fetchall())
+
+
+def test_sheet_edit_updates_legacy_float_can(conn, tmp_path):
+    book = tmp_path / "customers.xlsx"
+    conn.execute("INSERT INTO customers (can, name, address, contact_no, stb_no) VALUES ('1001.0', 'Old', 'Main St', '', 'S1')")
+    write_sheet(book, [[1001, "New", "Main St", "", "S1", "0"]])
+
+    plan = excel_reconcile.plan_reconciliation(conn, book, force=True)
+    result = excel_reconcile.apply_reconciliation(run_on(conn), plan, book, {"1001": "sheet"})
+
+    assert result["db_updates"] == 1 and result["db_inserts"] == 0
+    assert conn.execute("SELECT can, name FROM customers").fetchall() == [("1001.0", "New")]
+    assert excel_reconcile.plan_reconciliation(conn, book, force=True)["same"].index.tolist() == ["1001"]
+
+
+def test_delete_counts_only_rows_removed(conn, tmp_path):
+    book = tmp_path / "customers.xlsx"
+    conn.execute("INSERT INTO customers (can, name, address, contact_no, stb_no) VALUES ('1001', 'A', '', '', '')")
+    write_sheet(book, [[1001, "A", "", "", "", "0"]])
+    excel_reconcile.apply_reconciliation(run_on(conn), excel_reconcile.plan_reconciliation(conn, book, force=True), book)
+    assert list(agreed(conn)) == ["1001"]
+
+    write_sheet(book, [])
+    plan = excel_reconcile.plan_reconciliation(conn, book, force=True)
+    assert plan["delete_db"].index.tolist() == ["1001"]
+    conn.execute("DELETE FROM customers")
+    result = excel_reconcile.apply_reconciliation(run_on(conn), plan, book)
+    assert result["db_deletes"] == 0
+
+
+def holder(conn, serial):
+    return conn.execute("SELECT status, customer_id FROM inventory_serials WHERE serial_no = ?", (serial,)).fetchone()
+
+
+def agreed_start(conn, book, rows):
+    """ Customers 1001 (S1) and 1002 (S2) installed through the ledger and agreed with the sheet """
+    inventory_ledger.receive_serials(conn, STB, ["S1", "S2", "S3"])
+    for can, serial in (("1001", "S1"), ("1002", "S2")):
+        cust_id = conn.execute("INSERT INTO customers (can, name, address, contact_no, stb_no) VALUES (?, 'A', '', '', ?)", (can, serial)).lastrowid
+        inventory_ledger.sync_customer_devices(conn, cust_id, {}, {"stb_no": serial})
+    write_sheet(book, [[1001, "A", "", "", "S1", "0"], [1002, "A", "", "", "S2", "0"]])
+    excel_reconcile.apply_reconciliation(run_on(conn), excel_reconcile.plan_reconciliation(conn, book, force=True), book)
+    write_sheet(book, rows)
+    return excel_reconcile.plan_reconciliation(conn, book, force=True)
+
+
+def test_sheet_changes_move_stock(conn, tmp_path):
+    book = tmp_path / "customers.xlsx"
+    plan = agreed_start(conn, book, [[1001, "A", "", "", "S3", "0"], [1003, "New", "", "", "S4", "0"]])
+    result = excel_reconcile.apply_reconciliation(run_on(conn), plan, book)
+
+    assert (result["db_updates"], result["db_inserts"], result["db_deletes"], result["db_skipped"]) == (1, 1, 1, [])
+    new_id = conn.execute("SELECT id FROM customers WHERE can = '1003'").fetchone()[0]
+    assert holder(conn, "S1") == ("IN_STOCK", None) and holder(conn, "S3") == ("ISSUED", 1)
+    assert holder(conn, "S2") == ("IN_STOCK", None) and holder(conn, "S4") == ("ISSUED", new_id)
+
+
+def test_row_whose_serial_is_taken_is_skipped(conn, tmp_path):
+    book = tmp_path / "customers.xlsx"
+    plan = agreed_start(conn, book, [[1001, "Renamed", "", "", "S2", "0"], [1002, "B", "", "", "S2", "0"]])
+    result = excel_reconcile.apply_reconciliation(run_on(conn), plan, book)
+
+    assert result["db_updates"] == 1 and [can for can, _ in result["db_skipped"]] == ["1001"]
+    assert conn.execute("SELECT name, stb_no FROM customers WHERE id = 1").fetchone() == ("A", "S1")
+    assert holder(conn, "S1") == ("ISSUED", 1)
+    assert excel_reconcile.plan_reconciliation(conn, book, force=True)["update_db"].index.tolist() == ["1001"]
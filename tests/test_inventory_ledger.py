@@ -0,0 +1,68 @@
+import sqlite3
+import pytest
+import inventory_ledger
+
+STB = "Set Top Box"
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE inventory (id INTEGER PRIMARY KEY AUTOINCREMENT, item_name TEXT UNIQUE, quantity INTEGER)")
+    conn.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, can TEXT)")
+    inventory_ledger.init_ledger(conn)
+    conn.executemany("INSERT INTO customers (name) VALUES (?)", [("A",), ("B",)])
+    inventory_ledger.receive_serials(conn, STB, ["S1", "S2"])
+    yield conn
+    conn.close()
+
+
+def stock(conn):
+    return conn.execute("SELECT quantity FROM inventory WHERE item_name = ?", (STB,)).fetchone()[0]
+
+
+def holder(conn, serial):
+    return conn.execute("SELECT status, customer_id FROM inventory_serials WHERE serial_no = ?", (serial,)).fetchone()
+
+
+def test_issue_and_swap(conn):
+    inventory_ledger.sync_customer_devices(conn, 1, {}, {"stb_no": "S1"})
+    assert holder(conn, "S1") == ("ISSUED", 1) and stock(conn) == 1
+    inventory_ledger.sync_customer_devices(conn, 1, {"stb_no": "S1"}, {"stb_no": "S2"})
+    assert holder(conn, "S1") == ("IN_STOCK", None) and holder(conn, "S2") == ("ISSUED", 1) and stock(conn) == 1
+
+
+def test_serial_issued_elsewhere_is_refused(conn):
+    inventory_ledger.sync_customer_devices(conn, 2, {}, {"stb_no": "S1"})
+    with pytest.raises(ValueError):
+        inventory_ledger.sync_customer_devices(conn, 1, {}, {"stb_no": "S1"})
+    assert stock(conn) == 1
+
+
+def test_install_from_opening_balance_stock():
+    # An upgraded database: 50 STBs counted in inventory, no serials known to the ledger
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE inventory (id INTEGER PRIMARY KEY AUTOINCREMENT, item_name TEXT UNIQUE, quantity INTEGER)")
+    conn.execute("INSERT INTO inventory (item_name, quantity) VALUES (?, 50)", (STB,))
+    inventory_ledger.init_ledger(conn)
+    assert stock(conn) == 50
+
+    inventory_ledger.sync_customer_devices(conn, 1, {}, {"stb_no": "ABC123"})
+    assert stock(conn) == 49 and holder(conn, "ABC123") == ("ISSUED", 1)
+    # Tracked from then on
+    with pytest.raises(ValueError):
+        inventory_ledger.sync_customer_devices(conn, 2, {}, {"stb_no": "ABC123"})
+    inventory_ledger.sync_customer_devices(conn, 1, {"stb_no": "ABC123"}, {})
+    assert stock(conn) == 50 and holder(conn, "ABC123") == ("IN_STOCK", None)
+
+
+def test_serial_taken_out_is_refused(conn):
+    inventory_ledger.record_movement(conn, STB, "OUT", serial_no="S1", remarks="Faulty")
+    with pytest.raises(ValueError):
+        inventory_ledger.sync_customer_devices(conn, 1, {}, {"stb_no": "S1"})
+
+
+def test_placeholders_and_legacy_serials_are_not_returned(conn):
+    inventory_ledger.sync_customer_devices(conn, 1, {"stb_no": "nan", "wifi_router_id": "LEGACY-7"}, {"stb_no": "None", "wifi_router_id": ""})
+    assert conn.execute("SELECT COUNT(*) FROM inventory_movements WHERE movement = 'RETURNED'").fetchone()[0] == 0
+    assert stock(conn) == 2
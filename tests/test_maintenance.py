@@ -0,0 +1,43 @@
+import sqlite3
+import maintenance
+
+
+def make_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?)", [("x" * 500,) for _ in range(200)])
+    conn.commit()
+    conn.execute("DELETE FROM t")
+    conn.commit()
+    conn.close()
+
+
+def auto_vacuum(path):
+    conn = sqlite3.connect(path)
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    conn.close()
+    return mode
+
+
+def test_idle_run_leaves_auto_vacuum_alone(tmp_path):
+    db = str(tmp_path / "a.db")
+    make_db(db)
+    run = maintenance.run_maintenance(db)
+    assert auto_vacuum(db) == 0 and "auto-vacuum" not in run["notes"]
+
+
+def test_startup_conversion_runs_once_then_runs_reclaim(tmp_path):
+    db = str(tmp_path / "a.db")
+    make_db(db)
+    assert maintenance.enable_incremental_vacuum(db)
+    assert not maintenance.enable_incremental_vacuum(db)
+    assert auto_vacuum(db) == 2
+
+    conn = sqlite3.connect(db)
+    conn.executemany("INSERT INTO t VALUES (?)", [("x" * 500,) for _ in range(200)])
+    conn.commit()
+    conn.execute("DELETE FROM t")
+    conn.commit()
+    conn.close()
+    run = maintenance.run_maintenance(db)
+    assert run["freed_pages"] > 0
@@ -0,0 +1,36 @@
+import sqlite3
+import datetime
+import pytest
+import payment_analytics
+import recovery_calendar
+
+TODAY = datetime.date(2026, 10, 20)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute('''
+        CREATE TABLE customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, recovery_date TEXT, monthly_rental TEXT,
+            status TEXT DEFAULT 'Active', last_payment_date TEXT
+        )
+    ''')
+    conn.execute("CREATE TABLE payment_history (id INTEGER PRIMARY KEY AUTOINCREMENT, customer_id INTEGER, can TEXT, amount_paid TEXT, date_paid TEXT, remarks TEXT)")
+    recovery_calendar.init_calendar(conn)
+    conn.execute("INSERT INTO customers (name, recovery_date, monthly_rental) VALUES ('a', '5th', '300')")
+    conn.executemany("INSERT INTO payment_history (customer_id, amount_paid, date_paid) VALUES (1, '300', ?)",
+                     [("2026-09-10",), ("2026-10-12",)])
+    payment_analytics.clear_cache()
+    yield conn
+    conn.close()
+
+
+def test_delay_uses_parsed_due_day(conn):
+    assert payment_analytics.customer_analytics(conn, 1, TODAY)["avg_delay_days"] == 6.0
+
+
+def test_due_day_change_invalidates_cache(conn):
+    payment_analytics.customer_analytics(conn, 1, TODAY)
+    conn.execute("UPDATE customers SET recovery_date = '10' WHERE id = 1")
+    assert payment_analytics.customer_analytics(conn, 1, TODAY)["avg_delay_days"] == 1.0
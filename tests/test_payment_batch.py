@@ -0,0 +1,46 @@
+import sqlite3
+import pytest
+import payment_batch
+import recovery_calendar
+import write_queue
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute('''
+        CREATE TABLE customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, can TEXT, name TEXT, recovery_date TEXT, monthly_rental TEXT,
+            status TEXT DEFAULT 'Active', paid_amount TEXT, last_payment_date TEXT, outstanding_amount TEXT
+        )
+    ''')
+    conn.execute("CREATE TABLE payment_history (id INTEGER PRIMARY KEY AUTOINCREMENT, customer_id INTEGER, can TEXT, amount_paid TEXT, date_paid TEXT, remarks TEXT)")
+    recovery_calendar.init_calendar(conn)
+    write_queue.init_intents(conn)
+    conn.executemany("INSERT INTO customers (can, name, recovery_date, monthly_rental) VALUES (?, ?, '5', '300')",
+                     [("1001", "first"), ("1002", "other"), ("1001 ", "second")])
+    yield conn
+    conn.close()
+
+
+def test_shared_can_matches_first_customer(conn):
+    assert payment_batch.build_can_index(conn) == {"1001": 1, "1002": 2}
+    summary = payment_batch.reconcile_receipts(conn, [("1001", "300", "2026-10-01"), ("9999", "300", "2026-10-01")])
+    assert [e["customer_id"] for e in summary["matched"]] == [1]
+    assert summary["unmatched"][0]["reason"] == "CAN not found"
+
+
+@pytest.mark.parametrize("amount", ["nan", "inf", "-inf", "1e12", "0", "-5", "abc"])
+def test_unusable_amounts_are_unmatched(conn, amount):
+    summary = payment_batch.reconcile_receipts(conn, [("1001", amount, "2026-10-01")])
+    assert not summary["matched"] and summary["unmatched"][0]["reason"] == "Invalid amount"
+
+
+def test_commit_rolls_due_dates_and_queues_excel(conn):
+    summary = payment_batch.reconcile_receipts(conn, [("1001", "600", "2026-10-03"), ("1002", "300", "2026-10-04")])
+    payment_batch.commit_receipts(conn, summary["matched"])
+    due = dict(conn.execute("SELECT id, next_due_date FROM customers WHERE id IN (1, 2)").fetchall())
+    assert due == {1: "2026-12-05", 2: "2026-11-05"}
+    (_, kind, payload), = write_queue.pending_intents(conn)
+    assert kind == "payments"
+    assert sorted(map(tuple, payload["payments"])) == [("1001", "600", "2026-10-03"), ("1002", "300", "2026-10-04")]
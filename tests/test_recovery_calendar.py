@@ -0,0 +1,21 @@
+import sqlite3
+import pytest
+import recovery_calendar
+
+
+@pytest.mark.parametrize("amount, rental, months", [
+    ("300", "300", 1), ("299", "300", 1), ("900", "300", 3), ("300", "", 1), ("300", "0", 1),
+    ("nan", "300", 1), ("inf", "300", 1), ("300", "inf", 1), ("99999999", "300", recovery_calendar.MAX_MONTHS_COVERED),
+])
+def test_months_covered(amount, rental, months):
+    assert recovery_calendar.months_covered(amount, rental) == months
+
+
+def test_typo_amount_does_not_overflow_due_date():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, recovery_date TEXT, monthly_rental TEXT, status TEXT, last_payment_date TEXT)")
+    conn.execute("CREATE TABLE payment_history (id INTEGER PRIMARY KEY, customer_id INTEGER, amount_paid TEXT, date_paid TEXT)")
+    recovery_calendar.init_calendar(conn)
+    conn.execute("INSERT INTO customers (id, recovery_date, monthly_rental, status) VALUES (1, '5', '300', 'Active')")
+    recovery_calendar.roll_forward(conn, [(1, "99999999", "2026-10-03"), (1, "inf", "2026-10-04")])
+    assert conn.execute("SELECT next_due_date FROM customers").fetchone()[0] == "2028-11-05"
@@ -0,0 +1,19 @@
+import pytest
+import web_view
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("GZIP;q=0.5", True),
+    ("", False),
+    ("gzip;q=0", False),
+    ("gzip;q=0.0, identity", False),
+    ("identity", False),
+    ("*", True),
+    ("*;q=0", False),
+    ("gzip;q=0, *", False),
+    ("br, *;q=0.1", True),
+])
+def test_accepts_gzip(header, expected):
+    assert web_view.accepts_gzip(header) is expected
@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+import pandas as pd
+import pytest
+import excel_sync
+import write_queue
+
+
+@pytest.fixture
+def service(tmp_path):
+    db = str(tmp_path / "w.db")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE t (x INTEGER UNIQUE)")
+    write_queue.init_intents(conn)
+    conn.commit()
+    conn.close()
+    service = write_queue.WriteService(db)
+    yield service
+    service.stop()
+
+
+def rows(service):
+    conn = sqlite3.connect(service.db_file)
+    values = [row[0] for row in conn.execute("SELECT x FROM t ORDER BY x")]
+    conn.close()
+    return values
+
+
+def insert(x):
+    return lambda conn: conn.execute("INSERT INTO t VALUES (?)", (x,)).lastrowid
+
+
+def test_job_that_ends_the_transaction_fails_its_group_and_writer_survives(service):
+    conn = service.connect()
+    group = [write_queue.WriteJob(insert(1)), write_queue.WriteJob(lambda conn: conn.execute("ROLLBACK")), write_queue.WriteJob(insert(2))]
+    service.commit_group(conn, group)
+    conn.close()
+    assert all(job.done.is_set() and job.error is not None for job in group)
+    assert rows(service) == []
+
+    service.start()
+    service.run(insert(3))
+    assert rows(service) == [3]
+
+
+def test_timed_out_job_is_dropped(service):
+    service.start()
+    gate = threading.Event()
+    blocker = service.submit(lambda conn: gate.wait(5))
+    with pytest.raises(sqlite3.OperationalError):
+        service.run(insert(1), timeout=0.05)
+    gate.set()
+    blocker.wait(5)
+    service.run(insert(2))
+    assert rows(service) == [2]
+
+
+def test_failing_job_in_a_group_is_rolled_back_alone(service):
+    conn = service.connect()
+    group = [write_queue.WriteJob(insert(1)), write_queue.WriteJob(insert(1)), write_queue.WriteJob(insert(2))]
+    service.commit_group(conn, group)
+    conn.close()
+    assert group[0].error is None and group[2].error is None
+    assert isinstance(group[1].error, sqlite3.IntegrityError)
+    assert rows(service) == [1, 2]
+
+
+def test_concurrent_runs_commit_in_groups(service):
+    service.start()
+    errors = []
+
+    def worker(start):
+        for x in range(start, start + 50):
+            try: service.run(insert(x))
+            except sqlite3.Error as e: errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n * 100,)) for n in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert not errors and len(rows(service)) == 200
+
+
+def test_result_and_error_reach_the_caller(service):
+    service.start()
+    assert service.run(insert(7)) == 1
+
+    def refuse(conn):
+        conn.execute("INSERT INTO t VALUES (8)")
+        raise ValueError("no")
+    with pytest.raises(ValueError):
+        service.run(refuse)
+    assert rows(service) == [7]
+
+
+def test_intent_commits_with_its_change_and_replays_until_done(service, tmp_path):
+    service.start()
+    service.run(lambda conn: (insert(1)(conn), write_queue.log_intent(conn, "payments", {"payments": [["1001", "300", "2026-10-01"]]})))
+    # A rolled-back change takes its intent with it
+    with pytest.raises(sqlite3.IntegrityError):
+        service.run(lambda conn: (write_queue.log_intent(conn, "payments", {"payments": []}), insert(1)(conn)))
+
+    conn = sqlite3.connect(service.db_file)
+    pending = write_queue.pending_intents(conn)
+    assert [(kind, payload) for _, kind, payload in pending] == [("payments", {"payments": [["1001", "300", "2026-10-01"]]})]
+
+    # The workbook write failed (e.g. a crash): the intent is still pending for the next start
+    ids = [pending[0][0]]
+    service.run(lambda c: write_queue.mark_intents(c, ids, PermissionError("locked")))
+    assert write_queue.pending_intents(conn) == pending
+    # Replaying twice (a crash before mark_intents) leaves the sheet the same
+    excel = str(tmp_path / "sheet.xlsx")
+    pd.DataFrame([["1001", "A", "", "", "", "", ""]], columns=excel_sync.SHEET_COLUMNS).to_excel(excel, index=False)
+    assert excel_sync.apply_intents(excel, pending) == []
+    assert excel_sync.apply_intents(excel, pending) == []
+    sheet = excel_sync.read_sheet(excel)
+    assert len(sheet) == 1 and str(sheet.at[0, "Paid"]) == "300" and sheet.at[0, "Payment Date"] == "2026-10-01"
+    # Marked done; marking again changes nothing
+    service.run(lambda c: write_queue.mark_intents(c, ids))
+    service.run(lambda c: write_queue.mark_intents(c, ids))
+    assert write_queue.pending_intents(conn) == []
+    assert conn.execute("SELECT status, attempts FROM write_intents").fetchall() == [("done", 1)]
+    conn.close()
+
+
+def test_intent_gives_up_after_max_attempts(service):
+    service.start()
+    intent_id = service.run(lambda conn: write_queue.log_intent(conn, "customer", {"can": "1"}))
+    for attempt in range(write_queue.MAX_INTENT_ATTEMPTS):
+        conn = sqlite3.connect(service.db_file)
+        assert [i for i, _, _ in write_queue.pending_intents(conn)] == [intent_id]
+        conn.close()
+        service.run(lambda c: write_queue.mark_intents(c, [intent_id], RuntimeError(f"attempt {attempt}")))
+    conn = sqlite3.connect(service.db_file)
+    assert write_queue.pending_intents(conn) == []
+    assert conn.execute("SELECT status, attempts, last_error FROM write_intents").fetchone() == (
+        "failed", write_queue.MAX_INTENT_ATTEMPTS, f"attempt {write_queue.MAX_INTENT_ATTEMPTS - 1}")
+    conn.close()
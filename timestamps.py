@@ -0,0 +1,10 @@
+import datetime
+
+# --- TIMESTAMPS ---
+# Every TIMESTAMP column is written as local time 'YYYY-MM-DD HH:MM:SS', the
+# form SQLite's date functions read and that sorts correctly as text.
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def timestamp_now():
+    return datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
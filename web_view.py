@@ -0,0 +1,446 @@
+import sqlite3
+import collections
+import datetime
+import gzip
+import hashlib
+import html
+import json
+import os
+import random
+import secrets
+import socket
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import live_search
+
+# --- FIELD WEB VIEW ---
+# A read-only page for collectors' phones, served from this PC over the local
+# network: customer lookup, dues and recent payments straight from the
+# tenant's database.
+#   * Every request opens the database read-only (mode=ro); nothing here can write.
+#   * Lists are paginated on the server (PAGE_SIZE rows, MAX_PAGE_SIZE at most).
+#   * Responses carry an ETag made of the change-feed position and a hash of
+#     the body. A repeat request whose If-None-Match still matches at the same
+#     position is answered 304 from memory without touching the database.
+#   * Bodies over GZIP_MIN_BYTES are gzipped for clients that accept it.
+#   * The access key in the URL keeps other devices on the network out.
+DEFAULT_PORT = 8765
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+PAYMENTS_PAGE_SIZE = 10
+GZIP_MIN_BYTES = 512
+CACHE_SIZE = 256
+BUSY_TIMEOUT_MS = 2000
+
+
+def db_position(conn):
+    """ Last change-feed sequence number issued: moves on every write to the replicated tables, and never back """
+    try: row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    except sqlite3.OperationalError: return 0  # a database with no AUTOINCREMENT tables at all
+    return row[0] if row else 0
+
+
+def page_args(params, default_size=PAGE_SIZE):
+    try: page = max(1, int(params.get("page", ["1"])[0]))
+    except ValueError: page = 1
+    try: size = min(MAX_PAGE_SIZE, max(1, int(params.get("size", [str(default_size)])[0])))
+    except ValueError: size = default_size
+    return page, size
+
+
+def paged(rows, page, size):
+    """ rows were fetched with LIMIT size + 1, so one extra row means there is a next page """
+    return {"page": page, "size": size, "has_more": len(rows) > size, "items": rows[:size]}
+
+
+# --- QUERIES ---
+def customer_page(conn, query, page, size):
+    """ Prefix match on name or CAN (index range scans), or everyone by name when `query` is empty """
+    c = conn.cursor()
+    cols = "id, can, name, area, contact_no, status, outstanding_amount, next_due_date"
+    args = {"limit": size + 1, "offset": (page - 1) * size}
+    if query:
+        args["lo"], args["hi"] = live_search.prefix_range(query)
+        c.execute(f'''
+            SELECT {cols} FROM customers WHERE name >= :lo COLLATE NOCASE AND name < :hi COLLATE NOCASE
+            UNION
+            SELECT {cols} FROM customers WHERE can >= :lo AND can < :hi
+            ORDER BY 3 COLLATE NOCASE, 1 LIMIT :limit OFFSET :offset
+        ''', args)
+    else:
+        c.execute(f"SELECT {cols} FROM customers ORDER BY name COLLATE NOCASE, id LIMIT :limit OFFSET :offset", args)
+    names = [d[0] for d in c.description]
+    return paged([dict(zip(names, row)) for row in c.fetchall()], page, size)
+
+
+def customer_detail(conn, customer_id):
+    c = conn.cursor()
+    c.execute('''
+        SELECT cu.id, cu.can, cu.name, cu.address, cu.contact_no, cu.area, cu.status, cu.stb_no, cu.stb_type,
+               cu.monthly_rental, cu.outstanding_amount, cu.last_payment_date, cu.next_due_date,
+               (SELECT code FROM plans WHERE id = cu.plan_id) AS plan,
+               (SELECT code FROM plans WHERE id = cu.internet_plan_id) AS internet_plan
+        FROM customers cu WHERE cu.id = ?
+    ''', (customer_id,))
+    row = c.fetchone()
+    if row is None: return None
+    detail = dict(zip([d[0] for d in c.description], row))
+    c.execute("SELECT bill_month, amount FROM bills WHERE customer_id = ? ORDER BY bill_month DESC LIMIT 1", (customer_id,))
+    bill = c.fetchone()
+    detail["last_bill"] = {"month": bill[0], "amount": bill[1]} if bill else None
+    return detail
+
+
+def payment_page(conn, customer_id, page, size):
+    c = conn.cursor()
+    c.execute('''
+        SELECT date_paid, amount_paid, remarks FROM payment_history
+        WHERE customer_id = ? ORDER BY date_paid DESC, id DESC LIMIT ? OFFSET ?
+    ''', (customer_id, size + 1, (page - 1) * size))
+    rows = [{"date": d, "amount": a, "remarks": r} for d, a, r in c.fetchall()]
+    return paged(rows, page, size)
+
+
+# --- SERVER ---
+class ResponseCache:
+    """ url -> (position, etag, body, gzipped body), bounded LRU shared by the handler threads """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, position):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != position: return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+class WebViewServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, db_file, business_name="", host="0.0.0.0", port=DEFAULT_PORT, key=None):
+        super().__init__((host, port), WebViewHandler)
+        self.db_file = db_file
+        self.business_name = business_name
+        self.key = key or secrets.token_urlsafe(8)
+        self.cache = ResponseCache()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="web-view", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def urls(self):
+        """ Addresses a phone on the same network can open """
+        port = self.server_address[1]
+        hosts = [local_ip(), "127.0.0.1"] if self.server_address[0] in ("0.0.0.0", "") else [self.server_address[0]]
+        return [f"http://{host}:{port}/?key={self.key}" for host in dict.fromkeys(h for h in hosts if h)]
+
+    def connect(self):
+        uri = "file:" + urllib.parse.quote(os.path.abspath(self.db_file)) + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_MS / 1000)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        return conn
+
+
+def accepts_gzip(accept_encoding):
+    """ Whether an Accept-Encoding header allows gzip; 'gzip;q=0' refuses it, '*' stands in when gzip isn't named """
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try: q = float(value)
+                except ValueError: q = 0.0
+        weights[coding.strip().lower()] = q
+    return weights.get("gzip", weights.get("*", 0.0)) > 0
+
+
+def local_ip():
+    # No packet is sent; connecting a UDP socket only picks the outgoing interface
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("10.255.255.255", 1))
+            return s.getsockname()[0]
+    except OSError:
+        return None
+
+
+class WebViewHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so a phone reuses one connection
+
+    def log_message(self, format, *args):
+        pass  # the app has no console to log to
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_POST(self):
+        self.send_error(405, "This view is read-only")
+
+    do_PUT = do_DELETE = do_PATCH = do_POST
+
+    def do_GET(self, head=False):
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        if not secrets.compare_digest(params.get("key", [""])[0].encode(), self.server.key.encode()):
+            self.send_error(403, "Open the link shown in Settings")
+            return
+        if url.path == "/":
+            self.respond(200, PAGE.replace("{{title}}", html.escape(self.server.business_name or "Customers")).encode(), "text/html; charset=utf-8", head=head)
+            return
+
+        cache_key = (self.server.db_file, url.path, url.query)
+        try:
+            conn = self.server.connect()
+        except sqlite3.Error as e:
+            self.respond_json(503, {"error": str(e)}, head=head)
+            return
+        try:
+            position = db_position(conn)
+            cached = self.server.cache.get(cache_key, position)
+            if cached is None:
+                status, payload = self.route(conn, url.path, params)
+                if status != 200:
+                    self.respond_json(status, payload, head=head)
+                    return
+                body = json.dumps(payload, separators=(",", ":"), default=str).encode()
+                etag = f'"{position}-{hashlib.sha1(body).hexdigest()[:16]}"'
+                cached = (position, etag, body, gzip.compress(body, 6) if len(body) >= GZIP_MIN_BYTES else None)
+                self.server.cache.put(cache_key, cached)
+        except sqlite3.Error as e:
+            self.respond_json(503, {"error": str(e)}, head=head)
+            return
+        finally:
+            conn.close()
+
+        _, etag, body, zipped = cached
+        if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.respond(200, body, "application/json", etag=etag, zipped=zipped, head=head)
+
+    def route(self, conn, path, params):
+        parts = [p for p in path.split("/") if p]
+        if parts == ["api", "customers"]:
+            page, size = page_args(params)
+            return 200, customer_page(conn, params.get("q", [""])[0].strip(), page, size)
+        if len(parts) in (3, 4) and parts[:2] == ["api", "customers"] and parts[2].isdigit():
+            customer_id = int(parts[2])
+            if len(parts) == 4 and parts[3] == "payments":
+                page, size = page_args(params, PAYMENTS_PAGE_SIZE)
+                return 200, payment_page(conn, customer_id, page, size)
+            if len(parts) == 3:
+                detail = customer_detail(conn, customer_id)
+                if detail is None: return 404, {"error": "No such customer"}
+                detail["payments"] = payment_page(conn, customer_id, 1, PAYMENTS_PAGE_SIZE)
+                return 200, detail
+        return 404, {"error": "Not found"}
+
+    def respond_json(self, status, payload, head=False):
+        self.respond(status, json.dumps(payload).encode(), "application/json", head=head)
+
+    def respond(self, status, body, content_type, etag=None, zipped=None, head=False):
+        if zipped is None and len(body) >= GZIP_MIN_BYTES:
+            zipped = gzip.compress(body, 6)
+        use_gzip = zipped is not None and accepts_gzip(self.headers.get("Accept-Encoding", ""))
+        payload = zipped if use_gzip else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Vary", "Accept-Encoding")
+        # Revalidate every time: the ETag check is cheap and dues must never be stale
+        self.send_header("Cache-Control", "no-cache")
+        if etag: self.send_header("ETag", etag)
+        if use_gzip: self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        if not head: self.wfile.write(payload)
+
+
+# One small page; the browser's own HTTP cache does the revalidation with the ETags above
+PAGE = '''<!doctype html>
+<html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{{title}}</title>
+<style>
+body{font-family:sans-serif;margin:0;background:#f4f4f4;color:#222}
+header{background:#1f6aa5;color:#fff;padding:12px 14px;font-size:18px;font-weight:bold}
+main{padding:10px}
+input{width:100%;box-sizing:border-box;font-size:17px;padding:10px;border:1px solid #bbb;border-radius:6px}
+.card{background:#fff;border-radius:6px;padding:10px 12px;margin:8px 0;box-shadow:0 1px 2px #0002}
+.row{display:flex;justify-content:space-between;gap:8px}
+.muted{color:#777;font-size:13px}
+.due{color:#c62828;font-weight:bold}
+button{font-size:16px;padding:8px 14px;margin:6px 0;border:0;border-radius:6px;background:#1f6aa5;color:#fff}
+a{color:inherit;text-decoration:none}
+</style></head>
+<body><header>{{title}}</header><main>
+<input id="q" type="search" placeholder="Name or CAN" autocomplete="off">
+<div id="out"></div><button id="more" hidden>More</button>
+</main>
+<script>
+const key = new URLSearchParams(location.search).get("key");
+const out = document.getElementById("out"), more = document.getElementById("more"), q = document.getElementById("q");
+let page = 1, timer = null, view = "list", current = null;
+const esc = s => String(s ?? "").replace(/[&<>"]/g, c => ({"&":"&amp;","<":"&lt;",">":"&gt;",'"':"&quot;"}[c]));
+const rs = v => "\\u20b9" + Number(v || 0).toLocaleString("en-IN");
+async function api(path, params) {
+  const u = new URLSearchParams(Object.assign({key}, params || {}));
+  const r = await fetch(path + "?" + u, {cache: "no-cache"});
+  return r.json();
+}
+async function list(reset) {
+  view = "list"; if (reset) { page = 1; out.innerHTML = ""; }
+  const data = await api("/api/customers", {q: q.value.trim(), page});
+  for (const c of data.items) {
+    out.insertAdjacentHTML("beforeend", `<a href="#${c.id}"><div class="card"><div class="row"><b>${esc(c.name)}</b>
+      <span class="${Number(c.outstanding_amount) > 0 ? "due" : ""}">${rs(c.outstanding_amount)}</span></div>
+      <div class="muted">CAN ${esc(c.can)} &middot; ${esc(c.area)} &middot; ${esc(c.status)}${c.next_due_date ? " &middot; due " + esc(c.next_due_date) : ""}</div></div></a>`);
+  }
+  if (!data.items.length && page === 1) out.innerHTML = '<p class="muted">No customers found.</p>';
+  more.hidden = !data.has_more;
+}
+async function detail(id) {
+  view = "detail"; current = id; page = 1;
+  const c = await api("/api/customers/" + id);
+  if (c.error) { out.innerHTML = `<p class="muted">${esc(c.error)}</p>`; more.hidden = true; return; }
+  out.innerHTML = `<p><a href="#">&larr; Back</a></p><div class="card"><b>${esc(c.name)}</b> <span class="muted">CAN ${esc(c.can)}</span>
+    <div class="muted">${esc(c.address)}<br>${esc(c.area)} &middot; ${esc(c.status)} &middot; ${esc(c.stb_type)} ${esc(c.stb_no)}</div>
+    <p>Outstanding: <span class="${Number(c.outstanding_amount) > 0 ? "due" : ""}">${rs(c.outstanding_amount)}</span><br>
+    Monthly: ${rs(c.monthly_rental)}${c.plan ? " (" + esc(c.plan) + (c.internet_plan ? " + " + esc(c.internet_plan) : "") + ")" : ""}<br>
+    Next due: ${esc(c.next_due_date || "-")} &middot; Last paid: ${esc(c.last_payment_date || "-")}
+    ${c.last_bill ? "<br>Last bill: " + esc(c.last_bill.month) + " " + rs(c.last_bill.amount) : ""}</p>
+    ${c.contact_no ? `<a href="tel:${esc(c.contact_no)}"><button>Call ${esc(c.contact_no)}</button></a>` : ""}</div>
+    <h3>Recent payments</h3><div id="pays"></div>`;
+  payments(c.payments);
+}
+function payments(data) {
+  const box = document.getElementById("pays");
+  for (const p of data.items) box.insertAdjacentHTML("beforeend", `<div class="card row"><span>${esc(p.date)}</span><b>${rs(p.amount)}</b></div>`);
+  if (!data.items.length && data.page === 1) box.innerHTML = '<p class="muted">No payments recorded.</p>';
+  more.hidden = !data.has_more;
+}
+more.onclick = async () => { page++; if (view === "list") list(false); else payments(await api(`/api/customers/${current}/payments`, {page})); };
+q.oninput = () => { clearTimeout(timer); timer = setTimeout(() => { location.hash = ""; list(true); }, 250); };
+window.onhashchange = () => { const id = location.hash.slice(1); if (id) detail(id); else list(true); };
+window.onhashchange();
+</script></body></html>
+'''
+
+
+# --- BENCHMARK ---
+def benchmark(customers=20_000, clients=16, requests_per_client=200):
+    """
+    Builds a throwaway database, serves it on a free local port and has
+    `clients` threads replay what collectors do (search, open a customer, page
+    through payments) with gzip and If-None-Match, then prints throughput and
+    latency.
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix="web_bench_"), "bench.db")
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE customers (id INTEGER PRIMARY KEY AUTOINCREMENT, can TEXT, name TEXT, address TEXT, contact_no TEXT,
+                    area TEXT, status TEXT, stb_no TEXT, stb_type TEXT, monthly_rental TEXT, outstanding_amount TEXT,
+                    last_payment_date TEXT, next_due_date TEXT, plan_id INTEGER, internet_plan_id INTEGER)''')
+    conn.execute("CREATE TABLE payment_history (id INTEGER PRIMARY KEY AUTOINCREMENT, customer_id INTEGER, can TEXT, amount_paid TEXT, date_paid TEXT, remarks TEXT)")
+    conn.execute("CREATE TABLE plans (id INTEGER PRIMARY KEY AUTOINCREMENT, code TEXT)")
+    conn.execute("CREATE TABLE bills (id INTEGER PRIMARY KEY AUTOINCREMENT, customer_id INTEGER, bill_month TEXT, amount REAL)")
+    conn.execute("CREATE TABLE change_log (seq INTEGER PRIMARY KEY AUTOINCREMENT)")
+    conn.execute("CREATE INDEX idx_customers_can ON customers(can)")
+    conn.execute("CREATE INDEX idx_payment_history_customer_date ON payment_history(customer_id, date_paid)")
+    live_search.init_search_indexes(conn)
+    rng = random.Random(11)
+    first = ["Amit", "Anil", "Asha", "Deepak", "Kiran", "Manoj", "Meena", "Pooja", "Rahul", "Ravi", "Sanjay", "Sunita", "Vijay"]
+    last = ["Sharma", "Patil", "Deshmukh", "Joshi", "Kale", "Verma", "Gupta", "Shinde", "Rao"]
+    conn.executemany("INSERT INTO customers (can, name, address, contact_no, area, status, monthly_rental, outstanding_amount, next_due_date) VALUES (?,?,?,?,?,?,?,?,?)",
+                     ((str(100000 + i), f"{rng.choice(first)} {rng.choice(last)} {i}", f"House {i}, Ward {i % 40}", f"98{rng.randrange(10**8):08d}",
+                       f"WARD {i % 40}", "Active", "300", str(rng.choice([0, 0, 300, 600])), "2026-11-05") for i in range(customers)))
+    start = datetime.date(2025, 1, 5)
+    conn.executemany("INSERT INTO payment_history (customer_id, can, amount_paid, date_paid, remarks) VALUES (?,?,?,?,?)",
+                     ((cid, str(100000 + cid - 1), "300", (start + datetime.timedelta(days=30 * m)).isoformat(), "Cash")
+                      for cid in range(1, customers + 1) for m in range(12)))
+    conn.commit()
+    conn.close()
+
+    server = WebViewServer(path, "Benchmark", host="127.0.0.1", port=0).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    timings, sizes, statuses = [], [], collections.Counter()
+    lock = threading.Lock()
+
+    def client(seed):
+        rng = random.Random(seed)
+        etags = {}  # what a browser cache remembers
+        local_t, local_b, local_s = [], [], collections.Counter()
+        for _ in range(requests_per_client):
+            cid = rng.randrange(1, customers + 1)
+            url = rng.choice([f"/api/customers?q={urllib.parse.quote(rng.choice(first))}&page={rng.randrange(1, 4)}",
+                              f"/api/customers/{cid}", f"/api/customers/{cid}/payments?page=2",
+                              f"/api/customers?q={100000 + rng.randrange(customers) // 100}"])
+            # Collectors keep re-checking the same few customers, so repeat a recent URL half the time
+            if etags and rng.random() < 0.5: url = rng.choice(list(etags))
+            req = urllib.request.Request(base + url + ("&" if "?" in url else "?") + "key=" + server.key,
+                                         headers={"Accept-Encoding": "gzip", **({"If-None-Match": etags[url]} if url in etags else {})})
+            t = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req) as resp:
+                    body = resp.read()
+                    status = resp.status
+                    etags[url] = resp.headers.get("ETag")
+            except urllib.error.HTTPError as e:
+                body, status = b"", e.code
+            local_t.append((time.perf_counter() - t) * 1000)
+            local_b.append(len(body))
+            local_s[status] += 1
+        with lock:
+            timings.extend(local_t)
+            sizes.extend(local_b)
+            statuses.update(local_s)
+
+    t = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for th in threads: th.start()
+    for th in threads: th.join()
+    elapsed = time.perf_counter() - t
+    server.stop()
+
+    timings.sort()
+    p50, p95 = timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+    print(f"{len(timings):,} requests from {clients} clients over {customers:,} customers in {elapsed:.1f}s: "
+          f"{len(timings) / elapsed:,.0f} req/s, p50 {p50:.1f} ms, p95 {p95:.1f} ms")
+    print(f"Average payload {sum(sizes) / len(sizes):,.0f} bytes; responses: " + ", ".join(f"{s}: {n:,}" for s, n in sorted(statuses.items())))
+    return p50, p95
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+    else:
+        server = WebViewServer(sys.argv[1] if len(sys.argv) > 1 else "cable_manager.db")
+        for url in server.urls(): print(url)
+        try: server.serve_forever()
+        except KeyboardInterrupt: server.server_close()
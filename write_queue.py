@@ -0,0 +1,204 @@
+import sqlite3
+import datetime
+import json
+import queue
+import threading
+import time
+from timestamps import timestamp_now
+
+# --- WRITE SERVICE ---
+# Every mutation goes through one writer thread with its own connection.
+# Jobs that arrive together are committed as one BEGIN IMMEDIATE transaction
+# (group commit); each job runs inside its own savepoint, so a failing job is
+# rolled back on its own and reported to its caller without losing the rest.
+#
+# Side effects outside the database (the Excel workbook) are written to
+# write_intents in the same transaction as the change itself. They are marked
+# done only after the workbook write succeeds, so an intent left pending by a
+# crash or a locked file is replayed on the next start.
+BUSY_TIMEOUT_MS = 5000
+BUSY_RETRIES = 3
+GROUP_COMMIT_WINDOW = 0.005  # seconds to wait for more jobs after the first
+MAX_GROUP = 200
+MAX_INTENT_ATTEMPTS = 5
+RUN_TIMEOUT = 60  # seconds run() waits before giving up, so a stuck writer never hangs the UI
+
+
+class WriteTimeout(sqlite3.OperationalError):
+    """ The writer did not get to a job in time; the job is dropped if it hasn't started """
+
+
+def init_intents(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS write_intents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TIMESTAMP,
+            done_at TIMESTAMP
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_write_intents_pending ON write_intents(id) WHERE status = 'pending'")
+
+
+def log_intent(conn, kind, payload):
+    """ Records a side effect to run after commit. The caller owns the transaction. """
+    c = conn.execute("INSERT INTO write_intents (kind, payload, created_at) VALUES (?, ?, ?)",
+                     (kind, json.dumps(payload), timestamp_now()))
+    return c.lastrowid
+
+
+def pending_intents(conn):
+    """ [(id, kind, payload)] still to be applied, oldest first """
+    c = conn.cursor()
+    c.execute("SELECT id, kind, payload FROM write_intents WHERE status = 'pending' ORDER BY id")
+    return [(intent_id, kind, json.loads(payload)) for intent_id, kind, payload in c.fetchall()]
+
+
+def mark_intents(conn, ids, error=None):
+    """ Marks intents done, or counts a failed attempt and gives up after MAX_INTENT_ATTEMPTS """
+    if error is None:
+        conn.executemany("UPDATE write_intents SET status = 'done', done_at = ? WHERE id = ?",
+                         [(timestamp_now(), i) for i in ids])
+    else:
+        conn.executemany('''
+            UPDATE write_intents SET attempts = attempts + 1, last_error = ?,
+                   status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE status END
+            WHERE id = ?
+        ''', [(str(error), MAX_INTENT_ATTEMPTS, i) for i in ids])
+
+
+def prune_intents(conn, keep_days=30):
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=keep_days)).strftime("%Y-%m-%d %H:%M:%S")
+    conn.execute("DELETE FROM write_intents WHERE status = 'done' AND done_at < ?", (cutoff,))
+
+
+class WriteJob:
+    def __init__(self, work):
+        self.work = work
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        if not self.done.wait(timeout):
+            self.cancelled = True
+            raise WriteTimeout("The database is busy; the change was not saved. Please try again.")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class WriteService:
+    """
+    Serializes writes to one database. `work` is a callable taking the writer's
+    connection; it must not commit, and its return value is handed back to
+    the caller of run()/submit().wait().
+    """
+
+    def __init__(self, db_file, busy_timeout_ms=BUSY_TIMEOUT_MS):
+        self.db_file = db_file
+        self.busy_timeout_ms = busy_timeout_ms
+        self.jobs = queue.Queue()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive(): return
+        self.thread = threading.Thread(target=self.loop, name=f"writer:{self.db_file}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """ Finishes the queued jobs, then closes the writer connection """
+        if not self.thread: return
+        self.jobs.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def submit(self, work):
+        if not self.thread:
+            raise RuntimeError("Write service is not running")
+        job = WriteJob(work)
+        self.jobs.put(job)
+        return job
+
+    def run(self, work, timeout=RUN_TIMEOUT):
+        return self.submit(work).wait(timeout)
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_file, isolation_level=None, timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        # WAL lets the UI keep reading while a group commits
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = FULL")
+        # customers.area_id and areas.parent_id are enforced for every write
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def loop(self):
+        conn = self.connect()
+        try:
+            while True:
+                job = self.jobs.get()
+                if job is None: break
+                group, stopping = [job], False
+                while len(group) < MAX_GROUP:
+                    try:
+                        nxt = self.jobs.get(timeout=GROUP_COMMIT_WINDOW)
+                    except queue.Empty:
+                        break
+                    if nxt is None:
+                        stopping = True
+                        break
+                    group.append(nxt)
+                self.commit_group(conn, group)
+                if stopping: break
+        finally:
+            conn.close()
+
+    def begin(self, conn):
+        # busy_timeout already waits inside BEGIN IMMEDIATE; this covers a
+        # writer elsewhere that holds the lock longer than that.
+        for attempt in range(BUSY_RETRIES):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e): raise
+                if attempt == BUSY_RETRIES - 1: raise
+                time.sleep(0.1 * (attempt + 1))
+
+    def commit_group(self, conn, group):
+        """ Never raises: any failure is handed to the jobs, and the writer loop keeps going """
+        try:
+            self.begin(conn)
+            for job in group:
+                if job.cancelled:
+                    job.error = WriteTimeout("Dropped: the caller stopped waiting")
+                    continue
+                conn.execute("SAVEPOINT job")
+                try:
+                    job.result = job.work(conn)
+                    conn.execute("RELEASE job")
+                except Exception as e:
+                    job.error = e
+                    # Some errors end the whole transaction, taking the earlier jobs with it
+                    if not conn.in_transaction:
+                        raise
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+            conn.execute("COMMIT")
+        except Exception as e:
+            # Nothing in the group was committed
+            if conn.in_transaction:
+                try: conn.execute("ROLLBACK")
+                except sqlite3.Error: pass
+            for job in group:
+                if job.error is None:
+                    job.result, job.error = None, e
+        finally:
+            for job in group:
+                job.done.set()